@@ -10,14 +10,13 @@ This is, 200
 
 import mark_answers
 
-_PARTICIPANT_L2_TEXT_STYLE_MAPPING = mark_answers._PARTICIPANT_L2_TEXT_STYLE_MAPPING
 _ALL_STYLES = mark_answers.get_all_styles()
 
 
 def count_style_details(participant_id: str, l2_texts: list) -> dict[str: int]:
     print(f"count_style_details for {participant_id}")
 
-    _l2_text_style_map = _PARTICIPANT_L2_TEXT_STYLE_MAPPING[participant_id]
+    _l2_text_style_map = mark_answers.get_participant_l2_text_style_mapping()[participant_id]
     _all_l2_texts = list(_l2_text_style_map.keys())
     # print(_all_l2_texts)
 
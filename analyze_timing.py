@@ -0,0 +1,270 @@
+import argparse
+import csv
+import glob
+import math
+import re
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from backend.schedule_store import load_schedule_store, ScheduleStore
+from backend.sentence_utility import get_all_styles, is_session_sentence, CONTINUE_TEXTS
+
+_LOG_FILES = 'system-*.log'
+'''
+2024-10-01 10:00:01,234 - INFO - Returning sentences:: participant:p101, sentence indices:[5, 6, 7]
+2024-10-01 10:00:01,300 - INFO - Acknowledged sentence:: participant:p101, sentence index:5
+2024-10-01 10:00:01,456 - INFO - message='Successfully fetched next sentence 3' timestamp='2024-10-01T02:00:01.401Z'
+2024-10-01 10:00:01,456 - INFO - message='Attempting to fetch next word with id 0 in sentence 3' timestamp='...'
+'''
+
+# the server's messages (backend.py), which tell the participant and the schedule index of the client's sentences;
+# the prefetched ones ("Prefetching sentences::", i.e., advance=false) are served once acknowledged
+_SERVED_PATTERNS = [
+    re.compile(r"Returning sentence:: participant:(?P<participant>\S+), sentence index:(?P<indices>\d+),"),
+    re.compile(r"Returning sentences:: participant:(?P<participant>\S+), sentence indices:\[(?P<indices>[\d, ]*)]"),
+    re.compile(r"Acknowledged sentence:: participant:(?P<participant>\S+), sentence index:(?P<indices>\d+)"),
+]
+_STREAM_PATTERN = re.compile(r"Streaming sentences:: participant:(?P<participant>\S+)")
+
+# the client's messages (VocabularyCard.vue)
+_CLIENT_PATTERN = re.compile(r"message=(['\"])(?P<message>.*)\1 timestamp=(['\"])(?P<timestamp>.*)\3$")
+_FETCHED_PATTERN = re.compile(r"^Successfully fetched next sentence (?P<count>\d+)$")
+_WORD_PATTERN = re.compile(r"^Attempting to fetch next word with id (?P<word>\d+) in sentence (?P<count>\d+)$")
+
+_LOG_TIME_LENGTH = len('2024-10-01 10:00:01,234')
+
+_OTHER_STYLE = '-'  # e.g., the session and break sentences
+
+
+class DriftStats:
+    '''
+    Distribution of the drift (observed - planned duration, in ms) in bounded memory:
+    the mean/stdev are running (Welford) and the percentiles come from a 1ms histogram.
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._histogram = Counter()
+
+    def add(self, drift: float):
+        self.count += 1
+        delta = drift - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (drift - self.mean)
+        self._histogram[round(drift)] += 1
+
+    def get_stdev(self) -> float:
+        # i.e., the jitter
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def get_percentile(self, percentile: float) -> int:
+        rank = max(1, math.ceil(percentile / 100 * self.count))
+        seen = 0
+        for drift in sorted(self._histogram):
+            seen += self._histogram[drift]
+            if seen >= rank:
+                return drift
+        return 0
+
+
+def parse_client_time(timestamp: str) -> datetime:
+    # the browser's toISOString(), e.g., 2024-10-01T02:00:01.401Z
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+
+
+def get_sentence_styles(schedule_store: ScheduleStore, participant_id: str) -> List[str]:
+    # the style of each sentence of the schedule, i.e., of the block it is in (the session sentence starts a block)
+    participant = schedule_store.get_participant(participant_id)
+    styles_sentences = schedule_store.get_styles_sentences(participant_id)
+
+    styles = []
+    block_number = 0
+    remaining_count = 0
+    for sentence in participant.sentences:
+        if remaining_count > 0:
+            styles.append(styles_sentences[f'Style.{block_number}'])
+            remaining_count -= 1
+            continue
+
+        styles.append(_OTHER_STYLE)
+        if is_session_sentence(sentence) and block_number < len(get_all_styles()):
+            block_number += 1
+            remaining_count = len(str(styles_sentences[f'Sentences.{block_number}']).split(','))
+
+    return styles
+
+
+class ParticipantTimeline:
+    '''
+    The state of one participant's session while reading the log: the sentences the server sent (in order)
+    and the words of the sentence being displayed.
+    '''
+
+    def __init__(self, participant_id: str, schedule_store: ScheduleStore):
+        self.participant_id = participant_id
+        self.sentences = schedule_store.get_participant(participant_id).sentences
+        self.styles = get_sentence_styles(schedule_store, participant_id)
+
+        # the log time and the sentence indices (not displayed yet) of each server response
+        self.served: List[Tuple[str, List[int]]] = []
+        self.last_client_time = ''
+        self.sentence_count = -1
+        self.sentence_index: Optional[int] = None
+        self.word_times: Dict[int, datetime] = {}
+
+    def serve(self, log_time: str, sentence_indices: List[int]):
+        self.served.append((log_time, sentence_indices))
+
+    def fetch(self, log_time: str, sentence_count: int):
+        if sentence_count == 0 and self.sentence_count > 0:
+            # the page was reloaded, so the sentences prefetched by the old page are never displayed
+            # (the client messages are written after a delay, so the log is not in time order)
+            self.served = [(served_time, indices) for served_time, indices in self.served
+                           if served_time >= self.last_client_time]
+
+        while self.served and not self.served[0][1]:
+            self.served.pop(0)
+        self.sentence_index = self.served[0][1].pop(0) if self.served else None
+        self.sentence_count = sentence_count
+        self.word_times = {}
+
+
+class TimingAnalyzer:
+    '''
+    Joins the client's word display events with the planned display durations of the participant's schedule.
+    Assumes the sessions in a log do not overlap (as in the lab study), as the client messages carry no participant.
+    '''
+
+    def __init__(self, schedule_store: ScheduleStore, words_writer=None):
+        self._schedule_store = schedule_store
+        self._words_writer = words_writer
+        self._timelines: Dict[str, ParticipantTimeline] = {}
+        self._current: Optional[ParticipantTimeline] = None
+
+        self.stats: Dict[tuple, DriftStats] = defaultdict(DriftStats)  # (level, style) -> drift
+        self.unmatched_count = 0
+
+    def _get_timeline(self, participant_id: str) -> Optional[ParticipantTimeline]:
+        if participant_id not in self._timelines:
+            if not self._schedule_store.has_participant(participant_id):
+                return None
+            self._timelines[participant_id] = ParticipantTimeline(participant_id, self._schedule_store)
+        return self._timelines[participant_id]
+
+    def feed(self, line: str):
+        # e.g., "2024-10-01 10:00:01,234", comparable as a string
+        log_time = line[:_LOG_TIME_LENGTH]
+
+        client_match = _CLIENT_PATTERN.search(line)
+        if client_match:
+            if self._current is not None:
+                self._feed_client(log_time, client_match.group('message'), client_match.group('timestamp'))
+            return
+
+        for pattern in _SERVED_PATTERNS:
+            served_match = pattern.search(line)
+            if served_match:
+                self._current = self._get_timeline(served_match.group('participant'))
+                if self._current is not None:
+                    self._current.serve(log_time, [int(index) for index in served_match.group('indices').split(',')
+                                         if index.strip()])
+                return
+
+        stream_match = _STREAM_PATTERN.search(line)
+        if stream_match:
+            self._current = self._get_timeline(stream_match.group('participant'))
+
+    def _feed_client(self, log_time: str, message: str, timestamp: str):
+        timeline = self._current
+
+        fetched_match = _FETCHED_PATTERN.match(message)
+        if fetched_match:
+            timeline.fetch(log_time, int(fetched_match.group('count')))
+            timeline.last_client_time = log_time
+            if timeline.sentence_index is None:
+                self.unmatched_count += 1
+            return
+        timeline.last_client_time = log_time
+
+        word_match = _WORD_PATTERN.match(message)
+        if not word_match or timeline.sentence_index is None or \
+                int(word_match.group('count')) != timeline.sentence_count:
+            return
+
+        word_index = int(word_match.group('word'))
+        timeline.word_times[word_index] = parse_client_time(timestamp)
+        if word_index - 1 in timeline.word_times:
+            self._add_word(timeline, word_index - 1)
+
+        words = timeline.sentences[timeline.sentence_index].subWords
+        if word_index == len(words):
+            self._add_sentence(timeline)
+
+    def _add_word(self, timeline: ParticipantTimeline, word_index: int):
+        word = timeline.sentences[timeline.sentence_index].subWords[word_index]
+        if word.foreignText in CONTINUE_TEXTS:
+            # displayed until the continue button is clicked
+            return
+
+        observed = (timeline.word_times[word_index + 1] - timeline.word_times[word_index]).total_seconds() * 1000
+        drift = observed - word.displayDuration
+        style = timeline.styles[timeline.sentence_index]
+        self.stats[('word', style)].add(drift)
+        self.stats[('word', 'all')].add(drift)
+
+        if self._words_writer is not None:
+            self._words_writer.writerow([timeline.participant_id, timeline.sentence_index,
+                                         timeline.sentences[timeline.sentence_index].id, word_index, style,
+                                         word.displayDuration, round(observed, 1), round(drift, 1)])
+
+    def _add_sentence(self, timeline: ParticipantTimeline):
+        words = timeline.sentences[timeline.sentence_index].subWords
+        if any(word.foreignText in CONTINUE_TEXTS for word in words) or \
+                any(index not in timeline.word_times for index in range(len(words) + 1)):
+            return
+
+        observed = (timeline.word_times[len(words)] - timeline.word_times[0]).total_seconds() * 1000
+        drift = observed - sum(word.displayDuration for word in words)
+        style = timeline.styles[timeline.sentence_index]
+        self.stats[('sentence', style)].add(drift)
+        self.stats[('sentence', 'all')].add(drift)
+
+    def print_report(self):
+        print(f"{'level':<10}{'style':<8}{'count':>8}{'mean':>9}{'jitter':>9}"
+              f"{'p50':>7}{'p95':>7}{'p99':>7}   (drift in ms, observed - planned)")
+        for (level, style), stats in sorted(self.stats.items(), key=lambda item: (item[0][0] != 'word', item[0][1])):
+            print(f"{level:<10}{style:<8}{stats.count:>8}{stats.mean:>9.1f}{stats.get_stdev():>9.1f}" +
+                  "".join(f"{stats.get_percentile(p):>7}" for p in (50, 95, 99)))
+        if self.unmatched_count:
+            print(f"{self.unmatched_count} displayed sentences without a matching server response were skipped")
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser(description="Compare the planned and the observed display durations")
+    _parser.add_argument('log_files', nargs='*', help=f"default: {_LOG_FILES}")
+    _parser.add_argument('--words-csv', default=None, help="also write the drift of each displayed word")
+    _args = _parser.parse_args()
+
+    _log_files = _args.log_files or sorted(glob.glob(_LOG_FILES))
+    _words_file = open(_args.words_csv, 'w', newline='') if _args.words_csv else None
+    _words_writer = None
+    if _words_file is not None:
+        _words_writer = csv.writer(_words_file)
+        _words_writer.writerow(['Participant', 'SentenceIndex', 'SentenceId', 'WordIndex', 'Style',
+                                'PlannedMs', 'ObservedMs', 'DriftMs'])
+
+    _analyzer = TimingAnalyzer(load_schedule_store(), _words_writer)
+    for _log_file in _log_files:
+        # line by line, so the memory does not grow with the log size
+        with open(_log_file, errors='replace') as _f:
+            for _line in _f:
+                _analyzer.feed(_line.rstrip('\n'))
+
+    if _words_file is not None:
+        _words_file.close()
+
+    print(f"{len(_log_files)} log files")
+    _analyzer.print_report()
@@ -0,0 +1,43 @@
+import os
+from typing import List, Dict, Any, Optional
+
+from backend.models import Word, Sentence
+
+_PUBLIC_DIRECTORY = 'frontend/public'
+
+_IMAGE_URL_SEPARATOR = '|'
+_MEDIA_FRAGMENT_SEPARATOR = '#'
+
+_asset_sizes: Dict[str, Optional[int]] = {}
+
+
+def get_asset_type(url: str) -> str:
+    return "image" if url.startswith("images/") else "audio"
+
+
+def get_asset_size(url: str) -> Optional[int]:
+    # None if the file is missing; the assets do not change while running
+    if url not in _asset_sizes:
+        try:
+            _asset_sizes[url] = os.path.getsize(os.path.join(_PUBLIC_DIRECTORY, url))
+        except OSError:
+            _asset_sizes[url] = None
+    return _asset_sizes[url]
+
+
+def get_word_asset_urls(word: Word) -> List[str]:
+    # in the order the client needs them: audio of the word, then its image(s)
+    urls = [word.foreignPronunciation, word.englishPronunciation]
+    urls.extend(word.imageUrl.split(_IMAGE_URL_SEPARATOR))
+    # a segment of an audio sprite (e.g., "block1.mp3#t=1.2,1.8") is loaded with the whole sprite
+    return [url.split(_MEDIA_FRAGMENT_SEPARATOR, 1)[0] for url in urls if url]
+
+
+def get_assets_manifest(sentences: List[Sentence]) -> List[Dict[str, Any]]:
+    '''
+    De-duplicated assets of the given sentences, in the order they are displayed.
+    '''
+    urls = dict.fromkeys(url for sentence in sentences for word in sentence.subWords
+                         for url in get_word_asset_urls(word))
+
+    return [{"url": url, "type": get_asset_type(url), "bytes": get_asset_size(url)} for url in urls]
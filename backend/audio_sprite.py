@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import sys
+from collections import Counter
+from typing import Dict, List, Optional, Tuple, Any
+
+from backend.models import Word, Sentence, Participant
+from backend.sentence_utility import is_session_sentence
+from backend.schedule_artifact import write_json_file
+
+logger = logging.getLogger()
+
+_PUBLIC_DIRECTORY = 'frontend/public'
+_SPRITE_DIRECTORY = 'audios/sprites'  # inside the public directory
+
+_SPRITE_INDEX_FILE_NAME = 'index.json'
+'''
+audios/sprites/p0/index.json:
+{"scheduleHash": "...",
+ "sprites": {"1": {"url": "audios/sprites/p0/block1.mp3",
+                   "segments": {"audios/l2/Chu.mp3": [<offset>, <duration>], ...}}, ...}}
+Block 0 is before the first session sentence, block 1 up to the second one, etc.
+'''
+
+# MPEG audio layer III
+_BITRATES_KBPS = {
+    'mpeg1': [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    'mpeg2': [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {
+    'mpeg1': [44100, 48000, 32000],
+    'mpeg2': [22050, 24000, 16000],
+    'mpeg2.5': [11025, 12000, 8000],
+}
+
+
+def skip_id3v2_tag(data: bytes) -> int:
+    if data[:3] != b'ID3' or len(data) < 10:
+        return 0
+
+    # syncsafe integer (7 bits per byte), plus the 10 byte header and the optional 10 byte footer
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def parse_mp3_frame_header(header: bytes) -> Optional[Tuple[str, int, int, int]]:
+    '''
+    Return (format, frame length in bytes, samples per frame, sample rate) of a layer III frame header,
+    or None if it is not one.
+    '''
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+
+    version = {0b00: 'mpeg2.5', 0b10: 'mpeg2', 0b11: 'mpeg1'}.get((header[1] >> 3) & 0b11)
+    layer = (header[1] >> 1) & 0b11
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0b11
+    padding = (header[2] >> 1) & 0b1
+    channel_mode = header[3] >> 6
+
+    if version is None or layer != 0b01 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    bitrate = _BITRATES_KBPS['mpeg1' if version == 'mpeg1' else 'mpeg2'][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    samples_per_frame = 1152 if version == 'mpeg1' else 576
+    frame_length = (samples_per_frame // 8) * bitrate // sample_rate + padding
+
+    # clips can only be joined if they share the format
+    return f"{version}-{sample_rate}-{'mono' if channel_mode == 3 else 'stereo'}", frame_length, \
+        samples_per_frame, sample_rate
+
+
+def read_mp3_frames(data: bytes) -> Tuple[Optional[str], List[bytes], float]:
+    '''
+    Return the format, the audio frames (without tags and the Xing/Info header frame) and the duration in seconds.
+    '''
+    position = skip_id3v2_tag(data)
+    audio_format = None
+    frames = []
+    duration = 0.0
+
+    while position + 4 <= len(data):
+        frame_header = parse_mp3_frame_header(data[position:position + 4])
+        if frame_header is None:
+            # e.g., the ID3v1 tag at the end
+            break
+
+        frame_format, frame_length, samples_per_frame, sample_rate = frame_header
+        frame = data[position:position + frame_length]
+        position += frame_length
+
+        if not frames and (b'Xing' in frame[:64] or b'Info' in frame[:64]):
+            continue
+        if audio_format is not None and frame_format != audio_format:
+            break
+
+        audio_format = frame_format
+        frames.append(frame)
+        duration += samples_per_frame / sample_rate
+
+    return audio_format, frames, duration
+
+
+def get_participant_sprite_directory(participant_id: str) -> str:
+    return f"{_SPRITE_DIRECTORY}/{participant_id}"
+
+
+def get_word_audio_urls(word: Word) -> List[str]:
+    return [url for url in (word.foreignPronunciation, word.englishPronunciation) if url]
+
+
+def get_audio_blocks(participant: Participant) -> List[List[str]]:
+    # de-duplicated audio urls of each block, in the order they are played
+    blocks = [[]]
+    for sentence in participant.sentences:
+        if is_session_sentence(sentence):
+            blocks.append([])
+        for word in sentence.subWords:
+            blocks[-1].extend(get_word_audio_urls(word))
+
+    return [list(dict.fromkeys(urls)) for urls in blocks]
+
+
+def build_participant_sprites(participant: Participant, schedule_hash: str) -> Dict[str, Dict[str, Any]]:
+    '''
+    Join the audio clips of each block into one sprite (mp3) and write the offset/duration index.
+    Only the clips in the most common format of the block are joined, the others are still served as separate files.
+    '''
+    sprite_directory = get_participant_sprite_directory(participant.participantId)
+    sprites = {}
+
+    for block_number, urls in enumerate(get_audio_blocks(participant)):
+        clips = {}
+        for url in urls:
+            try:
+                with open(os.path.join(_PUBLIC_DIRECTORY, url), 'rb') as f:
+                    audio_format, frames, duration = read_mp3_frames(f.read())
+            except OSError:
+                logger.warning("Missing audio file: %s", url)
+                continue
+            if frames:
+                clips[url] = (audio_format, frames, duration)
+
+        if not clips:
+            continue
+        sprite_format = Counter(audio_format for audio_format, _, _ in clips.values()).most_common(1)[0][0]
+
+        sprite_url = f"{sprite_directory}/block{block_number}.mp3"
+        sprite_frames = []
+        segments = {}
+        offset = 0.0
+        for url, (audio_format, frames, duration) in clips.items():
+            if audio_format != sprite_format:
+                continue
+            sprite_frames.extend(frames)
+            segments[url] = [round(offset, 3), round(duration, 3)]
+            offset += duration
+
+        if len(segments) < 2:
+            # nothing to gain from a sprite
+            continue
+
+        sprite_file = os.path.join(_PUBLIC_DIRECTORY, sprite_url)
+        os.makedirs(os.path.dirname(sprite_file), exist_ok=True)
+        with open(sprite_file, 'wb') as f:
+            f.write(b''.join(sprite_frames))
+
+        sprites[str(block_number)] = {'url': sprite_url, 'segments': segments}
+
+    write_json_file(os.path.join(_PUBLIC_DIRECTORY, sprite_directory, _SPRITE_INDEX_FILE_NAME),
+                    {'scheduleHash': schedule_hash, 'sprites': sprites})
+    return sprites
+
+
+def load_sprite_index(participant_id: str, schedule_hash: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    # None if the sprites are missing or were built for another schedule
+    index_file = os.path.join(_PUBLIC_DIRECTORY, get_participant_sprite_directory(participant_id),
+                              _SPRITE_INDEX_FILE_NAME)
+    try:
+        with open(index_file) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        logger.exception("Corrupted audio sprite index of %s", participant_id)
+        return None
+
+    if data.get('scheduleHash') != schedule_hash:
+        logger.warning("Outdated audio sprites of %s, serving separate audio files", participant_id)
+        return None
+
+    return data['sprites']
+
+
+def apply_audio_sprites(participant: Participant, sprites: Dict[str, Dict[str, Any]]) -> Participant:
+    '''
+    Replace the audio urls of each block with a segment of its sprite, as a media fragment
+    (e.g., "audios/sprites/p0/block1.mp3#t=1.248,1.872"), which the browser plays like a separate file.
+    '''
+    def get_segment_url(url: str, block: Optional[Dict[str, Any]]) -> str:
+        if block is None or url not in block['segments']:
+            return url
+        start, duration = block['segments'][url]
+        return f"{block['url']}#t={start:.3f},{start + duration:.3f}"
+
+    sentences = []
+    block_number = 0
+    for sentence in participant.sentences:
+        if is_session_sentence(sentence):
+            block_number += 1
+        block = sprites.get(str(block_number))
+
+        sentences.append(Sentence.model_construct(id=sentence.id, subWords=[
+            word.model_copy(update={
+                'foreignPronunciation': get_segment_url(word.foreignPronunciation, block),
+                'englishPronunciation': get_segment_url(word.englishPronunciation, block),
+            })
+            for word in sentence.subWords
+        ]))
+
+    return Participant.model_construct(participantId=participant.participantId,
+                                       currentSentenceIndex=participant.currentSentenceIndex,
+                                       sentences=sentences)
+
+
+if __name__ == "__main__":
+    # python -m backend.audio_sprite [participant_id ...]
+    from backend.schedule_artifact import load_schedule_index
+    from backend.schedule_store import ScheduleStore
+
+    logging.basicConfig(level=logging.INFO)
+
+    # built from the schedules with the separate audio files
+    _schedule_store = ScheduleStore(*load_schedule_index(), audio_sprites=False)
+    for _participant_id in sys.argv[1:] or _schedule_store.get_participant_ids():
+        if not _schedule_store.has_participant(_participant_id):
+            print(f"{_participant_id}: unknown participant")
+            continue
+        _sprites = build_participant_sprites(_schedule_store.get_participant(_participant_id),
+                                             _schedule_store.get_schedule_hash(_participant_id))
+        _clip_count = sum(len(sprite['segments']) for sprite in _sprites.values())
+        print(f"{_participant_id}: {len(_sprites)} sprites, {_clip_count} clips")
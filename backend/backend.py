@@ -1,11 +1,102 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Response, Query, WebSocket, WebSocketDisconnect, Request
 from fastapi.middleware.cors import CORSMiddleware
-from backend.models import Word, Sentence, Participant, LogMessage
+from backend.models import (Word, Sentence, Participant, LogMessage, LogMessageBatch, ParticipantRegistration,
+                            SentenceAck)
 import logging
-from backend.sentence_utility import get_all_participants_sentences
+import os
+from typing import Callable, Dict, Optional
+from backend.asset_utility import get_assets_manifest
+from backend.compact_schedule import CompactParticipant
+from backend.content_encoding import Representation, JSON_MEDIA_TYPE, get_representation, get_representation_etag
+from backend.event_store import EventStore, get_served_event
+from backend.log_writer import LogWriter
+from backend.metrics import metrics, MetricsMiddleware, format_metric
+from backend.progress_store import get_progress_store, get_next_sentence_index, get_progress_key, call_progress_store
+from backend.schedule_reloader import ScheduleReloader
+from backend.schedule_store import ScheduleStore
+from backend.sentence_parts import FULL_FORMAT, SENTENCE_FORMAT_PATTERN
+from backend.sentence_utility import get_all_styles
+from backend.study_registry import StudyRegistry, DEFAULT_STUDY
 
 logger = logging.getLogger()
-app = FastAPI()
+
+# EVENT_STORE=0 disables the structured events (backend/data/runtime/events), keeping only the text log
+_EVENT_STORE = os.environ.get('EVENT_STORE', '1') != '0'
+
+log_writer = LogWriter(event_store=EventStore() if _EVENT_STORE else None)
+
+progress_store = get_progress_store()
+
+# SCHEDULE_RELOAD=0 disables reloading the csv files while running
+_SCHEDULE_RELOAD = os.environ.get('SCHEDULE_RELOAD', '1') != '0'
+
+
+study_registry = StudyRegistry()
+
+# of the studies in use, each started on the first request of its study
+schedule_reloaders: Dict[str, ScheduleReloader] = {}
+
+
+def get_schedule_store(study=DEFAULT_STUDY) -> ScheduleStore:
+    # loaded on first use, i.e., at the startup (see `lifespan`) rather than when this module is imported
+    return study_registry.get_schedule_store(study)
+
+
+def start_schedule_reloader(study: str):
+    if not _SCHEDULE_RELOAD or study in schedule_reloaders:
+        return
+    schedule_reloader = ScheduleReloader(study_registry.get_schedule_store_getter(study),
+                                         study_registry.get_schedule_store_setter(study), progress_store,
+                                         study=study_registry.get_study(study).get_progress_study())
+    schedule_reloaders[study] = schedule_reloader
+    schedule_reloader.start()
+
+
+async def get_study_schedule_store(study: str) -> ScheduleStore:
+    # for the endpoints; a study's schedules are loaded (and compiled, if outdated) off the event loop on its
+    # first request, so the other studies' requests are served meanwhile
+    if not study_registry.has_study(study):
+        logging.error("Unable to find study: " + str(study))
+        raise HTTPException(status_code=404, detail="Study not found")
+
+    if study_registry.is_loaded(study):
+        schedule_store = get_schedule_store(study)
+    else:
+        schedule_store = await asyncio.to_thread(get_schedule_store, study)
+    start_schedule_reloader(study)
+    return schedule_store
+
+
+async def get_loaded_participant(schedule_store: ScheduleStore, participant_id: str) -> Optional[CompactParticipant]:
+    # read (or compiled, e.g., after a code change) off the event loop on the participant's first request,
+    # so the other participants' requests are served meanwhile
+    if schedule_store.is_cached(participant_id):
+        return schedule_store.get_participant(participant_id)
+    return await asyncio.to_thread(schedule_store.get_participant, participant_id)
+
+
+def get_participant_key(study: str, participant_id: str) -> str:
+    # of the participant's progress and events, unique over all studies
+    return get_progress_key(participant_id, study_registry.get_study(study).get_progress_study())
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    get_schedule_store()
+    progress_store.start()
+    log_writer.start()
+    start_schedule_reloader(DEFAULT_STUDY)
+    yield
+    for schedule_reloader in list(schedule_reloaders.values()):
+        await schedule_reloader.stop()
+    schedule_reloaders.clear()
+    log_writer.stop()
+    progress_store.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -14,42 +105,404 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["ETag"],  # Allows the clients to revalidate with If-None-Match
 )
+app.add_middleware(MetricsMiddleware, metrics=metrics)
 
-all_participants = get_all_participants_sentences()
+_MAX_SENTENCE_WINDOW = 10
 
+# cursor endpoints (next-sentence) must never be served from a cache
+_CACHE_CONTROL_CURSOR = "no-store"
+# read-only endpoints may be cached, but revalidated (If-None-Match) as the schedules can be reloaded
+_CACHE_CONTROL_READ_ONLY = "private, no-cache"
 
-@app.post("/api/log")
-async def log_to_file(message: LogMessage):
-    logger.info(message)
 
+def is_not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
 
-@app.get("/api/next-sentence/{participant_id}")
-async def next_sentence(participant_id: str):
-    global all_participants
+    if if_none_match.strip() == '*':
+        return True
+
+    # weak comparison, as recommended for If-None-Match
+    request_etags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return etag in request_etags
 
+
+def get_request_representation(request: Request, sentence_format: str) -> Representation:
+    # JSON or MessagePack (Accept), compressed with brotli or gzip (Accept-Encoding) if the client accepts it,
+    # with the sentences in the full or the parts format (?format=parts)
+    return get_representation(request.headers.get('accept'), request.headers.get('accept-encoding'), sentence_format)
+
+
+def get_encoded_response(representation: Representation, content: bytes, headers: Dict[str, str]) -> Response:
+    headers['Vary'] = 'Accept, Accept-Encoding'
+    if representation.encoding is not None:
+        headers['Content-Encoding'] = representation.encoding
+    return Response(content=content, media_type=representation.media_type, headers=headers)
+
+
+def get_cacheable_response(request: Request, representation: Representation, get_content: Callable[[], bytes],
+                           etag: str, cache_control: str) -> Response:
+    etag = get_representation_etag(etag, representation)
+    headers = {'ETag': etag, 'Cache-Control': cache_control}
+
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers={**headers, 'Vary': 'Accept, Accept-Encoding'})
+
+    return get_encoded_response(representation, get_content(), headers)
+
+
+@app.get("/api/{study}/next-sentence/{participant_id}")
+@app.get("/api/next-sentence/{participant_id}")
+async def next_sentence(request: Request, participant_id: str, study: str = DEFAULT_STUDY,
+                        sentence_format: str = Query(default=FULL_FORMAT, alias='format',
+                                                     pattern=SENTENCE_FORMAT_PATTERN)):
+    schedule_store = await get_study_schedule_store(study)
+    participant_key = get_participant_key(study, participant_id)
     try:
-        participant = all_participants.get(participant_id)
+        participant = await get_loaded_participant(schedule_store, participant_id)
+
+        sentence_count = schedule_store.get_sentence_count(participant.participantId)
+        sentence_index = await call_progress_store(progress_store, progress_store.advance, participant_key,
+                                                   sentence_count)
+
+        sentence = participant.sentences[sentence_index]
 
-        all_sentences = participant.sentences
-        sentence_index = participant.currentSentenceIndex + 1
+        logger.info(
+            f"Returning sentence:: participant:{participant_key}, sentence index:{sentence_index}, word_count:{len(sentence.subWords)}")
+        log_writer.put_event(get_served_event(participant_key, sentence_index, sentence.id))
+
+        # the sentence is already encoded, so skip the response validation and serialization
+        representation = get_request_representation(request, sentence_format)
+        return get_encoded_response(
+            representation, schedule_store.get_encoded_sentence(participant_id, sentence_index, representation),
+            {'ETag': get_representation_etag(schedule_store.get_sentence_etag(participant_id, sentence_index),
+                                             representation),
+             'Cache-Control': _CACHE_CONTROL_CURSOR})
+    except AttributeError as e:
+        logging.error("Unable to find participant_id: " + str(participant_id))
+        raise HTTPException(status_code=404, detail="Participant ID not found")
 
-        if sentence_index >= len(all_sentences):
-            sentence_index = 0
 
-        vars(participant).update({'currentSentenceIndex': sentence_index})
+@app.get("/api/{study}/next-sentences/{participant_id}")
+@app.get("/api/next-sentences/{participant_id}")
+async def next_sentences(request: Request, participant_id: str,
+                         count: int = Query(default=3, ge=1, le=_MAX_SENTENCE_WINDOW), study: str = DEFAULT_STUDY,
+                         sentence_format: str = Query(default=FULL_FORMAT, alias='format',
+                                                      pattern=SENTENCE_FORMAT_PATTERN),
+                         advance: bool = True):
+    '''
+    Return the next `count` sentences in one response, advancing the cursor past all of them,
+    i.e., the same as calling `/api/next-sentence` `count` times (including the wrap around at the end).
+    With `advance=false`, the cursor is left as it is, and moved by acknowledging each sentence once displayed
+    (`/api/progress/{participant_id}`), so a reload resumes from the last displayed sentence.
+    '''
+    schedule_store = await get_study_schedule_store(study)
+    participant_key = get_participant_key(study, participant_id)
+    try:
+        participant = await get_loaded_participant(schedule_store, participant_id)
 
-        sentence = all_sentences[sentence_index]
+        sentence_count = schedule_store.get_sentence_count(participant.participantId)
+        if advance:
+            sentence_indices = await call_progress_store(progress_store, progress_store.advance_window,
+                                                         participant_key, sentence_count, min(count, sentence_count))
+        else:
+            sentence_index = await call_progress_store(progress_store, progress_store.get, participant_key)
+            sentence_indices = []
+            for _ in range(min(count, sentence_count)):
+                sentence_index = get_next_sentence_index(sentence_index, sentence_count)
+                sentence_indices.append(sentence_index)
 
+        # without advancing, the sentences are logged as served once acknowledged (see analyze_timing.py)
         logger.info(
-            f"Returning sentence:: participant:{participant_id}, sentence index:{sentence_index}, word_count:{len(sentence.subWords)}")
+            f"{'Returning' if advance else 'Prefetching'} sentences:: participant:{participant_key}, "
+            f"sentence indices:{sentence_indices}")
+        for sentence_index in sentence_indices:
+            log_writer.put_event(get_served_event(participant_key, sentence_index,
+                                                  participant.sentences[sentence_index].id))
 
-        return sentence
+        representation = get_request_representation(request, sentence_format)
+        return get_encoded_response(
+            representation, schedule_store.get_encoded_sentences(participant_id, sentence_indices, representation),
+            {'Cache-Control': _CACHE_CONTROL_CURSOR})
     except AttributeError as e:
         logging.error("Unable to find participant_id: " + str(participant_id))
         raise HTTPException(status_code=404, detail="Participant ID not found")
 
 
+@app.post("/api/{study}/progress/{participant_id}")
+@app.post("/api/progress/{participant_id}")
+async def acknowledge_sentence(ack: SentenceAck, participant_id: str, study: str = DEFAULT_STUDY):
+    '''
+    Move the cursor to the sentence displayed by the client, i.e., the HTTP counterpart of the stream's "ack",
+    for the sentences fetched with `/api/next-sentences?advance=false`.
+    '''
+    schedule_store = await get_study_schedule_store(study)
+    if not schedule_store.has_participant(participant_id):
+        logging.error("Unable to find participant_id: " + str(participant_id))
+        raise HTTPException(status_code=404, detail="Participant ID not found")
+
+    await get_loaded_participant(schedule_store, participant_id)
+    if ack.sentenceIndex >= schedule_store.get_sentence_count(participant_id):
+        raise HTTPException(status_code=404, detail="Sentence index not found")
+
+    participant_key = get_participant_key(study, participant_id)
+    await call_progress_store(progress_store, progress_store.set, participant_key, ack.sentenceIndex)
+    logger.info(f"Acknowledged sentence:: participant:{participant_key}, sentence index:{ack.sentenceIndex}")
+    return {"sentenceIndex": ack.sentenceIndex}
+
+
+def get_message_participant_key(study: str, message: LogMessage) -> Optional[str]:
+    # the events of a client's messages are keyed like the served ones, i.e., by the participant in the study
+    if not study_registry.has_study(study):
+        logging.error("Unable to find study: " + str(study))
+        raise HTTPException(status_code=404, detail="Study not found")
+    return get_participant_key(study, message.participantId) if message.participantId else None
+
+
+# after `acknowledge_sentence`, so /api/progress/log is the ack of the participant "log" (the routes match in order)
+@app.post("/api/{study}/log")
+@app.post("/api/log")
+async def log_to_file(message: LogMessage, study: str = DEFAULT_STUDY):
+    log_writer.put(message, get_message_participant_key(study, message))
+
+
+@app.post("/api/{study}/log/batch")
+@app.post("/api/log/batch")
+async def log_batch_to_file(batch: LogMessageBatch, study: str = DEFAULT_STUDY):
+    accepted = sum(log_writer.put(message, get_message_participant_key(study, message))
+                   for message in batch.messages)
+    return {"accepted": accepted, "dropped": len(batch.messages) - accepted}
+
+
+@app.get("/api/{study}/sentence/{participant_id}/{sentence_index}")
+@app.get("/api/sentence/{participant_id}/{sentence_index}")
+async def get_sentence(request: Request, participant_id: str, sentence_index: int, study: str = DEFAULT_STUDY,
+                       sentence_format: str = Query(default=FULL_FORMAT, alias='format',
+                                                    pattern=SENTENCE_FORMAT_PATTERN)):
+    '''
+    Return the sentence at `sentence_index` of the participant's schedule, without moving the cursor.
+    '''
+    schedule_store = await get_study_schedule_store(study)
+    if not schedule_store.has_participant(participant_id):
+        logging.error("Unable to find participant_id: " + str(participant_id))
+        raise HTTPException(status_code=404, detail="Participant ID not found")
+
+    await get_loaded_participant(schedule_store, participant_id)
+    if not 0 <= sentence_index < schedule_store.get_sentence_count(participant_id):
+        raise HTTPException(status_code=404, detail="Sentence index not found")
+
+    representation = get_request_representation(request, sentence_format)
+    return get_cacheable_response(
+        request, representation,
+        lambda: schedule_store.get_encoded_sentence(participant_id, sentence_index, representation),
+        schedule_store.get_sentence_etag(participant_id, sentence_index), _CACHE_CONTROL_READ_ONLY)
+
+
+@app.get("/api/{study}/schedule/{participant_id}")
+@app.get("/api/schedule/{participant_id}")
+async def get_schedule(request: Request, participant_id: str, study: str = DEFAULT_STUDY,
+                       sentence_format: str = Query(default=FULL_FORMAT, alias='format',
+                                                    pattern=SENTENCE_FORMAT_PATTERN)):
+    '''
+    Return the participant's whole schedule, without moving the cursor.
+    '''
+    schedule_store = await get_study_schedule_store(study)
+    if not schedule_store.has_participant(participant_id):
+        logging.error("Unable to find participant_id: " + str(participant_id))
+        raise HTTPException(status_code=404, detail="Participant ID not found")
+
+    await get_loaded_participant(schedule_store, participant_id)
+    representation = get_request_representation(request, sentence_format)
+    return get_cacheable_response(
+        request, representation, lambda: schedule_store.get_encoded_schedule(participant_id, representation),
+        schedule_store.get_schedule_etag(participant_id), _CACHE_CONTROL_READ_ONLY)
+
+
+@app.get("/api/{study}/assets/{participant_id}")
+@app.get("/api/assets/{participant_id}")
+async def get_assets(participant_id: str, start: int = Query(default=None, ge=0),
+                     count: int = Query(default=3, ge=1, le=_MAX_SENTENCE_WINDOW), study: str = DEFAULT_STUDY):
+    '''
+    Return the assets (audio, images) of the `count` sentences from `start` (default: the next sentence),
+    de-duplicated and in the order they are displayed, so the client can load them ahead of time.
+    '''
+    schedule_store = await get_study_schedule_store(study)
+    participant = await get_loaded_participant(schedule_store, participant_id)
+    if participant is None:
+        logging.error("Unable to find participant_id: " + str(participant_id))
+        raise HTTPException(status_code=404, detail="Participant ID not found")
+
+    sentence_count = len(participant.sentences)
+    if start is None:
+        sentence_index = get_next_sentence_index(
+            await call_progress_store(progress_store, progress_store.get, get_participant_key(study, participant_id)),
+            sentence_count)
+    else:
+        sentence_index = start
+
+    if sentence_index >= sentence_count:
+        raise HTTPException(status_code=404, detail="Sentence index not found")
+
+    sentence_indices = []
+    for _ in range(min(count, sentence_count)):
+        sentence_indices.append(sentence_index)
+        sentence_index = get_next_sentence_index(sentence_index, sentence_count)
+
+    return {
+        "participantId": participant_id,
+        "sentenceIndices": sentence_indices,
+        "assets": get_assets_manifest([participant.sentences[index] for index in sentence_indices]),
+    }
+
+
+@app.websocket("/api/{study}/stream/{participant_id}")
+@app.websocket("/api/stream/{participant_id}")
+async def stream_sentences(websocket: WebSocket, participant_id: str,
+                           window: int = Query(default=3, ge=1, le=_MAX_SENTENCE_WINDOW), study: str = DEFAULT_STUDY,
+                           sentence_format: str = Query(default=FULL_FORMAT, alias='format',
+                                                        pattern=SENTENCE_FORMAT_PATTERN)):
+    '''
+    Push the upcoming sentences ahead of time, keeping `window` sentences unacknowledged:
+        server -> client: {"type": "sentence", "sentenceIndex": 5, "sentence": {...}}
+        client -> server: {"type": "ack", "sentenceIndex": 5}, when the sentence is displayed (advances the cursor)
+                          {"type": "log", "message": "...", "timestamp": "..."}
+                          {"type": "logs", "messages": [{"message": "...", "timestamp": "..."}, ...]}
+    Unlike the HTTP endpoints, the cursor only advances on acknowledgements, so a reconnect resumes from
+    the last displayed sentence.
+    '''
+    await websocket.accept()
+
+    if not study_registry.has_study(study):
+        logging.error("Unable to find study: " + str(study))
+        await websocket.close(code=4404, reason="Study not found")
+        return
+
+    if not (await get_study_schedule_store(study)).has_participant(participant_id):
+        logging.error("Unable to find participant_id: " + str(participant_id))
+        await websocket.close(code=4404, reason="Participant ID not found")
+        return
+
+    participant_key = get_participant_key(study, participant_id)
+    logger.info(f"Streaming sentences:: participant:{participant_key}")
+
+    next_index = await call_progress_store(progress_store, progress_store.get, participant_key)
+    # the text frames are JSON, compressed by the WebSocket (permessage-deflate) if negotiated
+    representation = Representation(JSON_MEDIA_TYPE, None, sentence_format)
+    unacknowledged_count = 0
+
+    try:
+        while True:
+            # re-read on each round, to follow the schedule reloads
+            schedule_store = get_schedule_store(study)
+            await get_loaded_participant(schedule_store, participant_id)
+            sentence_count = schedule_store.get_sentence_count(participant_id)
+            while unacknowledged_count < min(window, sentence_count):
+                next_index = get_next_sentence_index(next_index, sentence_count)
+                encoded_sentence = schedule_store.get_encoded_sentence(participant_id, next_index, representation)
+                await websocket.send_text(
+                    f'{{"type":"sentence","sentenceIndex":{next_index},"sentence":'
+                    f'{encoded_sentence.decode("utf-8")}}}')
+                log_writer.put_event(get_served_event(
+                    participant_key, next_index, schedule_store.get_participant(participant_id).sentences[next_index].id))
+                unacknowledged_count += 1
+
+            data = await websocket.receive_json()
+            message_type = data.get('type')
+
+            if message_type == 'ack':
+                await call_progress_store(progress_store, progress_store.set, participant_key,
+                                          int(data['sentenceIndex']))
+                metrics.observe_participant(participant_key)
+                logger.info(f"Acknowledged sentence:: participant:{participant_key}, "
+                            f"sentence index:{data['sentenceIndex']}")
+                unacknowledged_count = max(0, unacknowledged_count - 1)
+            elif message_type == 'log':
+                log_writer.put(LogMessage.model_validate(data), participant_key)
+            elif message_type == 'logs':
+                for message in data['messages']:
+                    log_writer.put(LogMessage.model_validate(message), participant_key)
+            else:
+                logger.warning(f"Unknown stream message:: participant:{participant_key}, type:{message_type}")
+    except WebSocketDisconnect:
+        logger.info(f"Stream closed:: participant:{participant_key}")
+    except (KeyError, ValueError, TypeError) as e:
+        logging.error(f"Invalid stream message:: participant:{participant_key}: {e}")
+        await websocket.close(code=1003, reason="Invalid message")
+
+
+@app.post("/api/{study}/participants")
+@app.post("/api/participants")
+async def register_participant(registration: ParticipantRegistration, study: str = DEFAULT_STUDY):
+    '''
+    Add a participant at runtime, without editing the participants csv file.
+    '''
+    schedule_store = await get_study_schedule_store(study)
+    participant_id = registration.participantId
+
+    if schedule_store.has_participant(participant_id):
+        raise HTTPException(status_code=409, detail="Participant ID already exists")
+
+    if len(registration.blocks) != len(get_all_styles()):
+        raise HTTPException(status_code=400, detail=f"Expected {len(get_all_styles())} style blocks")
+
+    styles_sentences = {}
+    for i, block in enumerate(registration.blocks, start=1):
+        styles_sentences[f'Style.{i}'] = block.style
+        styles_sentences[f'Sentences.{i}'] = ",".join(str(sid) for sid in block.sentenceIds)
+
+    try:
+        # compiled off the event loop
+        participant = await asyncio.to_thread(schedule_store.register_participant, participant_id, styles_sentences)
+    except Exception as e:
+        logging.error(f"Unable to register participant {participant_id}: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"participantId": participant_id, "sentenceCount": len(participant.sentences)}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    '''
+    The metrics in the Prometheus text format, of this worker (except the progress, which the workers share).
+    '''
+    schedule_stores = {study: get_schedule_store(study) for study in study_registry.get_loaded_study_names()}
+
+    lines = metrics.format()
+    lines += format_metric('schedule_info', 'gauge', "Version (input hash) of the loaded schedules", [
+        ((('study', study), ('version', schedule_store.version[:12])), 1)
+        for study, schedule_store in schedule_stores.items()
+    ])
+    lines += format_metric('schedule_cached_participants', 'gauge', "Participant schedules kept in memory", [
+        ((('study', study),), schedule_store.get_cached_participant_count())
+        for study, schedule_store in schedule_stores.items()
+    ])
+    lines += format_metric('schedule_shared_sentences', 'gauge', "Sentences shared by the participant schedules", [
+        ((('study', study),), len(schedule_store.sentence_cache))
+        for study, schedule_store in schedule_stores.items()
+    ])
+    lines += format_metric('log_queue_size', 'gauge', "Client log messages waiting to be written",
+                           [((), log_writer.get_queue_size())])
+    lines += format_metric('log_messages_total', 'counter', "Client log messages by outcome", [
+        ((('outcome', 'accepted'),), log_writer.accepted_count),
+        ((('outcome', 'dropped'),), log_writer.dropped_count),
+        ((('outcome', 'written'),), log_writer.written_count),
+    ])
+    lines += format_metric('server_events_total', 'counter', "Server events (e.g., sentences served) by outcome", [
+        ((('outcome', 'accepted'),), log_writer.accepted_event_count),
+        ((('outcome', 'dropped'),), log_writer.dropped_event_count),
+    ])
+    sentence_indices = await call_progress_store(progress_store, progress_store.get_all)
+    lines += format_metric('participant_sentence_index', 'gauge', "Current sentence index of each participant", [
+        ((('participant', participant_id),), sentence_index)
+        for participant_id, sentence_index in sorted(sentence_indices.items())
+    ])
+
+    return Response(content='\n'.join(lines) + '\n', media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,83 @@
+import sys
+from typing import Dict, Tuple
+
+from backend.models import Word, Sentence, Participant
+
+'''
+The schedules kept in memory by the schedule store: read-only objects with __slots__ and the attributes of the
+models (so their readers work with either), whose strings are interned (i.e., shared by all participants) and
+whose empty words and sentences are shared instances. The models are only built at the API boundary (`to_model`).
+'''
+
+_WORD_FIELDS = tuple(Word.model_fields)
+
+# the shared instances, by their display duration(s)
+_empty_words: Dict[int, 'CompactWord'] = {}
+_empty_sentences: Dict[Tuple[int, ...], 'CompactSentence'] = {}
+
+
+class CompactWord:
+    __slots__ = _WORD_FIELDS
+
+    def __init__(self, id: int, foreignText: str, englishTranslation: str, foreignPronunciation: str,
+                 englishPronunciation: str, displayDuration: int, imageUrl: str):
+        self.id = id
+        self.foreignText = sys.intern(foreignText)
+        self.englishTranslation = sys.intern(englishTranslation)
+        self.foreignPronunciation = sys.intern(foreignPronunciation)
+        self.englishPronunciation = sys.intern(englishPronunciation)
+        self.displayDuration = displayDuration
+        self.imageUrl = sys.intern(imageUrl)
+
+    def is_empty(self) -> bool:
+        return self.id == -1 and not (self.foreignText or self.englishTranslation or self.foreignPronunciation or
+                                      self.englishPronunciation or self.imageUrl)
+
+    def to_model(self) -> Word:
+        return Word.model_construct(**{field: getattr(self, field) for field in _WORD_FIELDS})
+
+
+class CompactSentence:
+    __slots__ = ('id', 'subWords')
+
+    def __init__(self, id: int, subWords: Tuple[CompactWord, ...]):
+        self.id = id
+        self.subWords = subWords
+
+    def to_model(self) -> Sentence:
+        return Sentence.model_construct(id=self.id, subWords=[word.to_model() for word in self.subWords])
+
+
+class CompactParticipant:
+    __slots__ = ('participantId', 'currentSentenceIndex', 'sentences')
+
+    def __init__(self, participantId: str, currentSentenceIndex: int, sentences: Tuple[CompactSentence, ...]):
+        self.participantId = participantId
+        self.currentSentenceIndex = currentSentenceIndex
+        self.sentences = sentences
+
+    def to_model(self) -> Participant:
+        return Participant.model_construct(participantId=self.participantId,
+                                           currentSentenceIndex=self.currentSentenceIndex,
+                                           sentences=[sentence.to_model() for sentence in self.sentences])
+
+
+def get_compact_word(word: Word) -> CompactWord:
+    compact_word = CompactWord(word.id, word.foreignText, word.englishTranslation, word.foreignPronunciation,
+                               word.englishPronunciation, word.displayDuration, word.imageUrl)
+    if compact_word.is_empty():
+        return _empty_words.setdefault(compact_word.displayDuration, compact_word)
+    return compact_word
+
+
+def get_compact_sentence(sentence: Sentence) -> CompactSentence:
+    compact_sentence = CompactSentence(sentence.id, tuple(get_compact_word(word) for word in sentence.subWords))
+    if compact_sentence.id == -1 and all(word.is_empty() for word in compact_sentence.subWords):
+        return _empty_sentences.setdefault(tuple(word.displayDuration for word in compact_sentence.subWords),
+                                           compact_sentence)
+    return compact_sentence
+
+
+def get_compact_participant(participant: Participant) -> CompactParticipant:
+    return CompactParticipant(sys.intern(participant.participantId), participant.currentSentenceIndex,
+                              tuple(get_compact_sentence(sentence) for sentence in participant.sentences))
@@ -0,0 +1,135 @@
+import functools
+import gzip
+from typing import Dict, List, NamedTuple, Optional, Tuple, Any
+
+from backend.sentence_parts import FULL_FORMAT, PARTS_FORMAT
+
+JSON_MEDIA_TYPE = 'application/json'
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+_MSGPACK_MEDIA_TYPES = {MSGPACK_MEDIA_TYPE, 'application/x-msgpack'}
+
+# the bodies compressed on a request (on the event loop) use the faster levels (dynamic), even the cached ones;
+# the best ratio is for the bodies compressed ahead of the requests
+_GZIP_LEVEL = 9
+_BROTLI_QUALITY = 11
+_DYNAMIC_GZIP_LEVEL = 6
+_DYNAMIC_BROTLI_QUALITY = 5
+
+# in the order preferred when the client accepts several equally
+_ENCODINGS = ['br', 'gzip']
+
+
+class Representation(NamedTuple):
+    media_type: str  # JSON_MEDIA_TYPE or MSGPACK_MEDIA_TYPE
+    encoding: Optional[str]  # the Content-Encoding, 'br' or 'gzip'; None for identity
+    sentence_format: str = FULL_FORMAT  # or PARTS_FORMAT (see sentence_parts.py), asked for in the url
+
+
+JSON_REPRESENTATION = Representation(JSON_MEDIA_TYPE, None)
+
+
+@functools.cache
+def get_brotli():
+    # optional (pip install brotli), otherwise only gzip is offered
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+@functools.cache
+def get_msgpack():
+    # optional (pip install msgpack), otherwise only JSON is offered
+    try:
+        import msgpack
+        return msgpack
+    except ImportError:
+        return None
+
+
+def get_qualities(header: Optional[str]) -> Dict[str, float]:
+    # e.g., "gzip, br;q=0.9, *;q=0" -> {"gzip": 1.0, "br": 0.9, "*": 0.0}
+    qualities = {}
+    for item in (header or '').split(','):
+        name, *parameters = item.split(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for parameter in parameters:
+            key, _, value = parameter.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+    return qualities
+
+
+def get_accepted_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    qualities = get_qualities(accept_encoding)
+    best_encoding = None
+    best_quality = 0.0
+    for encoding in _ENCODINGS:
+        if encoding == 'br' and get_brotli() is None:
+            continue
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best_encoding = encoding
+            best_quality = quality
+    return best_encoding
+
+
+def get_accepted_media_type(accept: Optional[str]) -> str:
+    # MessagePack only if asked for (and available); JSON otherwise, including for */*
+    qualities = get_qualities(accept)
+    msgpack_quality = max((qualities.get(media_type, 0.0) for media_type in _MSGPACK_MEDIA_TYPES))
+    if msgpack_quality > 0 and msgpack_quality >= qualities.get(JSON_MEDIA_TYPE, 0.0) and get_msgpack() is not None:
+        return MSGPACK_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+
+def get_representation(accept: Optional[str], accept_encoding: Optional[str],
+                       sentence_format=FULL_FORMAT) -> Representation:
+    return Representation(get_accepted_media_type(accept), get_accepted_encoding(accept_encoding), sentence_format)
+
+
+def get_representation_etag(etag: str, representation: Representation) -> str:
+    # each representation has its own ETag, e.g., "<hash>-3" -> "<hash>-3-parts-msgpack-br"
+    suffix = ''
+    if representation.sentence_format == PARTS_FORMAT:
+        suffix += '-parts'
+    if representation.media_type == MSGPACK_MEDIA_TYPE:
+        suffix += '-msgpack'
+    if representation.encoding is not None:
+        suffix += '-' + representation.encoding
+    return f'{etag[:-1]}{suffix}"' if suffix else etag
+
+
+def compress(content: bytes, encoding: Optional[str], dynamic=False) -> bytes:
+    if encoding is None:
+        return content
+    if encoding == 'gzip':
+        # mtime=0, so the same content is always compressed to the same bytes
+        return gzip.compress(content, compresslevel=_DYNAMIC_GZIP_LEVEL if dynamic else _GZIP_LEVEL, mtime=0)
+    if encoding == 'br':
+        return get_brotli().compress(content, quality=_DYNAMIC_BROTLI_QUALITY if dynamic else _BROTLI_QUALITY)
+    raise ValueError(f"Unknown encoding: {encoding}")
+
+
+def pack(value: Any) -> bytes:
+    return get_msgpack().packb(value, use_bin_type=True)
+
+
+def pack_map(packed_items: List[Tuple[str, bytes]]) -> bytes:
+    # of already packed values, e.g., [("sentences", pack_array(packed_sentences))], like joining the encoded JSON
+    packer = get_msgpack().Packer(use_bin_type=True)
+    return packer.pack_map_header(len(packed_items)) + b''.join(packer.pack(key) + packed_value
+                                                                 for key, packed_value in packed_items)
+
+
+def pack_array(packed_values: List[bytes]) -> bytes:
+    # of already packed values
+    return get_msgpack().Packer(use_bin_type=True).pack_array_header(len(packed_values)) + b''.join(packed_values)
@@ -0,0 +1,242 @@
+import glob
+import json
+import logging
+import os
+import re
+import sys
+import time
+from typing import Dict, List, Optional, Any
+from urllib.parse import quote
+
+logger = logging.getLogger()
+
+_EVENTS_DIRECTORY = 'backend/data/runtime/events'
+'''
+events/20241001-<pid>.jsonl: the events received on that day, appended by each backend process (worker)
+events/parquet/day=20241001/participant=p101/20241001-<pid>.parquet: the compacted events of past days,
+    where the participant is url encoded (as in Hive partitions), e.g., participant=de-en%2Fp101 for p101 of
+    the study de-en (see progress_store.get_progress_key)
+'''
+
+# a day is compacted once no batch of it can be written anymore, i.e., a while after its end
+_COMPACT_DELAY_SECONDS = 60 * 60
+_COMPACT_INTERVAL_SECONDS = 60 * 60
+
+# the columns of an event; None where unknown (e.g., the word id of a sentence event)
+EVENT_COLUMNS = {
+    'time': 'float64',  # when the server received it (epoch seconds)
+    'clientTime': 'string',  # the client's timestamp (ISO 8601)
+    'participantId': 'string',
+    'kind': 'string',
+    'sentenceIndex': 'int32',  # the index in the participant's schedule
+    'sentenceId': 'int32',
+    'wordId': 'int32',
+    'sentenceCount': 'int32',  # the client's count of the displayed sentences
+    'message': 'string',
+}
+
+# the kinds of the client's log messages (VocabularyCard.vue), for the clients that only send the message
+_MESSAGE_PATTERNS = [
+    ('sentence_fetched', re.compile(r"^Successfully fetched next sentence (?P<sentenceCount>\d+)$")),
+    ('word_displayed',
+     re.compile(r"^Attempting to fetch next word with id (?P<wordId>\d+) in sentence (?P<sentenceCount>\d+)$")),
+    ('sentence_finished', re.compile(r"^Finished current sentence (?P<sentenceCount>\d+); Fetching next sentence$")),
+    ('error', re.compile(r"^Error ")),
+]
+_OTHER_KIND = 'message'
+
+SERVED_KIND = 'sentence_served'
+
+
+def get_day(created: float) -> str:
+    # the local day, as the system-YYYYMMDD.log files
+    return time.strftime('%Y%m%d', time.localtime(created))
+
+
+def get_client_event(created: float, message, participant_id: Optional[str] = None) -> Dict[str, Any]:
+    '''
+    The typed event of a client's log message (`LogMessage`): the fields sent by the client, and otherwise
+    the ones found in the message text. The `participant_id` of the endpoint (i.e., the participant's key in
+    its study, as in the served events) takes precedence over the one sent by the client.
+    '''
+    event = dict.fromkeys(EVENT_COLUMNS)
+    event.update(time=created, clientTime=message.timestamp, message=message.message,
+                 participantId=participant_id or message.participantId, kind=message.kind,
+                 sentenceIndex=message.sentenceIndex, sentenceId=message.sentenceId, wordId=message.wordId,
+                 sentenceCount=message.sentenceCount)
+
+    if event['kind'] is None:
+        event['kind'] = _OTHER_KIND
+        for kind, pattern in _MESSAGE_PATTERNS:
+            match = pattern.match(message.message)
+            if match:
+                event['kind'] = kind
+                for name, value in match.groupdict().items():
+                    if event[name] is None:
+                        event[name] = int(value)
+                break
+
+    return event
+
+
+def get_served_event(participant_id: str, sentence_index: int, sentence_id: int) -> Dict[str, Any]:
+    # a sentence returned (or pushed) by the server; the time is added when it is written
+    event = dict.fromkeys(EVENT_COLUMNS)
+    event.update(participantId=participant_id, kind=SERVED_KIND, sentenceIndex=sentence_index, sentenceId=sentence_id)
+    return event
+
+
+class EventStore:
+    '''
+    Structured events of the study sessions (the client's log messages and the sentences served), appended as
+    JSON lines to a file per day and process, and compacted into Parquet files partitioned by day and participant
+    (requires pyarrow, otherwise the events stay in the JSON lines files).
+    Written only from the log writer's thread.
+    '''
+
+    def __init__(self, directory=_EVENTS_DIRECTORY):
+        self._directory = directory
+        self._next_compaction = 0.0
+
+    def append(self, events: List[Dict[str, Any]]):
+        if not events:
+            return
+
+        events_by_day = {}
+        for event in events:
+            events_by_day.setdefault(get_day(event['time']), []).append(event)
+
+        os.makedirs(self._directory, exist_ok=True)
+        for day, day_events in events_by_day.items():
+            # a file per process, so the workers never interleave their lines
+            with open(os.path.join(self._directory, f'{day}-{os.getpid()}.jsonl'), 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in day_events))
+
+    def compact_if_due(self):
+        if time.monotonic() < self._next_compaction:
+            return
+        self._next_compaction = time.monotonic() + _COMPACT_INTERVAL_SECONDS
+
+        try:
+            compact_events(self._directory)
+        except ImportError:
+            logger.warning("Unable to compact the events without pyarrow; they are kept as JSON lines")
+            self._next_compaction = float('inf')
+        except Exception:
+            logger.exception("Unable to compact the events: %s", self._directory)
+
+
+def read_jsonl_events(file_name: str, participant_id: Optional[str] = None, columns: Optional[List[str]] = None):
+    with open(file_name, encoding='utf-8') as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                # e.g., the last line of a process that stopped while writing
+                continue
+            if participant_id is not None and event.get('participantId') != participant_id:
+                continue
+            yield event if columns is None else {column: event.get(column) for column in columns}
+
+
+def get_partition_name(participant_id: str) -> str:
+    # a single directory, also for the participants of a study (e.g., "de-en/p101")
+    return f"participant={quote(participant_id, safe='')}"
+
+
+def get_arrow_schema():
+    import pyarrow
+
+    # e.g., pyarrow.int32()
+    return pyarrow.schema([(column, getattr(pyarrow, column_type)()) for column, column_type in EVENT_COLUMNS.items()])
+
+
+def compact_events(directory=_EVENTS_DIRECTORY, all_days=False) -> int:
+    '''
+    Move the events of the past days (or of all days) from the JSON lines files into Parquet files,
+    one per day, participant and JSON lines file. Returns the number of compacted files.
+    '''
+    last_day = get_day(time.time() - _COMPACT_DELAY_SECONDS)
+    file_names = [file_name for file_name in sorted(glob.glob(os.path.join(directory, '*.jsonl')))
+                  if all_days or os.path.basename(file_name).split('-')[0] < last_day]
+    if not file_names:
+        return 0
+
+    import pyarrow
+    import pyarrow.parquet
+
+    schema = get_arrow_schema()
+
+    compacted_count = 0
+    for file_name in file_names:
+        name = os.path.basename(file_name)[:-len('.jsonl')]
+        day = name.split('-')[0]
+
+        # claimed by renaming, so two workers never compact the same file
+        claimed_file_name = file_name + '.compacting'
+        try:
+            os.rename(file_name, claimed_file_name)
+        except FileNotFoundError:
+            continue
+
+        events_by_participant = {}
+        for event in read_jsonl_events(claimed_file_name):
+            events_by_participant.setdefault(event.get('participantId') or 'unknown', []).append(event)
+
+        for participant_id, events in events_by_participant.items():
+            partition_directory = os.path.join(directory, 'parquet', f'day={day}', get_partition_name(participant_id))
+            os.makedirs(partition_directory, exist_ok=True)
+            table = pyarrow.Table.from_pylist(events, schema=schema)
+            pyarrow.parquet.write_table(table, os.path.join(partition_directory, f'{name}.parquet'))
+
+        os.remove(claimed_file_name)
+        compacted_count += 1
+
+    return compacted_count
+
+
+def load_participant_timeline(participant_id: str, columns: Optional[List[str]] = None,
+                              directory=_EVENTS_DIRECTORY):
+    '''
+    One participant's events in time order (a pandas DataFrame), reading only that participant's Parquet
+    partitions and only the given columns, plus the events not compacted yet.
+    '''
+    import pandas as pd
+
+    if columns is not None:
+        columns = list(dict.fromkeys(['time'] + columns))
+
+    frames = []
+    parquet_files = sorted(glob.glob(os.path.join(directory, 'parquet', 'day=*', get_partition_name(participant_id),
+                                                  '*.parquet')))
+    if parquet_files:
+        import pyarrow.parquet
+
+        frames.extend(pyarrow.parquet.read_table(file_name, columns=columns).to_pandas()
+                      for file_name in parquet_files)
+
+    recent_events = [event for file_name in sorted(glob.glob(os.path.join(directory, '*.jsonl')))
+                     for event in read_jsonl_events(file_name, participant_id, columns)]
+    if recent_events:
+        frames.append(pd.DataFrame(recent_events, columns=columns or list(EVENT_COLUMNS)))
+
+    if not frames:
+        return pd.DataFrame(columns=columns or list(EVENT_COLUMNS))
+
+    timeline = pd.concat(frames, ignore_index=True).sort_values('time', kind='stable', ignore_index=True)
+    # the nullable types, e.g., Int32 rather than float64 for the word ids with missing values
+    return timeline.astype({column: column_type.capitalize() if column_type == 'int32' else column_type
+                            for column, column_type in EVENT_COLUMNS.items() if column in timeline.columns})
+
+
+if __name__ == "__main__":
+    # python -m backend.event_store compact [--all]
+    # python -m backend.event_store timeline <participant_id> [column ...]
+    logging.basicConfig(level=logging.INFO)
+
+    if sys.argv[1:2] == ['compact']:
+        print(f"Compacted {compact_events(all_days='--all' in sys.argv)} files")
+    elif sys.argv[1:2] == ['timeline'] and len(sys.argv) > 2:
+        print(load_participant_timeline(sys.argv[2], sys.argv[3:] or None).to_string())
+    else:
+        print("usage: python -m backend.event_store compact [--all] | timeline <participant_id> [column ...]")
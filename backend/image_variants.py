@@ -0,0 +1,270 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+from backend.models import Sentence, Participant
+from backend.schedule_artifact import write_json_file
+from backend.sentence_utility import get_all_sentences_content, get_all_styles, get_sentence
+
+logger = logging.getLogger()
+
+_PUBLIC_DIRECTORY = 'frontend/public'
+_VARIANT_DIRECTORY = 'images/optimized'  # inside the public directory
+
+_MANIFEST_FILE = os.path.join(_PUBLIC_DIRECTORY, _VARIANT_DIRECTORY, 'manifest.json')
+'''
+{"key": "<hash of the images>",
+ "images": {"images/he-bakes.png|images/a-cake.png": {
+                "hash": "<hash of the source files>",
+                "variants": {"webp": {"500": {"url": "images/optimized/he-bakes+a-cake-500.webp",
+                                               "width": 500, "height": 500, "bytes": 12345}, ...}, ...}}, ...}}
+'''
+
+_IMAGE_URL_SEPARATOR = '|'
+
+# as displayed by ImageDisplay.vue: a square (object-fit: cover) on black, the last image on top
+_BACKGROUND_COLOR = (0, 0, 0, 255)
+_LAYER_OPACITIES = [1, 0.4, 0.2]  # from the top layer down
+
+_VARIANT_WIDTHS = [500, 1000]  # 1x and 2x of the display size
+_FORMAT_OPTIONS = {
+    'webp': {'quality': 80, 'method': 6},
+    'avif': {'quality': 60},
+}
+
+# bump this when the rendering changes, so that the variants are rebuilt
+_RENDER_VERSION = 1
+
+
+def get_all_image_urls(sentences_content: dict = None) -> List[str]:
+    '''
+    Every imageUrl the schedules can contain, i.e., of each sentence in each style,
+    including the composites (e.g., "images/he-bakes.png|images/a-cake.png").
+    '''
+    sentences_content = sentences_content or get_all_sentences_content()
+
+    image_urls = {}
+    for sentence_id, (_, sentence_l2, sentence_l1, sentence_image, sentence_parts) in sentences_content.items():
+        for style in get_all_styles():
+            sentence = get_sentence(style, sentence_id, sentence_l2, sentence_l1, sentence_image, sentence_parts)
+            image_urls.update(dict.fromkeys(word.imageUrl for word in sentence.subWords if word.imageUrl))
+
+    return list(image_urls)
+
+
+def get_source_files(image_url: str) -> List[str]:
+    return [os.path.join(_PUBLIC_DIRECTORY, url) for url in image_url.split(_IMAGE_URL_SEPARATOR) if url]
+
+
+def get_sources_hash(image_url: str) -> str:
+    digest = hashlib.sha1(f"render:{_RENDER_VERSION}".encode())
+    for file in get_source_files(image_url):
+        with open(file, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def get_variant_url(image_url: str, width: int, image_format: str) -> str:
+    names = [os.path.splitext(os.path.basename(url))[0] for url in image_url.split(_IMAGE_URL_SEPARATOR) if url]
+    return f"{_VARIANT_DIRECTORY}/{'+'.join(names)}-{width}.{image_format}"
+
+
+def render_image(image_url: str, size: int):
+    '''
+    Render the image(s) of the url the way the browser displays them, as one opaque square image.
+    '''
+    from PIL import Image, ImageOps
+
+    canvas = Image.new('RGBA', (size, size), _BACKGROUND_COLOR)
+    files = get_source_files(image_url)
+    for index, file in enumerate(files):
+        with Image.open(file) as image:
+            layer = ImageOps.fit(image.convert('RGBA'), (size, size), Image.Resampling.LANCZOS)
+
+        opacity = _LAYER_OPACITIES[len(files) - index - 1]
+        if opacity < 1:
+            layer.putalpha(layer.getchannel('A').point(lambda alpha: round(alpha * opacity)))
+        canvas = Image.alpha_composite(canvas, layer)
+
+    return canvas.convert('RGB')
+
+
+def get_largest_source_size(image_url: str) -> int:
+    from PIL import Image
+
+    sizes = []
+    for file in get_source_files(image_url):
+        with Image.open(file) as image:
+            sizes.append(min(image.size))
+    return max(sizes)
+
+
+def build_image_variants(image_url: str, image_formats: List[str]) -> Dict[str, Any]:
+    '''
+    Write the variants of the image(s) of the url in each format, without upscaling beyond the source images.
+    '''
+    from PIL import Image
+
+    source_size = get_largest_source_size(image_url)
+    widths = [width for width in _VARIANT_WIDTHS if width <= source_size] or [_VARIANT_WIDTHS[0]]
+
+    rendered = render_image(image_url, max(widths))
+    variants = {image_format: {} for image_format in image_formats}
+    for width in widths:
+        image = rendered if width == rendered.width else rendered.resize((width, width), Image.Resampling.LANCZOS)
+        for image_format in image_formats:
+            variant_url = get_variant_url(image_url, width, image_format)
+            variant_file = os.path.join(_PUBLIC_DIRECTORY, variant_url)
+            os.makedirs(os.path.dirname(variant_file), exist_ok=True)
+            image.save(variant_file, format=image_format.upper(), **_FORMAT_OPTIONS[image_format])
+
+            variants[image_format][str(width)] = {
+                'url': variant_url, 'width': width, 'height': width, 'bytes': os.path.getsize(variant_file),
+            }
+
+    return variants
+
+
+def build_manifest_entry(image_url: str, image_formats: List[str]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    # run in a worker process
+    try:
+        sources_hash = get_sources_hash(image_url)
+    except OSError:
+        logger.warning("Missing image file: %s", image_url)
+        return image_url, None
+
+    return image_url, {'hash': sources_hash, 'variants': build_image_variants(image_url, image_formats)}
+
+
+def is_entry_current(image_url: str, entry: Optional[Dict[str, Any]], image_formats: List[str]) -> bool:
+    try:
+        if entry is None or entry['hash'] != get_sources_hash(image_url):
+            return False
+    except OSError:
+        return False
+
+    return all(image_format in entry['variants'] and all(
+        os.path.exists(os.path.join(_PUBLIC_DIRECTORY, variant['url']))
+        for variant in entry['variants'][image_format].values()
+    ) for image_format in image_formats)
+
+
+def get_supported_formats(image_formats: List[str]) -> List[str]:
+    from PIL import features
+
+    supported = []
+    for image_format in image_formats:
+        if features.check(image_format):
+            supported.append(image_format)
+        else:
+            logger.warning("Pillow is built without %s support, skipped", image_format)
+    return supported
+
+
+def build_image_manifest(image_formats: List[str], workers: int = None, manifest_file=_MANIFEST_FILE) -> Dict[str, Any]:
+    '''
+    Build the variants of every (composite) image used by the schedules, in parallel,
+    skipping the ones whose source files have not changed since the last build.
+    '''
+    start = time.perf_counter()
+    image_formats = get_supported_formats(image_formats)
+
+    old_images = {}
+    old_manifest = read_image_manifest(manifest_file)
+    if old_manifest is not None:
+        old_images = old_manifest['images']
+
+    images = {}
+    outdated_urls = []
+    for image_url in get_all_image_urls():
+        if is_entry_current(image_url, old_images.get(image_url), image_formats):
+            images[image_url] = old_images[image_url]
+        else:
+            outdated_urls.append(image_url)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for image_url, entry in executor.map(build_manifest_entry, outdated_urls,
+                                             [image_formats] * len(outdated_urls), chunksize=4):
+            if entry is not None:
+                images[image_url] = entry
+
+    manifest = {'key': hashlib.sha1(json.dumps(images, sort_keys=True).encode('utf-8')).hexdigest(),
+                'images': images}
+    write_json_file(manifest_file, manifest)
+
+    logger.info("Built variants of %d/%d images in %.3fs: %s",
+                len(outdated_urls), len(images), time.perf_counter() - start, manifest_file)
+    return manifest
+
+
+def read_image_manifest(manifest_file=_MANIFEST_FILE) -> Optional[Dict[str, Any]]:
+    try:
+        with open(manifest_file) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        logger.exception("Corrupted image manifest: %s", manifest_file)
+        return None
+
+
+def get_image_variant_url(image_url: str, manifest: Dict[str, Any], image_format: str, width: int) -> str:
+    # the largest variant not wider than `width` (or the smallest one); the original url if there is none
+    entry = manifest['images'].get(image_url)
+    if entry is None or image_format not in entry['variants']:
+        return image_url
+
+    variants = sorted(entry['variants'][image_format].values(), key=lambda variant: variant['width'])
+    if not variants:
+        return image_url
+    fitting = [variant for variant in variants if variant['width'] <= width]
+    return (fitting[-1] if fitting else variants[0])['url']
+
+
+def apply_sentence_image_variants(sentence: Sentence, manifest: Dict[str, Any], image_format: str,
+                                  width: int) -> Sentence:
+    return Sentence.model_construct(id=sentence.id, subWords=[
+        word.model_copy(update={'imageUrl': get_image_variant_url(word.imageUrl, manifest, image_format, width)})
+        if word.imageUrl else word
+        for word in sentence.subWords
+    ])
+
+
+def apply_image_variants(participant: Participant, manifest: Dict[str, Any], image_format: str, width: int,
+                         skip: Callable[[Sentence], bool] = None) -> Participant:
+    '''
+    Replace the image urls with their variants; a composite (e.g., "images/he-bakes.png|images/a-cake.png")
+    becomes one pre-rendered image, displayed like the original layers.
+    The sentences for which `skip` is true are kept as they are, e.g., the shared ones (see sentence_cache.py),
+    rewritten once by the schedule store.
+    '''
+    sentences = [sentence if skip is not None and skip(sentence) else
+                 apply_sentence_image_variants(sentence, manifest, image_format, width)
+                 for sentence in participant.sentences]
+
+    return Participant.model_construct(participantId=participant.participantId,
+                                       currentSentenceIndex=participant.currentSentenceIndex,
+                                       sentences=sentences)
+
+
+if __name__ == "__main__":
+    # requires Pillow (pip install Pillow)
+    logging.basicConfig(level=logging.INFO)
+
+    _parser = argparse.ArgumentParser(description="Build the optimized variants of the images")
+    _parser.add_argument('--formats', default='webp,avif', help="comma separated, e.g., webp,avif")
+    _parser.add_argument('--workers', type=int, default=None, help="processes (default: number of cores)")
+    _args = _parser.parse_args()
+
+    _manifest = build_image_manifest(_args.formats.split(','), _args.workers)
+    _sizes = {}
+    for _entry in _manifest['images'].values():
+        for _image_format, _variants in _entry['variants'].items():
+            _sizes[_image_format] = _sizes.get(_image_format, 0) + sum(v['bytes'] for v in _variants.values())
+    print(f"{len(_manifest['images'])} images in {_VARIANT_DIRECTORY}: " +
+          ", ".join(f"{image_format} {size / 1e6:.1f}MB" for image_format, size in _sizes.items()))
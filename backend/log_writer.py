@@ -0,0 +1,134 @@
+import logging
+import queue
+import threading
+import time
+from typing import Dict, Optional, Any
+
+from backend.event_store import EventStore, get_client_event
+
+logger = logging.getLogger()
+
+_MAX_QUEUE_SIZE = 10000
+_BATCH_SIZE = 500
+_FLUSH_INTERVAL_SECONDS = 1.0
+
+
+class LogWriter:
+    '''
+    Bounded queue of client log messages, written to the root logger in batches by a background thread,
+    so the event loop never waits on the log file; also appended to the `event_store` as typed events,
+    with the server's events (e.g., the sentences served).
+    A batch is written when it reaches `batch_size` messages or `flush_interval` seconds, whichever comes first.
+    '''
+
+    def __init__(self, max_queue_size=_MAX_QUEUE_SIZE, batch_size=_BATCH_SIZE,
+                 flush_interval=_FLUSH_INTERVAL_SECONDS, event_store: Optional[EventStore] = None):
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._event_store = event_store
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self.accepted_count = 0
+        self.dropped_count = 0
+        self.written_count = 0
+        # the server events (e.g., the sentences served) are counted apart from the client log messages
+        self.accepted_event_count = 0
+        self.dropped_event_count = 0
+
+    def put(self, message, participant_id: Optional[str] = None) -> bool:
+        try:
+            # keep the receive time, as the message is written later
+            self._queue.put_nowait((time.time(), message, participant_id))
+            self.accepted_count += 1
+            return True
+        except queue.Full:
+            self.dropped_count += 1
+            return False
+
+    def put_event(self, event: Dict[str, Any]):
+        # a server event, only written to the event store
+        if self._event_store is None:
+            return
+        try:
+            self._queue.put_nowait((time.time(), None, event))
+            self.accepted_event_count += 1
+        except queue.Full:
+            self.dropped_event_count += 1
+
+    def get_queue_size(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        # flushes everything queued so far
+        if self._thread is None:
+            return
+
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+        if self.dropped_count:
+            logger.warning("Dropped %d client log messages (queue full)", self.dropped_count)
+        if self.dropped_event_count:
+            logger.warning("Dropped %d server events (queue full)", self.dropped_event_count)
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+            if self._event_store is not None:
+                self._event_store.compact_if_due()
+
+    def _next_batch(self):
+        batch = []
+        deadline = time.monotonic() + self._flush_interval
+
+        while len(batch) < self._batch_size:
+            try:
+                if self._stopping.is_set():
+                    batch.append(self._queue.get_nowait())
+                else:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _write(self, batch):
+        events = []
+        message_count = 0
+        for created, message, details in batch:
+            if message is None:
+                events.append({**details, 'time': created})
+                continue
+
+            record = logger.makeRecord(logger.name, logging.INFO, __file__, 0, message, None, None)
+            record.created = created
+            record.msecs = (created - int(created)) * 1000
+            logger.handle(record)
+            message_count += 1
+
+            if self._event_store is not None:
+                events.append(get_client_event(created, message, details))
+
+        self.written_count += message_count
+
+        if self._event_store is not None:
+            try:
+                self._event_store.append(events)
+            except OSError:
+                logger.exception("Unable to write %d events", len(events))
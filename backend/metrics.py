@@ -0,0 +1,177 @@
+import bisect
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple, Any, Optional
+
+# seconds
+_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+_BUILD_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# a participant with a request within this time is counted as active
+_ACTIVE_SECONDS = 5 * 60
+
+_METRIC_PREFIX = 'progressive_sentences_'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    '''
+    Cumulative buckets in the Prometheus way (the last one is +Inf).
+    Not locked: observed on the event loop (and rarely from another thread), where an occasional lost increment
+    does not matter for monitoring.
+    '''
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Metrics:
+    '''
+    The backend's own measurements; the state of the other components (e.g., the log queue) is read when scraped.
+    '''
+
+    def __init__(self):
+        self.request_counts: Dict[Tuple[str, str, int], int] = defaultdict(int)
+        self.request_latencies: Dict[str, Histogram] = {}
+        self.open_streams = 0
+        self.participant_last_seen: Dict[str, float] = {}
+
+        self.schedule_build_seconds = Histogram(_BUILD_BUCKETS)
+        self.schedule_load_seconds: Optional[float] = None
+        self.schedule_reload_seconds: Optional[float] = None
+        self.schedule_reload_count = 0
+
+    def observe_request(self, route: str, method: str, status: int, seconds: float):
+        self.request_counts[(route, method, status)] += 1
+
+        histogram = self.request_latencies.get(route)
+        if histogram is None:
+            histogram = self.request_latencies.setdefault(route, Histogram(_LATENCY_BUCKETS))
+        histogram.observe(seconds)
+
+    def observe_participant(self, participant_id: str):
+        self.participant_last_seen[participant_id] = time.monotonic()
+
+    def get_active_participant_count(self) -> int:
+        # and forgets the inactive ones
+        active_after = time.monotonic() - _ACTIVE_SECONDS
+        for participant_id, last_seen in list(self.participant_last_seen.items()):
+            if last_seen < active_after:
+                self.participant_last_seen.pop(participant_id, None)
+        return len(self.participant_last_seen)
+
+    def format(self) -> List[str]:
+        lines = format_metric('http_requests_total', 'counter', "HTTP requests by route and status", [
+            ((('route', route), ('method', method), ('status', str(status))), count)
+            for (route, method, status), count in sorted(self.request_counts.items())
+        ])
+        lines += format_histogram('http_request_duration_seconds', "HTTP request latency by route", [
+            ((('route', route),), histogram) for route, histogram in sorted(self.request_latencies.items())
+        ])
+        lines += format_metric('open_streams', 'gauge', "Open WebSocket sentence streams",
+                               [((), self.open_streams)])
+        lines += format_metric('active_participants', 'gauge',
+                               f"Participants with a request in the last {_ACTIVE_SECONDS}s",
+                               [((), self.get_active_participant_count())])
+        lines += format_histogram('schedule_build_seconds', "Time to read or build a participant's schedule",
+                                  [((), self.schedule_build_seconds)])
+        if self.schedule_load_seconds is not None:
+            lines += format_metric('schedule_load_seconds', 'gauge', "Time to load the schedule index at startup",
+                                   [((), self.schedule_load_seconds)])
+        if self.schedule_reload_seconds is not None:
+            lines += format_metric('schedule_reload_seconds', 'gauge', "Time of the last schedule reload",
+                                   [((), self.schedule_reload_seconds)])
+        lines += format_metric('schedule_reloads_total', 'counter', "Schedule reloads after csv changes",
+                               [((), self.schedule_reload_count)])
+        return lines
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escaped = [(name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for name, value in labels]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def format_value(value: Any) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_metric(name: str, metric_type: str, help_text: str, samples: List[Tuple[Labels, Any]]) -> List[str]:
+    name = _METRIC_PREFIX + name
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    lines.extend(f"{name}{format_labels(labels)} {format_value(value)}" for labels, value in samples)
+    return lines
+
+
+def format_histogram(name: str, help_text: str, samples: List[Tuple[Labels, Histogram]]) -> List[str]:
+    name = _METRIC_PREFIX + name
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+
+    for labels, histogram in samples:
+        counts = list(histogram.counts)  # a consistent copy, as it may change meanwhile
+        cumulative_count = 0
+        for bound, count in zip([str(bucket) for bucket in histogram.buckets] + ['+Inf'], counts):
+            cumulative_count += count
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative_count}")
+        lines.append(f"{name}_sum{format_labels(labels)} {format_value(histogram.sum)}")
+        lines.append(f"{name}_count{format_labels(labels)} {cumulative_count}")
+
+    return lines
+
+
+class MetricsMiddleware:
+    '''
+    Times each HTTP request (by route template, e.g., "/api/next-sentence/{participant_id}") and counts the open
+    WebSocket streams; a plain ASGI middleware, which adds less to each request than `@app.middleware("http")`.
+    '''
+
+    def __init__(self, app, metrics: 'Metrics'):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'websocket':
+            self.metrics.open_streams += 1
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.metrics.open_streams -= 1
+            return
+
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # set by the router; unmatched paths are counted together, so the labels stay bounded
+            route = scope.get('route')
+            self.metrics.observe_request(getattr(route, 'path', 'unmatched'), scope['method'], status,
+                                         time.perf_counter() - start)
+
+            participant_id = scope.get('path_params', {}).get('participant_id')
+            if participant_id is not None and status < 400:
+                self.metrics.observe_participant(participant_id)
+
+
+metrics = Metrics()
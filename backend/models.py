@@ -1,9 +1,29 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
 class LogMessage(BaseModel):
     message: str
     timestamp: str
+    # the typed fields of the event store (see event_store.py); optional, as older clients only send the message
+    participantId: Optional[str] = None
+    kind: Optional[str] = None
+    sentenceIndex: Optional[int] = None
+    sentenceId: Optional[int] = None
+    wordId: Optional[int] = None
+    sentenceCount: Optional[int] = None
+
+    def __str__(self):
+        # the text log keeps its format
+        return f"message={self.message!r} timestamp={self.timestamp!r}"
+
+
+class LogMessageBatch(BaseModel):
+    messages: List[LogMessage]
+
+
+class SentenceAck(BaseModel):
+    # the sentence displayed by the client, i.e., the new cursor
+    sentenceIndex: int = Field(ge=0)
 
 
 # Define the data model
@@ -26,3 +46,13 @@ class Participant(BaseModel):
     participantId: str
     currentSentenceIndex: int
     sentences:  List[Sentence]
+
+
+class StyleSentences(BaseModel):
+    style: str
+    sentenceIds: List[int]
+
+
+class ParticipantRegistration(BaseModel):
+    participantId: str = Field(pattern=r'^[A-Za-z0-9_-]+$')
+    blocks: List[StyleSentences]  # one block per style, in the presentation order
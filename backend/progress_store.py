@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from typing import Callable, Dict, List
+
+logger = logging.getLogger()
+
+_PROGRESS_DATABASE_FILE = 'backend/data/runtime/progress.db'
+_FLUSH_INTERVAL_SECONDS = 0.5
+
+_INITIAL_SENTENCE_INDEX = -1
+
+
+def connect_progress_database(database_file: str, check_same_thread=True) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(database_file), exist_ok=True)
+
+    connection = sqlite3.connect(database_file, timeout=10, check_same_thread=check_same_thread)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("CREATE TABLE IF NOT EXISTS progress ("
+                       "participant_id TEXT PRIMARY KEY, sentence_index INTEGER NOT NULL)")
+    return connection
+
+
+def get_progress_key(participant_id: str, study=None) -> str:
+    # the participants of a study other than the default one (see study_registry.py) are kept apart
+    return participant_id if study is None else f"{study}/{participant_id}"
+
+
+def get_next_sentence_index(sentence_index: int, sentence_count: int) -> int:
+    sentence_index += 1
+
+    if sentence_index >= sentence_count:
+        sentence_index = 0
+
+    return sentence_index
+
+
+class ProgressStore:
+    '''
+    Current sentence index (cursor) of each participant, kept in memory only.
+    '''
+
+    # whether a call may wait on the disk (or the other workers), see `call_progress_store`
+    blocking = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sentence_indices: Dict[str, int] = {}
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def get(self, participant_id: str) -> int:
+        return self._sentence_indices.get(participant_id, _INITIAL_SENTENCE_INDEX)
+
+    def get_all(self) -> Dict[str, int]:
+        return dict(self._sentence_indices)
+
+    def set(self, participant_id: str, sentence_index: int):
+        with self._lock:
+            self._sentence_indices[participant_id] = sentence_index
+            self._on_changed(participant_id, sentence_index)
+
+    def advance(self, participant_id: str, sentence_count: int) -> int:
+        with self._lock:
+            sentence_index = get_next_sentence_index(self.get(participant_id), sentence_count)
+            self._sentence_indices[participant_id] = sentence_index
+            self._on_changed(participant_id, sentence_index)
+            return sentence_index
+
+    def advance_window(self, participant_id: str, sentence_count: int, count: int) -> List[int]:
+        '''
+        Move the cursor past the next `count` (at most `sentence_count`) sentences at once, i.e., the same as
+        `count` calls of `advance`, and return their indices; a concurrent advance never interleaves with them.
+        '''
+        with self._lock:
+            sentence_indices = []
+            sentence_index = self.get(participant_id)
+            for _ in range(count):
+                sentence_index = get_next_sentence_index(sentence_index, sentence_count)
+                sentence_indices.append(sentence_index)
+            self._sentence_indices[participant_id] = sentence_index
+            self._on_changed(participant_id, sentence_index)
+            return sentence_indices
+
+    def reset(self, participant_id: str):
+        self.set(participant_id, _INITIAL_SENTENCE_INDEX)
+
+    def _on_changed(self, participant_id: str, sentence_index: int):
+        pass
+
+
+class SqliteProgressStore(ProgressStore):
+    '''
+    Keeps the cursors in memory and persists the changes to a SQLite database (WAL mode)
+    from a background thread (write-behind), so a request never waits on the disk.
+    The persisted cursors are restored on start; at most `flush_interval` seconds of progress is lost on a crash.
+    '''
+
+    def __init__(self, database_file=_PROGRESS_DATABASE_FILE, flush_interval=_FLUSH_INTERVAL_SECONDS):
+        super().__init__()
+        self._database_file = database_file
+        self._flush_interval = flush_interval
+        self._dirty: Dict[str, int] = {}
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        connection = connect_progress_database(self._database_file)
+        try:
+            rows = connection.execute("SELECT participant_id, sentence_index FROM progress").fetchall()
+        finally:
+            connection.close()
+
+        with self._lock:
+            self._sentence_indices.update(dict(rows))
+        logger.info("Restored progress of %d participants: %s", len(rows), self._database_file)
+
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="progress-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+
+    def _on_changed(self, participant_id: str, sentence_index: int):
+        self._dirty[participant_id] = sentence_index
+
+    def _run(self):
+        connection = connect_progress_database(self._database_file)
+        try:
+            while not self._stopping.wait(self._flush_interval):
+                self._flush(connection)
+            self._flush(connection)
+        finally:
+            connection.close()
+
+    def _flush(self, connection):
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+
+        if not dirty:
+            return
+
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT INTO progress (participant_id, sentence_index) VALUES (?, ?) "
+                    "ON CONFLICT(participant_id) DO UPDATE SET sentence_index = excluded.sentence_index",
+                    dirty.items())
+        except sqlite3.Error:
+            logger.exception("Unable to persist progress of %d participants", len(dirty))
+            # retry on the next flush, without overwriting newer changes
+            with self._lock:
+                self._dirty = {**dirty, **self._dirty}
+
+
+class SharedProgressStore(ProgressStore):
+    '''
+    Keeps the cursors only in the SQLite database, so that several backend processes (uvicorn workers)
+    share them. Each advance is a single atomic statement, i.e., two workers never hand out the same sentence twice.
+    A statement may wait up to 10 seconds for another worker's write, so it is called off the event loop.
+    '''
+
+    blocking = True
+
+    def __init__(self, database_file=_PROGRESS_DATABASE_FILE):
+        super().__init__()
+        self._database_file = database_file
+        # a connection per thread (the event loop's and asyncio.to_thread's), all of them closed on stop
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+
+    def _get_connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = connect_progress_database(self._database_file, check_same_thread=False)
+            connection.isolation_level = None  # autocommit, each statement is its own transaction
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def stop(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+            # the threads open new connections if started again
+            self._local = threading.local()
+        for connection in connections:
+            connection.close()
+
+    def get(self, participant_id: str) -> int:
+        row = self._get_connection().execute(
+            "SELECT sentence_index FROM progress WHERE participant_id = ?", (participant_id,)).fetchone()
+        return row[0] if row else _INITIAL_SENTENCE_INDEX
+
+    def get_all(self) -> Dict[str, int]:
+        return dict(self._get_connection().execute("SELECT participant_id, sentence_index FROM progress"))
+
+    def set(self, participant_id: str, sentence_index: int):
+        self._get_connection().execute(
+            "INSERT INTO progress (participant_id, sentence_index) VALUES (?, ?) "
+            "ON CONFLICT(participant_id) DO UPDATE SET sentence_index = excluded.sentence_index",
+            (participant_id, sentence_index))
+
+    def advance(self, participant_id: str, sentence_count: int) -> int:
+        # same as `get_next_sentence_index`, evaluated inside the database
+        row = self._get_connection().execute(
+            "INSERT INTO progress (participant_id, sentence_index) VALUES (?, 0) "
+            "ON CONFLICT(participant_id) DO UPDATE SET sentence_index = "
+            "CASE WHEN progress.sentence_index + 1 >= ? THEN 0 ELSE progress.sentence_index + 1 END "
+            "RETURNING sentence_index",
+            (participant_id, sentence_count)).fetchone()
+        return row[0]
+
+    def advance_window(self, participant_id: str, sentence_count: int, count: int) -> List[int]:
+        # a single statement, moving the cursor to the last of the `count` sentences (see `advance`)
+        row = self._get_connection().execute(
+            "INSERT INTO progress (participant_id, sentence_index) VALUES (?, (? - 1) % ?) "
+            "ON CONFLICT(participant_id) DO UPDATE SET sentence_index = "
+            "((CASE WHEN progress.sentence_index + 1 >= ? THEN 0 ELSE progress.sentence_index + 1 END) + ? - 1) % ? "
+            "RETURNING sentence_index",
+            (participant_id, count, sentence_count, sentence_count, count, sentence_count)).fetchone()
+        first_index = row[0] - count + 1
+        return [(first_index + i) % sentence_count for i in range(count)]
+
+
+async def call_progress_store(progress_store: ProgressStore, call: Callable, *args):
+    # e.g., `await call_progress_store(progress_store, progress_store.advance, participant_id, sentence_count)`;
+    # in a worker thread if the store may block, so the event loop keeps serving the other requests
+    if progress_store.blocking:
+        return await asyncio.to_thread(call, *args)
+    return call(*args)
+
+
+def get_progress_store(store_type=None) -> ProgressStore:
+    # PROGRESS_STORE=memory disables the persistence (e.g., for benchmarks)
+    # PROGRESS_STORE=shared is required when running more than one backend worker
+    store_type = store_type or os.environ.get('PROGRESS_STORE', 'sqlite')
+
+    if store_type == 'memory':
+        return ProgressStore()
+    if store_type == 'sqlite':
+        return SqliteProgressStore()
+    if store_type == 'shared':
+        return SharedProgressStore()
+
+    raise Exception(f"Unknown progress store: {store_type}")
+
+
+if __name__ == "__main__":
+    # python -m backend.progress_store [--reset [participant_id ...]]
+    _store = SqliteProgressStore()
+    _store.start()
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--reset':
+        for _participant_id in sys.argv[2:] or list(_store.get_all().keys()):
+            _store.reset(_participant_id)
+            print(f"Reset progress: {_participant_id}")
+
+    _store.stop()
+
+    for _participant_id, _sentence_index in sorted(_store.get_all().items()):
+        print(f"{_participant_id}: {_sentence_index}")
@@ -0,0 +1,87 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Optional, Any
+
+logger = logging.getLogger()
+
+_REGISTERED_PARTICIPANTS_FILE = 'backend/data/runtime/registered_participants.db'
+'''
+registered_participants (participant_id TEXT PRIMARY KEY, styles_sentences TEXT),
+e.g., ("p301", '{"Participant": "p301", "Style.1": "S1", "Sentences.1": "33,2", "Style.2": "S2", ...}')
+'''
+
+# written by the earlier versions next to the database (registered_participants.json), imported on connecting
+_LEGACY_FILE_EXTENSION = '.json'
+
+
+def connect_registered_database(database_file: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(database_file), exist_ok=True)
+
+    # used by the event loop and the threads building the schedules, one at a time (see RegisteredParticipants)
+    connection = sqlite3.connect(database_file, timeout=10, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("CREATE TABLE IF NOT EXISTS registered_participants ("
+                       "participant_id TEXT PRIMARY KEY, styles_sentences TEXT NOT NULL)")
+    import_legacy_file(connection, os.path.splitext(database_file)[0] + _LEGACY_FILE_EXTENSION)
+    return connection
+
+
+def import_legacy_file(connection: sqlite3.Connection, legacy_file: str):
+    try:
+        with open(legacy_file) as f:
+            registered = json.load(f)
+    except FileNotFoundError:
+        return
+
+    with connection:
+        connection.executemany("INSERT OR IGNORE INTO registered_participants VALUES (?, ?)",
+                               [(participant_id, json.dumps(styles_sentences))
+                                for participant_id, styles_sentences in registered.items()])
+    logger.info("Imported %d registered participants: %s", len(registered), legacy_file)
+
+
+class RegisteredParticipants:
+    '''
+    The participants added at runtime (see ScheduleStore.register_participant), in a SQLite database shared by
+    the backend workers: a registration is a single insert, so concurrent registrations are never lost and
+    a participant id is only registered once.
+    '''
+
+    def __init__(self, database_file=_REGISTERED_PARTICIPANTS_FILE):
+        self.database_file = database_file
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _execute(self, statement: str, parameters=()) -> sqlite3.Cursor:
+        with self._lock:
+            if self._connection is None:
+                self._connection = connect_registered_database(self.database_file)
+            with self._connection:
+                return self._connection.execute(statement, parameters)
+
+    def get(self, participant_id: str) -> Optional[Dict[str, Any]]:
+        row = self._execute("SELECT styles_sentences FROM registered_participants WHERE participant_id = ?",
+                            (participant_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_all(self) -> Dict[str, Dict[str, Any]]:
+        return {participant_id: json.loads(styles_sentences) for participant_id, styles_sentences in
+                self._execute("SELECT participant_id, styles_sentences FROM registered_participants")}
+
+    def add(self, participant_id: str, styles_sentences: Dict[str, Any]) -> bool:
+        # False if the participant is already registered (e.g., by another worker)
+        try:
+            self._execute("INSERT INTO registered_participants VALUES (?, ?)",
+                          (participant_id, json.dumps(styles_sentences)))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
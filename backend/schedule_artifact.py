@@ -0,0 +1,314 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Any, Optional
+
+from backend import models, sentence_utility, style_templates
+from backend.models import Word, Sentence, Participant
+from backend.sentence_cache import SentenceCache, SentenceKey
+from backend.sentence_utility import (get_all_sentences_content, get_all_participants_content,
+                                      get_participant_sentences, get_all_styles, get_sentence)
+
+logger = logging.getLogger()
+
+_ARTIFACT_DIRECTORY = 'backend/data/compiled/schedules'
+
+_INDEX_FILE_NAME = 'index.json'
+'''
+{"key": "<sha256 of the inputs>",
+ "index": {"sentences": {"33": "<hash of the csv row and the schedule code>", ...},
+           "participants": {"p0": {"hash": "<hash of the csv row>", "sentenceIds": [35, 24, ...],
+                                   "scheduleHash": "<hash of the row and its sentences>"}, ...}}}
+'''
+
+_PARTICIPANTS_DIRECTORY_NAME = 'participants'
+'''
+participants/p0.json: {"scheduleHash": "...", "sentences": [{"id": 0, "subWords": [{...}, ...]}, ...,
+                                                              {"style": "S1", "id": 33, "hash": "..."}, ...]}
+The sentences of the styles refer to the shared ones (see sentence_cache.py), written once for all participants.
+'''
+
+_SHARED_SENTENCES_DIRECTORY_NAME = 'sentences'
+'''
+sentences/S1-33-<hash of the csv row and the schedule code>.json: {"id": 33, "subWords": [{...}, ...]}
+e.g., the backends of two code versions sharing the directory each write (and read) their own.
+'''
+
+# bump this when the artifact layout changes, so that old artifacts are rebuilt
+_ARTIFACT_FORMAT_VERSION = 5
+
+
+def get_schedule_code_files() -> List[str]:
+    # the code that turns the csv data into schedules
+    return [sentence_utility.__file__, style_templates.__file__, models.__file__]
+
+
+def get_schedule_input_files(sentences_file=None, participants_file=None) -> List[str]:
+    return [sentences_file or sentence_utility._SENTENCES_FILE,
+            participants_file or sentence_utility._PARTICIPANTS_FILE] + get_schedule_code_files()
+
+
+def get_schedule_key(files=None) -> str:
+    digest = hashlib.sha256(f"format:{_ARTIFACT_FORMAT_VERSION}".encode())
+
+    for file in files or get_schedule_input_files():
+        with open(file, 'rb') as f:
+            digest.update(f.read())
+
+    return digest.hexdigest()
+
+
+@functools.cache
+def get_schedule_code_key() -> str:
+    return get_schedule_key(get_schedule_code_files())
+
+
+def get_content_hash(value) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def get_sentence_hash(content) -> str:
+    # changes whenever anything the sentence is built from changes, i.e., its csv row or the code
+    return get_content_hash([get_schedule_code_key(), content])
+
+
+def get_participant_sentence_ids(styles_sentences) -> List[int]:
+    sentence_ids = []
+    for i in range(1, len(get_all_styles()) + 1):
+        sentence_ids.extend(int(sid) for sid in str(styles_sentences[f'Sentences.{i}']).split(','))
+    return sentence_ids
+
+
+def get_participant_index(styles_sentences, sentence_hashes: Dict[str, str]) -> Dict[str, Any]:
+    row_hash = get_content_hash(dict(styles_sentences))
+    sentence_ids = get_participant_sentence_ids(styles_sentences)
+
+    return {
+        'hash': row_hash,
+        'sentenceIds': sentence_ids,
+        # changes whenever anything the schedule is built from changes
+        'scheduleHash': get_content_hash([get_schedule_code_key(), row_hash] +
+                                         [sentence_hashes.get(str(sid)) for sid in sentence_ids]),
+    }
+
+
+def get_schedule_index(sentences_content: dict, participants_content: dict) -> Dict[str, Any]:
+    '''
+    Hash of each sentence and participant row, used to find the participants affected by a change of the csv files.
+    '''
+    sentence_hashes = {
+        str(sentence_id): get_sentence_hash(content) for sentence_id, content in sentences_content.items()
+    }
+
+    return {
+        'sentences': sentence_hashes,
+        'participants': {
+            participant_id: get_participant_index(styles_sentences, sentence_hashes)
+            for participant_id, styles_sentences in participants_content.items()
+        },
+    }
+
+
+def sentence_from_dict(sentence: dict) -> Sentence:
+    # the artifact is written by us from validated models, so skip re-validation
+    return Sentence.model_construct(
+        id=sentence['id'],
+        subWords=[Word.model_construct(**word) for word in sentence['subWords']]
+    )
+
+
+def write_json_file(file_name, data):
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+
+    # write to a temporary file first, so a crash never leaves a half written file; one per process and thread,
+    # so concurrent writes of the same file (e.g., by the threads building schedules) never share it
+    temp_file = f"{file_name}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(temp_file, file_name)
+
+
+def get_participant_file(participant_id: str, directory=_ARTIFACT_DIRECTORY) -> str:
+    return os.path.join(directory, _PARTICIPANTS_DIRECTORY_NAME, f"{participant_id}.json")
+
+
+def get_shared_sentence_file(key: SentenceKey, directory=_ARTIFACT_DIRECTORY) -> str:
+    style, sentence_id, content_hash = key
+    return os.path.join(directory, _SHARED_SENTENCES_DIRECTORY_NAME, f"{style}-{sentence_id}-{content_hash}.json")
+
+
+def read_shared_sentence(key: SentenceKey, directory=_ARTIFACT_DIRECTORY) -> Optional[Sentence]:
+    try:
+        with open(get_shared_sentence_file(key, directory)) as f:
+            return sentence_from_dict(json.load(f))
+    except FileNotFoundError:
+        return None
+
+
+def build_shared_sentence(key: SentenceKey, content: tuple, directory=_ARTIFACT_DIRECTORY) -> Sentence:
+    style, sentence_id, _ = key
+    sentence = get_sentence(style, sentence_id, *content[1:])
+
+    # the participants compiled later (or by another worker) refer to it; the file name changes with the code
+    # that builds it (see get_sentence_hash), so an existing file (e.g., written by another worker) has the same content
+    sentence_file = get_shared_sentence_file(key, directory)
+    if not os.path.exists(sentence_file):
+        write_json_file(sentence_file, sentence.model_dump())
+    return sentence
+
+
+def sentence_to_dict(sentence: Sentence, sentence_cache: SentenceCache) -> Dict[str, Any]:
+    key = sentence_cache.get_key(sentence)
+    if key is None:
+        return sentence.model_dump()
+    style, sentence_id, content_hash = key
+    return {'style': style, 'id': sentence_id, 'hash': content_hash}
+
+
+def write_participant(participant: Participant, schedule_hash: str, directory=_ARTIFACT_DIRECTORY,
+                      sentence_cache: SentenceCache = None):
+    sentence_cache = SentenceCache() if sentence_cache is None else sentence_cache
+    write_json_file(get_participant_file(participant.participantId, directory), {
+        'scheduleHash': schedule_hash,
+        'sentences': [sentence_to_dict(sentence, sentence_cache) for sentence in participant.sentences],
+    })
+
+
+def read_participant(participant_id: str, schedule_hash: str, directory=_ARTIFACT_DIRECTORY,
+                     sentence_cache: SentenceCache = None) -> Optional[Participant]:
+    '''
+    Return the compiled schedule of the participant, or None if it is missing or outdated.
+    The sentences it refers to are taken from `sentence_cache`, if given, and read once into it otherwise.
+    '''
+    sentence_cache = SentenceCache() if sentence_cache is None else sentence_cache
+
+    def read_sentence(sentence: dict) -> Sentence:
+        if 'subWords' in sentence:
+            return sentence_from_dict(sentence)
+        key = (sentence['style'], sentence['id'], sentence['hash'])
+        shared_sentence = sentence_cache.get_sentence(key, lambda: read_shared_sentence(key, directory))
+        if shared_sentence is None:
+            raise FileNotFoundError(get_shared_sentence_file(key, directory))
+        return shared_sentence
+
+    try:
+        with open(get_participant_file(participant_id, directory)) as f:
+            data = json.load(f)
+
+        if data['scheduleHash'] != schedule_hash:
+            return None
+
+        return Participant.model_construct(
+            participantId=participant_id,
+            currentSentenceIndex=-1,
+            sentences=[read_sentence(sentence) for sentence in data['sentences']]
+        )
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError):
+        logger.exception("Corrupted schedule artifact of %s", participant_id)
+        return None
+
+
+def write_index(key: str, index: Dict[str, Any], directory=_ARTIFACT_DIRECTORY):
+    # written last, so the index never refers to participant files not written yet
+    write_json_file(os.path.join(directory, _INDEX_FILE_NAME), {'key': key, 'index': index})
+
+
+def read_index(directory=_ARTIFACT_DIRECTORY) -> tuple[str, Dict[str, Any]]:
+    with open(os.path.join(directory, _INDEX_FILE_NAME)) as f:
+        data = json.load(f)
+    return data['key'], data['index']
+
+
+def compile_participant(participant_id: str, styles_sentences, sentences_content: dict, schedule_hash: str,
+                        directory=_ARTIFACT_DIRECTORY, sentence_cache: SentenceCache = None) -> Participant:
+    '''
+    Build and write the schedule of the participant; the sentences of the styles are taken from `sentence_cache`
+    (if given, e.g., the one of the schedule store), so each one is only built once for all the participants.
+    '''
+    sentence_cache = SentenceCache() if sentence_cache is None else sentence_cache
+
+    def get_style_sentence(style: str, sentence_id: int) -> Sentence:
+        content = sentences_content[sentence_id]
+        key = (style, sentence_id, sentence_cache.get_content_hash(sentence_id, content, get_sentence_hash))
+        return sentence_cache.get_sentence(key, lambda: build_shared_sentence(key, content, directory))
+
+    participant = get_participant_sentences(participant_id, styles_sentences, sentences_content, get_style_sentence)
+    write_participant(participant, schedule_hash, directory, sentence_cache)
+    return participant
+
+
+def compile_schedules(directory=_ARTIFACT_DIRECTORY, key=None, compile_participants=True,
+                      sentences_file=None, participants_file=None) -> Dict[str, Any]:
+    '''
+    Write the index and (unless `compile_participants` is False) the outdated participant schedules;
+    otherwise they are compiled on demand, by the schedule store.
+    '''
+    key = key or get_schedule_key(get_schedule_input_files(sentences_file, participants_file))
+
+    start = time.perf_counter()
+    sentences_content = get_all_sentences_content(sentences_file)
+    participants_content = get_all_participants_content(participants_file)
+    index = get_schedule_index(sentences_content, participants_content)
+
+    compiled_count = 0
+    if compile_participants:
+        # shared by the participants, so each sentence of each style is built (and read) once
+        sentence_cache = SentenceCache()
+        for participant_id, styles_sentences in participants_content.items():
+            schedule_hash = index['participants'][participant_id]['scheduleHash']
+            if read_participant(participant_id, schedule_hash, directory, sentence_cache) is None:
+                compile_participant(participant_id, styles_sentences, sentences_content, schedule_hash, directory,
+                                    sentence_cache)
+                compiled_count += 1
+    write_index(key, index, directory)
+
+    logger.info("Compiled schedules of %d/%d participants in %.3fs: %s",
+                compiled_count, len(participants_content), time.perf_counter() - start, directory)
+    return index
+
+
+def load_schedule_index(directory=_ARTIFACT_DIRECTORY, sentences_file=None,
+                        participants_file=None) -> tuple[str, Dict[str, Any]]:
+    '''
+    Load the index of the compiled schedules, rewriting it first if any of the inputs has changed since it was written.
+    The participants' schedules themselves are read (or compiled) on demand, by the schedule store.
+    Returns the schedule key (i.e., the schedule version) with the index.
+    '''
+    key = get_schedule_key(get_schedule_input_files(sentences_file, participants_file))
+
+    try:
+        index_key, index = read_index(directory)
+        if index_key == key:
+            return key, index
+        logger.info("Schedule inputs changed, recompiling: %s", directory)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, TypeError):
+        logger.exception("Corrupted schedule index, recompiling: %s", directory)
+
+    return key, compile_schedules(directory, key, compile_participants=False, sentences_file=sentences_file,
+                                  participants_file=participants_file)
+
+
+if __name__ == "__main__":
+    # python -m backend.schedule_artifact [study ...]
+    import sys
+    from backend.study_registry import get_studies
+
+    logging.basicConfig(level=logging.INFO)
+
+    _studies = get_studies()
+    for _name in sys.argv[1:] or list(_studies):
+        if _name not in _studies:
+            print(f"{_name}: unknown study")
+            continue
+        _study = _studies[_name]
+        _index = compile_schedules(_study.artifact_directory, sentences_file=_study.sentences_file,
+                                   participants_file=_study.participants_file)
+        print(f"{_name}: {len(_index['participants'])} participants in {_study.artifact_directory}")
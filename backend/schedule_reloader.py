@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, List, Optional, Tuple
+
+from backend import sentence_utility
+from backend.metrics import metrics
+from backend.progress_store import ProgressStore, get_progress_key, call_progress_store
+from backend.schedule_artifact import (get_schedule_key, get_schedule_input_files, get_schedule_index, write_index,
+                                       read_participant, compile_participant, get_participant_index)
+from backend.schedule_store import ScheduleStore
+from backend.sentence_utility import get_all_sentences_content, get_all_participants_content
+
+logger = logging.getLogger()
+
+_CHECK_INTERVAL_SECONDS = 2.0
+
+
+def get_watched_files(schedule_store: ScheduleStore) -> List[str]:
+    return [schedule_store.sentences_file or sentence_utility._SENTENCES_FILE,
+            schedule_store.participants_file or sentence_utility._PARTICIPANTS_FILE]
+
+
+def get_files_stamp(files) -> Tuple:
+    # cheap check (mtime and size) before hashing the contents
+    stamp = []
+    for file in files:
+        try:
+            file_stat = os.stat(file)
+            stamp.append((file, file_stat.st_mtime_ns, file_stat.st_size))
+        except OSError:
+            stamp.append((file, None, None))
+    return tuple(stamp)
+
+
+def get_affected_participants(old_index: dict, new_index: dict) -> Tuple[List[str], List[str]]:
+    '''
+    Return the participants to (re)build, i.e., added ones, changed rows and the ones assigned a changed sentence,
+    and the removed participants.
+    '''
+    old_sentences, new_sentences = old_index['sentences'], new_index['sentences']
+    changed_sentence_ids = {int(sid) for sid in old_sentences.keys() | new_sentences.keys()
+                            if old_sentences.get(sid) != new_sentences.get(sid)}
+
+    old_participants, new_participants = old_index['participants'], new_index['participants']
+    changed = [participant_id for participant_id, participant in new_participants.items()
+               if old_participants.get(participant_id, {}).get('hash') != participant['hash']
+               or changed_sentence_ids.intersection(participant['sentenceIds'])]
+    removed = [participant_id for participant_id in old_participants.keys() - new_participants.keys()]
+
+    return changed, removed
+
+
+def get_changed_registered_participants(schedule_store: ScheduleStore, new_index: dict) -> List[str]:
+    '''
+    Return the participants added at runtime (see ScheduleStore.register_participant) assigned a changed sentence,
+    i.e., the ones whose schedule hash changes with the new sentences.
+    '''
+    changed = []
+    for participant_id, styles_sentences in schedule_store.get_registered_participants().items():
+        if participant_id in new_index['participants']:
+            continue
+        if get_participant_index(styles_sentences, schedule_store.index['sentences'])['scheduleHash'] != \
+                get_participant_index(styles_sentences, new_index['sentences'])['scheduleHash']:
+            changed.append(participant_id)
+    return changed
+
+
+def get_schedule_structure(participant) -> List[Tuple[int, int]]:
+    return [(sentence.id, len(sentence.subWords)) for sentence in participant.sentences]
+
+
+def rebuild_schedule_store(schedule_store: ScheduleStore) -> Tuple[ScheduleStore, List[str]]:
+    '''
+    Rebuild the participants affected by the csv changes only (including the ones registered at runtime), and write
+    them and the new index to the artifact.
+    Returns the new store and the rebuilt participants whose schedule structure changed (i.e., to reset the progress).
+    '''
+    start = time.perf_counter()
+
+    key = get_schedule_key(get_schedule_input_files(schedule_store.sentences_file, schedule_store.participants_file))
+    sentences_content = get_all_sentences_content(schedule_store.sentences_file)
+    participants_content = get_all_participants_content(schedule_store.participants_file)
+    index = get_schedule_index(sentences_content, participants_content)
+
+    changed_ids, removed_ids = get_affected_participants(schedule_store.index, index)
+    registered_ids = get_changed_registered_participants(schedule_store, index)
+
+    changed = {}
+    restructured_ids = []
+    for participant_id in changed_ids + registered_ids:
+        if participant_id in index['participants']:
+            styles_sentences = participants_content[participant_id]
+            new_participant_index = index['participants'][participant_id]
+        else:
+            styles_sentences = schedule_store.get_styles_sentences(participant_id)
+            new_participant_index = get_participant_index(styles_sentences, index['sentences'])
+            unknown_ids = [sid for sid in new_participant_index['sentenceIds'] if sid not in sentences_content]
+            if unknown_ids:
+                logger.warning("Unable to rebuild the schedule of %s, unknown sentence ids: %s",
+                               participant_id, unknown_ids)
+                continue
+
+        old_participant = schedule_store.get_cached_participant(participant_id)
+        old_schedule_hash = schedule_store.get_schedule_hash(participant_id)
+        if old_participant is None and old_schedule_hash is not None:
+            old_participant = read_participant(participant_id, old_schedule_hash, schedule_store.directory,
+                                               schedule_store.sentence_cache)
+
+        # the unchanged sentences are taken from the ones shared by the store
+        new_participant = compile_participant(participant_id, styles_sentences, sentences_content,
+                                              new_participant_index['scheduleHash'], schedule_store.directory,
+                                              schedule_store.sentence_cache)
+        changed[participant_id] = new_participant
+
+        if old_participant is not None and \
+                get_schedule_structure(old_participant) != get_schedule_structure(new_participant):
+            restructured_ids.append(participant_id)
+
+    write_index(key, index, schedule_store.directory)
+    new_store = schedule_store.replace_participants(changed, removed_ids, key, index,
+                                                    sentences_content, participants_content)
+
+    logger.info("Rebuilt schedules of %d participants (%d registered, %d removed) in %.3fs",
+                len(changed), len(registered_ids), len(removed_ids), time.perf_counter() - start)
+    return new_store, restructured_ids
+
+
+class ScheduleReloader:
+    '''
+    Watches the sentence/participant csv files and swaps in a rebuilt schedule store when their content changes.
+    The cursors of rebuilt participants are kept if their schedule keeps the same structure, otherwise reset.
+    '''
+
+    def __init__(self, get_schedule_store: Callable[[], ScheduleStore],
+                 set_schedule_store: Callable[[ScheduleStore], None],
+                 progress_store: ProgressStore, check_interval=_CHECK_INTERVAL_SECONDS, study: Optional[str] = None):
+        self._get_schedule_store = get_schedule_store
+        self._set_schedule_store = set_schedule_store
+        self._progress_store = progress_store
+        self._check_interval = check_interval
+        self._study = study
+        self._files = None
+        self._stamp = None
+        self._content_hash = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            # the files as of the loaded schedules
+            self._files = get_watched_files(self._get_schedule_store())
+            self._stamp = get_files_stamp(self._files)
+            self._content_hash = get_schedule_key(self._files)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._check_interval)
+            try:
+                await self.check()
+            except Exception:
+                # e.g., a csv file saved half way; retried on the next check
+                logger.exception("Unable to reload the schedules")
+
+    async def check(self) -> bool:
+        stamp = get_files_stamp(self._files)
+        if stamp == self._stamp:
+            return False
+
+        content_hash = get_schedule_key(self._files)
+        if content_hash == self._content_hash:
+            # touched, but not modified
+            self._stamp = stamp
+            return False
+
+        old_store = self._get_schedule_store()
+        # rebuild off the event loop; requests keep being served from the old store meanwhile
+        start = time.perf_counter()
+        new_store, restructured_ids = await asyncio.to_thread(rebuild_schedule_store, old_store)
+        metrics.schedule_reload_seconds = time.perf_counter() - start
+        metrics.schedule_reload_count += 1
+
+        self._set_schedule_store(new_store)
+        self._stamp = stamp
+        self._content_hash = content_hash
+
+        for participant_id in restructured_ids:
+            logger.warning("Schedule of %s changed its structure, progress is reset", participant_id)
+            await call_progress_store(self._progress_store, self._progress_store.reset,
+                                      get_progress_key(participant_id, self._study))
+        return True
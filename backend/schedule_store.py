@@ -0,0 +1,418 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Any, Iterable, Tuple
+
+from backend.audio_sprite import load_sprite_index, apply_audio_sprites
+from backend.compact_schedule import CompactParticipant, CompactSentence, get_compact_sentence
+from backend.content_encoding import (Representation, JSON_REPRESENTATION, JSON_MEDIA_TYPE, compress, pack, pack_map,
+                                      pack_array)
+from backend.image_variants import read_image_manifest, apply_image_variants, apply_sentence_image_variants
+from backend.metrics import metrics
+from backend.models import Sentence, Participant
+from backend.registered_participants import RegisteredParticipants, _REGISTERED_PARTICIPANTS_FILE
+from backend.sentence_parts import get_parts_sentence, FULL_FORMAT, PARTS_FORMAT
+from backend.schedule_artifact import (load_schedule_index, read_participant, compile_participant,
+                                       get_participant_index, get_content_hash,
+                                       _ARTIFACT_DIRECTORY)
+from backend.sentence_cache import BuildLocks, SentenceCache, SentenceKey
+from backend.sentence_utility import get_all_sentences_content, get_all_participants_content
+
+logger = logging.getLogger()
+
+_MAX_CACHED_PARTICIPANTS = 200
+_IDLE_SECONDS = 2 * 60 * 60
+
+# serve the audio of each block from its sprite (see audio_sprite.py), if built
+_USE_AUDIO_SPRITES = os.environ.get('AUDIO_SPRITES', '0') == '1'
+
+# serve the optimized variants of the images (see image_variants.py), e.g., webp or avif, if built
+_IMAGE_FORMAT = os.environ.get('OPTIMIZED_IMAGES') or None
+_IMAGE_WIDTH = int(os.environ.get('OPTIMIZED_IMAGE_WIDTH', '1000'))
+
+
+
+def encode_sentence(sentence: Sentence) -> bytes:
+    return sentence.model_dump_json().encode('utf-8')
+
+
+def encode_sentence_as(sentence: CompactSentence, representation: Representation) -> bytes:
+    # uncompressed, in the other formats than `encode_sentence`
+    value = get_parts_sentence(sentence) if representation.sentence_format == PARTS_FORMAT else \
+        sentence.to_model().model_dump()
+    if representation.media_type == JSON_MEDIA_TYPE:
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return pack(value)
+
+
+class CachedSchedule:
+    __slots__ = ('participant', 'schedule_hash', 'encoded_sentences', 'shared_keys', 'bodies', 'last_access')
+
+    def __init__(self, participant: Participant, schedule_hash: str,
+                 get_shared: Callable[[Sentence], Optional[Tuple[SentenceKey, CompactSentence, bytes]]] = None):
+        # the models are only kept until the sentences are encoded; the shared ones are encoded once for all
+        # the participants (see ScheduleStore.get_shared_sentence)
+        compact_sentences = []
+        shared_keys = []
+        self.encoded_sentences = []
+        for sentence in participant.sentences:
+            shared = get_shared(sentence) if get_shared is not None else None
+            shared_key, compact_sentence, encoded_sentence = shared or \
+                (None, get_compact_sentence(sentence), encode_sentence(sentence))
+            shared_keys.append(shared_key)
+            compact_sentences.append(compact_sentence)
+            self.encoded_sentences.append(encoded_sentence)
+        self.participant = CompactParticipant(sys.intern(participant.participantId),
+                                              participant.currentSentenceIndex, tuple(compact_sentences))
+        # None for the sentences not shared, whose other representations are kept in `bodies`
+        self.shared_keys = tuple(shared_keys)
+        self.schedule_hash = schedule_hash
+        # the other representations (compressed, MessagePack, parts format), each encoded on its first request
+        self.bodies: Dict[tuple, bytes] = {}
+        self.last_access = time.monotonic()
+
+    def get_body(self, key: tuple, encode: Callable[[], bytes]) -> bytes:
+        body = self.bodies.get(key)
+        if body is None:
+            # two requests may encode it at the same time, to the same bytes
+            body = self.bodies[key] = encode()
+        return body
+
+
+class ScheduleStore:
+    '''
+    Participant schedules, read from the compiled artifact (or built) on the first request of each participant
+    and kept in a size-bounded LRU cache; idle participants are evicted (their progress stays in the progress store).
+    Each sentence is encoded to JSON once, so the endpoints can return the bytes as-is; the same goes for
+    the compressed and MessagePack representations (see content_encoding.py), encoded on their first request
+    (once for all the participants for the shared sentences).
+    The schedules themselves are kept in the compact form (see compact_schedule.py), and the sentences of the styles
+    are shared by the participants, along with their compact form and encoded JSON (see sentence_cache.py).
+    '''
+
+    def __init__(self, version: str, index: Dict[str, Any], max_cached_participants=_MAX_CACHED_PARTICIPANTS,
+                 idle_seconds=_IDLE_SECONDS, registered_file=_REGISTERED_PARTICIPANTS_FILE,
+                 audio_sprites=_USE_AUDIO_SPRITES, image_format=_IMAGE_FORMAT, image_width=_IMAGE_WIDTH,
+                 directory=_ARTIFACT_DIRECTORY, sentences_file=None, participants_file=None,
+                 sentence_cache: SentenceCache = None, registered_participants: RegisteredParticipants = None):
+        self.version = version
+        self.index = index
+        # the files of the study (see study_registry.py); None for the default files
+        self.directory = directory
+        self.sentences_file = sentences_file
+        self.participants_file = participants_file
+        self._max_cached_participants = max_cached_participants
+        self._idle_seconds = idle_seconds
+        self._registered_file = registered_file
+        self._audio_sprites = audio_sprites
+        self._image_format = image_format
+        self._image_width = image_width
+        self._image_manifest = read_image_manifest() if image_format else None
+        # kept by the stores replacing this one, see `replace_participants`
+        self.sentence_cache = SentenceCache() if sentence_cache is None else sentence_cache
+
+        self._lock = threading.RLock()
+        self._build_locks = BuildLocks()
+        self._cache: OrderedDict[str, CachedSchedule] = OrderedDict()
+        self._sentences_content = None
+        self._participants_content = None
+
+        # shared with the other workers; kept here as well, so a request does not query the database
+        self.registered_participants = RegisteredParticipants(registered_file) \
+            if registered_participants is None else registered_participants
+        self._registered: Dict[str, Dict[str, Any]] = self.registered_participants.get_all()
+
+    def replace_participants(self, changed: Dict[str, Participant], removed: Iterable[str], version: str,
+                             index: Dict[str, Any], sentences_content: dict = None,
+                             participants_content: dict = None) -> 'ScheduleStore':
+        '''
+        Return a new store with the `changed` participants replacing the cached ones and the `removed` ones dropped;
+        the other cached participants (and their encoded sentences) are shared with this store, which is left untouched.
+        '''
+        new_store = ScheduleStore(version, index, self._max_cached_participants, self._idle_seconds,
+                                  self._registered_file, self._audio_sprites, self._image_format,
+                                  self._image_width, self.directory, self.sentences_file, self.participants_file,
+                                  self.sentence_cache, self.registered_participants)
+        # the sentences of changed csv rows are not shared anymore (the cached participants still refer to theirs)
+        self.sentence_cache.prune(index['sentences'])
+        new_store._sentences_content = sentences_content
+        new_store._participants_content = participants_content
+
+        removed = set(removed)
+        with self._lock:
+            for participant_id, cached in self._cache.items():
+                # the other registered participants are re-read on demand, against the new sentences
+                if participant_id in removed or \
+                        participant_id not in index['participants'] and participant_id not in changed:
+                    continue
+                if participant_id in changed:
+                    cached = new_store._new_cached(changed[participant_id],
+                                                   new_store.get_schedule_hash(participant_id))
+                new_store._cache[participant_id] = cached
+
+        return new_store
+
+    def _get_sentences_content(self) -> dict:
+        if self._sentences_content is None:
+            self._sentences_content = get_all_sentences_content(self.sentences_file)
+        return self._sentences_content
+
+    def _get_participants_content(self) -> dict:
+        if self._participants_content is None:
+            self._participants_content = get_all_participants_content(self.participants_file)
+        return self._participants_content
+
+    def _get_registered(self, participant_id: str) -> Optional[Dict[str, Any]]:
+        # the database is only queried for an unknown participant, e.g., registered by another worker
+        styles_sentences = self._registered.get(participant_id)
+        if styles_sentences is None:
+            styles_sentences = self.registered_participants.get(participant_id)
+            if styles_sentences is not None:
+                self._registered[participant_id] = styles_sentences
+        return styles_sentences
+
+    def get_styles_sentences(self, participant_id: str) -> Optional[Dict[str, Any]]:
+        if participant_id in self.index['participants']:
+            return self._get_participants_content()[participant_id]
+        return self._get_registered(participant_id)
+
+    def get_schedule_hash(self, participant_id: str) -> Optional[str]:
+        # of the compiled schedule, i.e., without the audio sprites
+        participant_index = self.index['participants'].get(participant_id)
+        if participant_index is None:
+            styles_sentences = self._get_registered(participant_id)
+            if styles_sentences is None:
+                return None
+            participant_index = get_participant_index(styles_sentences, self.index['sentences'])
+        return participant_index['scheduleHash']
+
+    def _new_cached(self, participant: Participant, schedule_hash: str) -> CachedSchedule:
+        # the rewritten urls are part of the hash, so the ETags change with them
+        hash_parts = [schedule_hash]
+
+        if self._audio_sprites:
+            sprites = load_sprite_index(participant.participantId, schedule_hash)
+            if sprites:
+                participant = apply_audio_sprites(participant, sprites)
+                hash_parts.append(sprites)
+
+        if self._image_manifest is not None:
+            # the shared sentences are rewritten once, by `get_shared_sentence`
+            participant = apply_image_variants(participant, self._image_manifest, self._image_format,
+                                               self._image_width, skip=self.sentence_cache.is_shared)
+            hash_parts.append([self._image_format, self._image_width, self._image_manifest['key']])
+
+        if len(hash_parts) > 1:
+            schedule_hash = get_content_hash(hash_parts)
+        return CachedSchedule(participant, schedule_hash, self.get_shared_sentence)
+
+    def get_shared_sentence(self, sentence: Sentence) -> Optional[Tuple[SentenceKey, CompactSentence, bytes]]:
+        '''
+        The key, compact form and encoded JSON of a shared sentence (see sentence_cache.py), as served by this store;
+        None if the sentence is not a shared one, e.g., rewritten to the audio sprites of a participant.
+        '''
+        key = self.sentence_cache.get_key(sentence)
+        if key is None:
+            return None
+
+        def encode() -> Tuple[SentenceKey, CompactSentence, bytes]:
+            served = sentence
+            if self._image_manifest is not None:
+                served = apply_sentence_image_variants(sentence, self._image_manifest, self._image_format,
+                                                       self._image_width)
+            return key, get_compact_sentence(served), encode_sentence(served)
+
+        return self.sentence_cache.get_derived(key, 'served', encode)
+
+    def _build_participant(self, participant_id: str) -> Optional[CachedSchedule]:
+        schedule_hash = self.get_schedule_hash(participant_id)
+        if schedule_hash is None:
+            return None
+
+        participant = read_participant(participant_id, schedule_hash, self.directory, self.sentence_cache)
+        if participant is None:
+            logger.info("Building schedule of %s", participant_id)
+            participant = compile_participant(participant_id, self.get_styles_sentences(participant_id),
+                                              self._get_sentences_content(), schedule_hash, self.directory,
+                                              self.sentence_cache)
+
+        return self._new_cached(participant, schedule_hash)
+
+    def _get_cached(self, participant_id: str) -> Optional[CachedSchedule]:
+        with self._lock:
+            cached = self._cache.get(participant_id)
+
+        if cached is None:
+            # without the lock, so the requests of the cached participants never wait on a build
+            # (see backend.get_loaded_participant, which builds off the event loop); the concurrent first
+            # requests of the participant wait for a single build
+            with self._build_locks.hold(participant_id):
+                with self._lock:
+                    cached = self._cache.get(participant_id)
+                if cached is None:
+                    start = time.perf_counter()
+                    cached = self._build_participant(participant_id)
+                    if cached is None:
+                        return None
+                    metrics.schedule_build_seconds.observe(time.perf_counter() - start)
+                    with self._lock:
+                        self._cache[participant_id] = cached
+
+        with self._lock:
+            # added again if evicted meanwhile
+            cached = self._cache.setdefault(participant_id, cached)
+            self._cache.move_to_end(participant_id)
+            cached.last_access = time.monotonic()
+            self._evict()
+            return cached
+
+    def _evict(self):
+        # least recently used first; the most recently used one is never evicted
+        idle_before = time.monotonic() - self._idle_seconds
+        while len(self._cache) > 1:
+            participant_id, cached = next(iter(self._cache.items()))
+            if len(self._cache) <= self._max_cached_participants and cached.last_access >= idle_before:
+                break
+            del self._cache[participant_id]
+            logger.info("Evicted schedule of %s", participant_id)
+
+    def register_participant(self, participant_id: str, styles_sentences: Dict[str, Any]) -> Participant:
+        '''
+        Add a participant (not in the participants csv file) with the given style/sentence assignment,
+        i.e., {"Style.1": "S1", "Sentences.1": "33,2", ...}; raises an exception if it can not be built
+        (or is already registered, e.g., by another worker).
+        '''
+        styles_sentences = {'Participant': participant_id, **styles_sentences}
+        participant_index = get_participant_index(styles_sentences, self.index['sentences'])
+
+        unknown_ids = [sid for sid in participant_index['sentenceIds'] if str(sid) not in self.index['sentences']]
+        if unknown_ids:
+            raise KeyError(f"Unknown sentence ids: {unknown_ids}")
+
+        participant = compile_participant(participant_id, styles_sentences, self._get_sentences_content(),
+                                          participant_index['scheduleHash'], self.directory, self.sentence_cache)
+
+        if not self.registered_participants.add(participant_id, styles_sentences):
+            raise ValueError(f"Participant already registered: {participant_id}")
+        self._registered[participant_id] = styles_sentences
+
+        cached = self._new_cached(participant, participant_index['scheduleHash'])
+        with self._lock:
+            self._cache[participant_id] = cached
+            self._evict()
+
+        logger.info("Registered participant %s", participant_id)
+        return participant
+
+    def has_participant(self, participant_id: str) -> bool:
+        return participant_id in self.index['participants'] or self._get_registered(participant_id) is not None
+
+    def get_registered_participants(self) -> Dict[str, Dict[str, Any]]:
+        # the participants added by `register_participant` (of all workers), with their style/sentence assignment
+        self._registered.update(self.registered_participants.get_all())
+        return dict(self._registered)
+
+    def get_participant_ids(self) -> List[str]:
+        return list(self.index['participants'].keys()) + list(self.get_registered_participants().keys())
+
+    def is_cached(self, participant_id: str) -> bool:
+        return participant_id in self._cache
+
+    def get_cached_participant_count(self) -> int:
+        return len(self._cache)
+
+    def get_cached_participant(self, participant_id: str) -> Optional[CompactParticipant]:
+        # without building it, unlike `get_participant`
+        with self._lock:
+            cached = self._cache.get(participant_id)
+            return cached.participant if cached else None
+
+    def get_participant(self, participant_id: str) -> Optional[CompactParticipant]:
+        cached = self._get_cached(participant_id)
+        return cached.participant if cached else None
+
+    def get_sentence_count(self, participant_id: str) -> int:
+        return len(self._get_cached(participant_id).encoded_sentences)
+
+    def get_encoded_sentence(self, participant_id: str, sentence_index: int,
+                             representation: Representation = JSON_REPRESENTATION) -> bytes:
+        return self.get_sentence_body(self._get_cached(participant_id), sentence_index, representation)
+
+    def get_sentence_body(self, cached: CachedSchedule, sentence_index: int, representation: Representation) -> bytes:
+        '''
+        A sentence of a participant in the given representation, encoded on its first request: a shared sentence's
+        in the sentence cache, so its bodies are encoded (and compressed) once for all the participants.
+        '''
+        if representation == JSON_REPRESENTATION:
+            return cached.encoded_sentences[sentence_index]
+
+        def encode() -> bytes:
+            if representation.encoding is not None:
+                # compressed on a request (on the event loop), so at the faster level
+                return compress(self.get_sentence_body(cached, sentence_index, representation._replace(encoding=None)),
+                                representation.encoding, dynamic=True)
+            return encode_sentence_as(cached.participant.sentences[sentence_index], representation)
+
+        shared_key = cached.shared_keys[sentence_index]
+        if shared_key is None:
+            return cached.get_body(('sentence', sentence_index) + representation, encode)
+        return self.sentence_cache.get_derived(shared_key, ('body',) + representation, encode)
+
+    def get_schedule_etag(self, participant_id: str) -> str:
+        # changes whenever the participant's schedule is rebuilt differently
+        return f'"{self._get_cached(participant_id).schedule_hash[:20]}"'
+
+    def get_sentence_etag(self, participant_id: str, sentence_index: int) -> str:
+        return f'"{self._get_cached(participant_id).schedule_hash[:20]}-{sentence_index}"'
+
+    def get_encoded_schedule(self, participant_id: str, representation: Representation = JSON_REPRESENTATION) -> bytes:
+        # {"participantId": "...", "sentences": [...]}
+        cached = self._get_cached(participant_id)
+        if representation == JSON_REPRESENTATION:
+            return join_schedule(participant_id, cached.encoded_sentences)
+
+        def encode() -> bytes:
+            uncompressed = representation._replace(encoding=None)
+            sentence_bodies = [self.get_sentence_body(cached, index, uncompressed)
+                               for index in range(len(cached.encoded_sentences))]
+            if representation.media_type == JSON_MEDIA_TYPE:
+                body = join_schedule(participant_id, sentence_bodies)
+            else:
+                body = pack_map([('participantId', pack(participant_id)), ('sentences', pack_array(sentence_bodies))])
+            return compress(body, representation.encoding, dynamic=True)
+
+        return cached.get_body(('schedule',) + representation, encode)
+
+    def get_encoded_sentences(self, participant_id: str, sentence_indices: List[int],
+                              representation: Representation = JSON_REPRESENTATION) -> bytes:
+        # {"sentenceIndices": [...], "sentences": [...]}, joined from the already encoded sentences
+        cached = self._get_cached(participant_id)
+        uncompressed = representation._replace(encoding=None)
+        sentence_bodies = [self.get_sentence_body(cached, index, uncompressed) for index in sentence_indices]
+        if representation.media_type == JSON_MEDIA_TYPE:
+            body = b''.join([
+                b'{"sentenceIndices":[', ','.join(map(str, sentence_indices)).encode('utf-8'),
+                b'],"sentences":[', b','.join(sentence_bodies), b']}',
+            ])
+        else:
+            body = pack_map([('sentenceIndices', pack(sentence_indices)), ('sentences', pack_array(sentence_bodies))])
+        # each window is only sent once, so it is compressed faster rather than cached
+        return compress(body, representation.encoding, dynamic=True)
+
+
+def join_schedule(participant_id: str, encoded_sentences: List[bytes]) -> bytes:
+    return b''.join([
+        b'{"participantId":', json.dumps(participant_id).encode('utf-8'),
+        b',"sentences":[', b','.join(encoded_sentences), b']}',
+    ])
+
+
+def load_schedule_store(directory=_ARTIFACT_DIRECTORY, sentences_file=None, participants_file=None,
+                        registered_file=_REGISTERED_PARTICIPANTS_FILE) -> ScheduleStore:
+    version, index = load_schedule_index(directory, sentences_file, participants_file)
+    return ScheduleStore(version, index, registered_file=registered_file, directory=directory,
+                         sentences_file=sentences_file, participants_file=participants_file)
@@ -0,0 +1,115 @@
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, List, Optional, Tuple, Any
+
+from backend.models import Sentence
+
+SentenceKey = Tuple[str, int, str]
+'''
+(style, sentence id, hash of the sentence's csv row and the schedule code), e.g., ("S1", 33, "<sha1>"):
+the sentence 33 in style S1 is the same for every participant assigned it, as long as its row (and the code
+building it) is unchanged.
+'''
+
+
+class BuildLocks:
+    '''
+    A lock per key of the values being built, so the concurrent first requests of a value (e.g., from the threads
+    of asyncio.to_thread) build it once: the others wait for it, and then find it cached.
+    The locks are only kept while in use.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks: Dict[Hashable, List] = {}  # the lock and the number of threads using it, by key
+
+    @contextmanager
+    def hold(self, key: Hashable):
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+
+class SentenceCache:
+    '''
+    The sentences of the styles, each built (or read) once and shared by all the participants' schedules,
+    so the work and memory scale with the distinct (style, sentence) pairs rather than with the participants.
+    The shared sentences are found by identity (see `get_key`), so they must not be modified; the values
+    derived from them (e.g., their encoded JSON, see schedule_store.py) are kept along with them.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_locks = BuildLocks()
+        self._sentences: Dict[SentenceKey, Sentence] = {}
+        self._keys: Dict[int, SentenceKey] = {}  # by id() of the shared sentences
+        self._derived: Dict[Tuple[SentenceKey, Any], Any] = {}
+        self._content_hashes: Dict[int, Tuple[Any, str]] = {}  # by sentence id, with the content hashed
+
+    def get_content_hash(self, sentence_id: int, content, get_hash: Callable[[Any], str]) -> str:
+        # hashed once per csv row, as long as it is the same (i.e., identical) object
+        content_hash = self._content_hashes.get(sentence_id)
+        if content_hash is None or content_hash[0] is not content:
+            content_hash = self._content_hashes[sentence_id] = (content, get_hash(content))
+        return content_hash[1]
+
+    def get_sentence(self, key: SentenceKey, build: Callable[[], Optional[Sentence]]) -> Optional[Sentence]:
+        # the shared sentence, built (and written, see schedule_artifact.py) once, on the first request;
+        # None (not cached) if it can not be built
+        sentence = self._sentences.get(key)
+        if sentence is None:
+            with self._build_locks.hold(key):
+                sentence = self._sentences.get(key)
+                if sentence is None:
+                    sentence = build()
+                    if sentence is None:
+                        return None
+                    with self._lock:
+                        self._sentences[key] = sentence
+                        self._keys[id(sentence)] = key
+        return sentence
+
+    def get_key(self, sentence: Sentence) -> Optional[SentenceKey]:
+        # None if the sentence is not a shared one, e.g., a rewritten copy
+        key = self._keys.get(id(sentence))
+        if key is not None and self._sentences.get(key) is sentence:
+            return key
+        return None
+
+    def is_shared(self, sentence: Sentence) -> bool:
+        return self.get_key(sentence) is not None
+
+    def get_derived(self, key: SentenceKey, name, derive: Callable[[], Any]) -> Any:
+        # by a hashable name, e.g., 'served' or ('body', <representation>) (see schedule_store.py)
+        value = self._derived.get((key, name))
+        if value is None:
+            derived = derive()
+            # under the lock, as `prune` walks the derived values (e.g., from the reloader's thread)
+            with self._lock:
+                value = self._derived.setdefault((key, name), derived)
+        return value
+
+    def prune(self, sentence_hashes: Dict[str, str]) -> int:
+        '''
+        Drop the sentences of outdated (or removed) csv rows, given the current hashes (see schedule_artifact.py);
+        returns how many were dropped.
+        '''
+        with self._lock:
+            outdated = [key for key in self._sentences if sentence_hashes.get(str(key[1])) != key[2]]
+            for key in outdated:
+                self._keys.pop(id(self._sentences.pop(key)), None)
+            outdated = set(outdated)
+            for derived_key in [derived_key for derived_key in self._derived if derived_key[0] in outdated]:
+                del self._derived[derived_key]
+        return len(outdated)
+
+    def __len__(self):
+        return len(self._sentences)
@@ -0,0 +1,133 @@
+import re
+from typing import Dict, List, Optional, Any
+
+from backend.models import Sentence, Word
+from backend.style_templates import _OPACITY_TAG
+
+FULL_FORMAT = 'full'
+PARTS_FORMAT = 'parts'
+SENTENCE_FORMAT_PATTERN = f'^({FULL_FORMAT}|{PARTS_FORMAT})$'
+
+'''
+The parts format of a sentence, e.g.,
+{"id": 15, "fade": "style='opacity:0.5'",
+ "parts": ["", "Valk", "audios/l2/Valk.mp3", "images/rain.png", "Rain", "audios/l1/Rain.mp3", "fim", ...],
+ "words": [[-1, 0, 0, 0, 0, 1000, 0], [1501, 1, 0, 2, 0, 4000, 3], [1502, 1, 4, 0, 5, 4000, 3], ...,
+           [1503, [[1], [6]], 0, 7, 0, 4000, 8], ...]}
+Each word is a list of its fields (_WORD_FIELDS), where a text field is
+    - the index of a part,
+    - a list of parts, joined by spaces (e.g., the full sentence), or
+    - [faded parts, shown parts], i.e., "<custom-color {fade}>faded parts</custom-color> shown parts"
+The client rebuilds the words (see expand_sentence and VocabularyCard.vue).
+'''
+
+_WORD_FIELDS = list(Word.model_fields)
+_STRING_FIELDS = {field for field, info in Word.model_fields.items() if info.annotation is str}
+_TEXT_FIELDS = {'foreignText', 'englishTranslation'}  # the others are urls, sent as one part
+
+_FADED_START = f"<custom-color {_OPACITY_TAG}>"
+_FADED_END = "</custom-color> "
+_HIGHLIGHTED_PATTERN = re.compile(f"^{re.escape(_FADED_START)}(.+?){re.escape(_FADED_END)}(.+)$", re.DOTALL)
+
+
+def get_chunks(sentence: Sentence) -> List[str]:
+    # the revealed chunks of the texts, e.g., "fim" of "<custom-color style='opacity:0.5'>Valk</custom-color> fim"
+    chunks = set()
+    for word in sentence.subWords:
+        for field in _TEXT_FIELDS:
+            text = getattr(word, field)
+            match = _HIGHLIGHTED_PATTERN.match(text)
+            chunks.add(match.group(2) if match else text)
+    chunks.discard('')
+    # sorted, so a sentence is always encoded the same way
+    return sorted(chunks)
+
+
+def split_text(text: str, chunks: List[str]) -> Optional[List[str]]:
+    # the fewest other chunks that make the text, joined by spaces; None if there are none
+    if not text:
+        return None
+
+    splits: Dict[int, List[str]] = {0: []}
+    for start in range(len(text)):
+        if start not in splits:
+            continue
+        for chunk in chunks:
+            if chunk == text or not text.startswith(chunk, start):
+                continue
+            end = start + len(chunk)
+            if end == len(text):
+                if len(text) not in splits or len(splits[start]) + 1 < len(splits[len(text)]):
+                    splits[len(text)] = splits[start] + [chunk]
+            elif text[end] == ' ' and (end + 1 not in splits or len(splits[start]) + 1 < len(splits[end + 1])):
+                splits[end + 1] = splits[start] + [chunk]
+    return splits.get(len(text))
+
+
+def get_parts_sentence(sentence: Sentence) -> Dict[str, Any]:
+    '''
+    The sentence in the parts format: each distinct text, audio and image is sent once, and the texts revealed
+    phase by phase refer to the chunks they are made of, rather than repeating them.
+    '''
+    parts = ['']
+    part_indices = {'': 0}
+    chunks = get_chunks(sentence)
+    has_highlight = False
+
+    def get_part_index(text: str) -> int:
+        if text not in part_indices:
+            part_indices[text] = len(parts)
+            parts.append(text)
+        return part_indices[text]
+
+    def get_part_indices(text: str) -> List[int]:
+        return [get_part_index(chunk) for chunk in split_text(text, chunks) or [text]]
+
+    def encode_text(text: str):
+        nonlocal has_highlight
+        match = _HIGHLIGHTED_PATTERN.match(text)
+        if match:
+            has_highlight = True
+            return [get_part_indices(match.group(1)), get_part_indices(match.group(2))]
+        indices = get_part_indices(text)
+        return indices[0] if len(indices) == 1 else indices
+
+    words = []
+    for word in sentence.subWords:
+        values = []
+        for field in _WORD_FIELDS:
+            value = getattr(word, field)
+            if field in _TEXT_FIELDS:
+                values.append(encode_text(value))
+            elif field in _STRING_FIELDS:
+                values.append(get_part_index(value))
+            else:
+                values.append(value)
+        words.append(values)
+
+    parts_sentence: Dict[str, Any] = {'id': sentence.id}
+    if has_highlight:
+        parts_sentence['fade'] = _OPACITY_TAG
+    parts_sentence.update(parts=parts, words=words)
+    return parts_sentence
+
+
+def expand_sentence(parts_sentence: Dict[str, Any]) -> Dict[str, Any]:
+    # the sentence (as a dict) of the parts format, as the client rebuilds it
+    parts = parts_sentence['parts']
+
+    def join(indices: List[int]) -> str:
+        return ' '.join(parts[index] for index in indices)
+
+    def expand_value(field: str, value):
+        if field not in _STRING_FIELDS:
+            return value
+        if isinstance(value, int):
+            return parts[value]
+        if isinstance(value[0], list):
+            return f"<custom-color {parts_sentence['fade']}>{join(value[0])}</custom-color> {join(value[1])}"
+        return join(value)
+
+    return {'id': parts_sentence['id'],
+            'subWords': [{field: expand_value(field, value) for field, value in zip(_WORD_FIELDS, word)}
+                         for word in parts_sentence['words']]}
@@ -1,9 +1,10 @@
 from backend.models import Word, Sentence, Participant
-import pandas as pd
+import math
 import re
 from io import StringIO
 import logging
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any
+from backend.style_templates import fill_style_template, SENTENCE_SLOT, _OPACITY_TAG
 from utilities import file_utility
 
 logger = logging.getLogger()
@@ -33,10 +34,15 @@ _BREAK_TIME_TEXT = "Break time! Questionnaire."
 _SESSION_END_TEXT = "Session ends"
 _SESSION_START_TEXT = "Session starts"
 
-_OPACITY_TAG = "style='opacity:0.5'"
-
 _TRAINING_PARTICIPANT_IDS = ['p0', 'px']
 
+# the texts the frontend waits on the continue button for (TRIGGER_WORDS in VocabularyCard.vue)
+CONTINUE_TEXTS = ["Session starts", "Session ends",
+                   "S1", "S2", "S3", "S4", "S5",
+                   "Style: S1", "Style: S2", "Style: S3", "Style: S4", "Style: S5",
+                   "W1", "W2", "W3", "W4", "W5",
+                   "Style: W1", "Style: W2", "Style: W3", "Style: W4", "Style: W5"]
+
 
 def get_session_instructions(participant):
     return f"[{participant}] Use in full screen"
@@ -52,7 +58,8 @@ def clean_audio(audio_text):
 
 
 def is_not_empty(value):
-    return pd.notna(value) and value != ""
+    # the empty csv cells are read as NaN (the same as pd.notna, without importing pandas)
+    return value is not None and not (isinstance(value, float) and math.isnan(value)) and value != ""
 
 
 def get_text(value):
@@ -166,205 +173,47 @@ def get_session_sentence(style, session_number, duration=2000) -> Sentence:
     )
 
 
+def is_session_sentence(sentence: Sentence) -> bool:
+    # i.e., the start of a style block
+    return bool(sentence.subWords) and sentence.subWords[0].foreignPronunciation == _SESSION_AUDIO
+
+
+def get_slot_values(sentence_l2, sentence_l1, sentence_image, sentence_parts: dict) -> Dict[str, str]:
+    # the values the style templates are filled with, e.g., "Part21_L2" (phase_2 part 1) or "Sentence_L1_audio"
+    slots = {SENTENCE_SLOT: {'L2': sentence_l2, 'L1': sentence_l1, 'Image': sentence_image}}
+    for phase_number in (1, 2):
+        for part_number, part in sentence_parts[f'phase_{phase_number}'].items():
+            slots[f'Part{phase_number}{part_number}'] = part
+
+    slot_values = {}
+    for slot, part in slots.items():
+        l2_text = get_text(part['L2'])
+        l1_text = get_text(part['L1'])
+        slot_values[f'{slot}_L2'] = l2_text
+        slot_values[f'{slot}_L2_audio'] = get_l2_audio(l2_text)
+        slot_values[f'{slot}_L1'] = l1_text
+        slot_values[f'{slot}_L1_audio'] = get_l1_audio(l1_text)
+        slot_values[f'{slot}_Image'] = get_image(part['Image'])
+    return slot_values
+
+
 def get_sentence(style, sentence_id, sentence_l2, sentence_l1, sentence_image, sentence_parts: dict,
                  repeat=False) -> Sentence:
     '''
     CV: The total display duration and gap space are similar between conditions
-
-    S0 (Full Sentence): Present the full concept -> Repeat it.
-    S1 = W1 (IndividualToFullSequential, gap = 0): Present an individual concept -> Sequentially build the full concept with a highlight.
-    S2 = W2 (IndividualToFullSequential, gap = 4): Present an individual concept -> Sequentially build the full concept with a highlight.
-
+    The styles are defined in style_templates.py (STYLE_DEFINITIONS).
     '''
-
-    l2_audio_duration = 4000
-
-    if style == "S1" or style == "W1":  # 3 words + 1 sentence
-        display_duration = 4000
-        empty_duration = 50
-        end_duration = 4000 * 4 - empty_duration * 3
-    elif style == "S2" or style == "W2":  # 3 words + 1 sentence
-        display_duration = 4000
-        empty_duration = 4000
-        end_duration = empty_duration
-    elif style == "S0":  # 1 sentence + 1 repeat
-        display_duration = 8000
-        empty_duration = 8000
-        end_duration = empty_duration
-    else:
-        raise Exception(f"Unknown style: {style}")
-
-    additional_sentence_duration = 1000 * 3
-    additional_word_duration = additional_sentence_duration // 3
-
-    sen_id = int(sentence_id)
-    l2_text = get_text(sentence_l2)
-    l2_audio = get_l2_audio(l2_text)
-    l1_text = get_text(sentence_l1)
-    l1_audio = get_l1_audio(l1_text)
-    image = get_image(sentence_image)
-
-    base_id = sen_id * 100
-    part1_l2_text = get_text(sentence_parts['phase_2'][1]['L2'])
-    part1_l2_audio = get_l2_audio(part1_l2_text)
-    part1_l1_text = get_text(sentence_parts['phase_2'][1]['L1'])
-    part1_l1_audio = get_l1_audio(part1_l1_text)
-    part1_image = get_image(sentence_parts['phase_2'][1]['Image'])
-
-    part2_l2_text = get_text(sentence_parts['phase_2'][2]['L2'])
-    part2_l2_audio = get_l2_audio(part2_l2_text)
-    part2_l1_text = get_text(sentence_parts['phase_2'][2]['L1'])
-    part2_l1_audio = get_l1_audio(part2_l1_text)
-    part2_image = get_image(sentence_parts['phase_2'][2]['Image'])
-
-    part3_l2_text = get_text(sentence_parts['phase_2'][3]['L2'])
-    part3_l2_audio = get_l2_audio(part3_l2_text)
-    part3_l1_text = get_text(sentence_parts['phase_2'][3]['L1'])
-    part3_l1_audio = get_l1_audio(part3_l1_text)
-    part3_image = get_image(sentence_parts['phase_2'][3]['Image'])
-
-    if style == 'S0':
-        return Sentence(
-            id=sen_id,
-            subWords=[
-                get_empty_word(duration=additional_word_duration),
-                Word(
-                    id=base_id + 1,
-                    foreignText=l2_text,
-                    englishTranslation="",
-                    foreignPronunciation=l2_audio,
-                    englishPronunciation="",
-                    displayDuration=l2_audio_duration,
-                    imageUrl=image
-                ),
-                Word(
-                    id=base_id + 2,
-                    foreignText=l2_text,
-                    englishTranslation=l1_text,
-                    foreignPronunciation="",
-                    englishPronunciation=l1_audio,
-                    displayDuration=display_duration + (display_duration - l2_audio_duration),
-                    imageUrl=image
-                ),
-                get_empty_word(duration=empty_duration),
-                Word(
-                    id=base_id + 3,
-                    foreignText=l2_text,
-                    englishTranslation="",
-                    foreignPronunciation=l2_audio,
-                    englishPronunciation="",
-                    displayDuration=l2_audio_duration,
-                    imageUrl=image
-                ),
-                Word(
-                    id=base_id + 4,
-                    foreignText=l2_text,
-                    englishTranslation=l1_text,
-                    foreignPronunciation="",
-                    englishPronunciation=l1_audio,
-                    displayDuration=display_duration + (
-                            display_duration - l2_audio_duration) + additional_sentence_duration,
-                    imageUrl=image
-                ),
-                get_empty_word(duration=end_duration),
-                get_empty_word(duration=additional_word_duration),
-            ]
-        )
-
-    if style == 'S1' or style == 'W1' or style == 'S2' or style == 'W2':
-        # FIXME: This hack uses to enable coherent images
-        part1_image = get_image(sentence_parts['phase_2'][1]['Image'])
-        part2_image = get_image(sentence_parts['phase_1'][1]['Image'])
-        part3_image = get_image(sentence_parts['phase_1'][2]['Image'])
-
-        return Sentence(
-            id=sen_id,
-            subWords=[
-                get_empty_word(duration=additional_word_duration),
-                Word(
-                    id=base_id + 1,
-                    foreignText=part1_l2_text,
-                    englishTranslation="",
-                    foreignPronunciation=part1_l2_audio,
-                    englishPronunciation="",
-                    displayDuration=l2_audio_duration,
-                    imageUrl=part1_image
-                ),
-                Word(
-                    id=base_id + 2,
-                    foreignText=part1_l2_text,
-                    englishTranslation=part1_l1_text,
-                    foreignPronunciation="",
-                    englishPronunciation=part1_l1_audio,
-                    displayDuration=display_duration + (display_duration - l2_audio_duration),
-                    imageUrl=part1_image
-                ),
-                get_empty_word(duration=empty_duration),
-                Word(
-                    id=base_id + 3,
-                    foreignText=f"<custom-color {_OPACITY_TAG}>{part1_l2_text}</custom-color> {part2_l2_text}",
-                    englishTranslation="",
-                    foreignPronunciation=part2_l2_audio,
-                    englishPronunciation="",
-                    displayDuration=l2_audio_duration,
-                    imageUrl=part2_image
-                ),
-                Word(
-                    id=base_id + 4,
-                    foreignText=f"<custom-color {_OPACITY_TAG}>{part1_l2_text}</custom-color> {part2_l2_text}",
-                    englishTranslation=f"<custom-color {_OPACITY_TAG}>{part1_l1_text}</custom-color> {part2_l1_text}",
-                    foreignPronunciation="",
-                    englishPronunciation=part2_l1_audio,
-                    displayDuration=display_duration + (display_duration - l2_audio_duration),
-                    imageUrl=part2_image
-                ),
-                get_empty_word(duration=empty_duration),
-                Word(
-                    id=base_id + 5,
-                    foreignText=f"<custom-color {_OPACITY_TAG}>{part1_l2_text} {part2_l2_text}</custom-color> {part3_l2_text}",
-                    englishTranslation="",
-                    foreignPronunciation=part3_l2_audio,
-                    englishPronunciation="",
-                    displayDuration=l2_audio_duration,
-                    imageUrl=f"{part2_image}|{part3_image}"
-                ),
-                Word(
-                    id=base_id + 6,
-                    foreignText=f"<custom-color {_OPACITY_TAG}>{part1_l2_text} {part2_l2_text}</custom-color> {part3_l2_text}",
-                    englishTranslation=f"<custom-color {_OPACITY_TAG}>{part1_l1_text} {part2_l1_text}</custom-color> {part3_l1_text}",
-                    foreignPronunciation="",
-                    englishPronunciation=part3_l1_audio,
-                    displayDuration=display_duration + (display_duration - l2_audio_duration),
-                    imageUrl=f"{part2_image}|{part3_image}"
-                ),
-                get_empty_word(duration=empty_duration),
-                Word(
-                    id=base_id + 7,
-                    foreignText=l2_text,
-                    englishTranslation="",
-                    foreignPronunciation=l2_audio,
-                    englishPronunciation="",
-                    displayDuration=l2_audio_duration,
-                    imageUrl=image
-                ),
-                Word(
-                    id=base_id + 8,
-                    foreignText=l2_text,
-                    englishTranslation=l1_text,
-                    foreignPronunciation="",
-                    englishPronunciation="",
-                    displayDuration=display_duration + (
-                            display_duration - l2_audio_duration) + additional_sentence_duration,
-                    imageUrl=image
-                ),
-                get_empty_word(duration=end_duration),
-                get_empty_word(duration=additional_word_duration),
-            ]
-        )
+    return fill_style_template(style, int(sentence_id),
+                               get_slot_values(sentence_l2, sentence_l1, sentence_image, sentence_parts))
 
 
 def get_participant_sentences(participant_id: str, styles_sentences: Dict[str, Any],
-                              sentence_content: Dict[int, tuple]) -> Participant:
+                              sentence_content: Dict[int, tuple],
+                              get_style_sentence: Callable[[str, int], Sentence] = None) -> Participant:
+    '''
+    `get_style_sentence(style, sid)` returns the sentence of a style, e.g., shared by the participants
+    (see sentence_cache.py); by default, each one is built.
+    '''
     sentences: List[Sentence] = []
 
     # append the start sentence
@@ -382,6 +231,9 @@ def get_participant_sentences(participant_id: str, styles_sentences: Dict[str, A
 
         for sid in sentence_ids:
             sid = int(sid)
+            if get_style_sentence is not None:
+                sentences.append(get_style_sentence(style, sid))
+                continue
             sen_l2, sen_l1, sen_image, sen_parts = sentence_content[sid][1:]
             sentences.append(get_sentence(style, sid, sen_l2, sen_l1, sen_image, sen_parts))
 
@@ -395,10 +247,12 @@ def get_participant_sentences(participant_id: str, styles_sentences: Dict[str, A
     return Participant(participantId=participant_id, currentSentenceIndex=-1, sentences=sentences)
 
 
-def get_all_sentences_content() -> dict[int, tuple[int, str, str, str, dict]]:
-    logger.info("Reading sentences from csv file", _SENTENCES_FILE)
+def get_all_sentences_content(sentences_file=None) -> dict[int, tuple[int, str, str, str, dict]]:
+    # the file of a study (see study_registry.py), by default the one above
+    sentences_file = sentences_file or _SENTENCES_FILE
+    logger.info("Reading sentences from csv file: %s", sentences_file)
     # df_sentences = pd.read_csv(StringIO(csv_text_sentence))
-    df_sentences = file_utility.read_csv(_SENTENCES_FILE)
+    df_sentences = file_utility.read_csv(sentences_file)
 
     _sentences = {}
     for _, row in df_sentences.iterrows():
@@ -482,10 +336,11 @@ def get_all_sentences_content() -> dict[int, tuple[int, str, str, str, dict]]:
     return _sentences
 
 
-def get_all_participants_content() -> dict[str, Dict[str, Any]]:
-    logger.info("Reading participants from csv file", _PARTICIPANTS_FILE)
+def get_all_participants_content(participants_file=None) -> dict[str, Dict[str, Any]]:
+    participants_file = participants_file or _PARTICIPANTS_FILE
+    logger.info("Reading participants from csv file: %s", participants_file)
     # df_participants = pd.read_csv(StringIO(csv_text_participants))
-    df_participants = file_utility.read_csv(_PARTICIPANTS_FILE)
+    df_participants = file_utility.read_csv(participants_file)
 
     _participants = {}
 
@@ -0,0 +1,140 @@
+import logging
+import os
+import re
+import time
+from typing import Callable, Dict, List, Optional
+
+from backend.metrics import metrics
+from backend.schedule_artifact import _ARTIFACT_DIRECTORY
+from backend.registered_participants import _REGISTERED_PARTICIPANTS_FILE
+from backend.schedule_store import load_schedule_store, ScheduleStore
+from backend.sentence_cache import BuildLocks
+
+logger = logging.getLogger()
+
+DEFAULT_STUDY = 'default'
+
+_STUDIES_DIRECTORY = 'backend/data/studies'
+'''
+backend/data/studies/<study>/Sentence_elements.csv
+                             Participant_style.csv
+e.g., a study per language pair, as the csv files carry the L1 and L2 texts and audio.
+The default study is the one in backend/data, served without a study in the url.
+The audio and image files are shared by all studies (frontend/public), so a file used by several is stored once.
+'''
+
+_SENTENCES_FILE_NAME = 'Sentence_elements.csv'
+_PARTICIPANTS_FILE_NAME = 'Participant_style.csv'
+
+_COMPILED_DIRECTORY = 'backend/data/compiled/studies'
+_RUNTIME_DIRECTORY = 'backend/data/runtime/studies'
+
+# a study name is a path segment of the api, so it can not be one of the other segments
+_STUDY_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+_RESERVED_NAMES = {'log', 'next-sentence', 'next-sentences', 'progress', 'sentence', 'schedule', 'assets', 'stream',
+                   'participants'}
+
+
+class Study:
+    def __init__(self, name: str, sentences_file: Optional[str], participants_file: Optional[str],
+                 artifact_directory: str, registered_file: str):
+        self.name = name
+        # None for the default files (sentence_utility.py)
+        self.sentences_file = sentences_file
+        self.participants_file = participants_file
+        self.artifact_directory = artifact_directory
+        self.registered_file = registered_file
+
+    def get_progress_study(self) -> Optional[str]:
+        # see progress_store.get_progress_key
+        return None if self.name == DEFAULT_STUDY else self.name
+
+
+def get_default_study() -> Study:
+    return Study(DEFAULT_STUDY, None, None, _ARTIFACT_DIRECTORY, _REGISTERED_PARTICIPANTS_FILE)
+
+
+def get_study(name: str, studies_directory=_STUDIES_DIRECTORY) -> Study:
+    directory = os.path.join(studies_directory, name)
+    return Study(name,
+                 os.path.join(directory, _SENTENCES_FILE_NAME),
+                 os.path.join(directory, _PARTICIPANTS_FILE_NAME),
+                 os.path.join(_COMPILED_DIRECTORY, name, 'schedules'),
+                 os.path.join(_RUNTIME_DIRECTORY, name, 'registered_participants.db'))
+
+
+def get_studies(studies_directory=_STUDIES_DIRECTORY) -> Dict[str, Study]:
+    # the default study and each directory with both csv files
+    studies = {DEFAULT_STUDY: get_default_study()}
+
+    try:
+        names = sorted(os.listdir(studies_directory))
+    except FileNotFoundError:
+        names = []
+
+    for name in names:
+        directory = os.path.join(studies_directory, name)
+        if not os.path.isfile(os.path.join(directory, _SENTENCES_FILE_NAME)) or \
+                not os.path.isfile(os.path.join(directory, _PARTICIPANTS_FILE_NAME)):
+            continue
+        if not _STUDY_NAME_PATTERN.match(name) or name in _RESERVED_NAMES or name == DEFAULT_STUDY:
+            logger.warning("Ignored the study with an invalid name: %s", directory)
+            continue
+        studies[name] = get_study(name, studies_directory)
+
+    return studies
+
+
+class StudyRegistry:
+    '''
+    The studies found at startup and their schedule stores, each loaded on the first use of the study
+    (so the studies not in use cost nothing) and compiled into its own artifact directory.
+    '''
+
+    def __init__(self, studies: Dict[str, Study] = None):
+        self._studies = studies if studies is not None else get_studies()
+        self._schedule_stores: Dict[str, ScheduleStore] = {}
+        # a lock per study, so loading one never holds up the requests of the others
+        self._build_locks = BuildLocks()
+
+        logger.info("Studies: %s", ", ".join(self._studies))
+
+    def has_study(self, name: str) -> bool:
+        return name in self._studies
+
+    def get_study(self, name: str) -> Study:
+        return self._studies[name]
+
+    def get_study_names(self) -> List[str]:
+        return list(self._studies)
+
+    def get_loaded_study_names(self) -> List[str]:
+        return list(self._schedule_stores)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._schedule_stores
+
+    def get_schedule_store(self, name=DEFAULT_STUDY) -> ScheduleStore:
+        schedule_store = self._schedule_stores.get(name)
+        if schedule_store is None:
+            with self._build_locks.hold(name):
+                schedule_store = self._schedule_stores.get(name)
+                if schedule_store is None:
+                    study = self._studies[name]
+                    start = time.perf_counter()
+                    schedule_store = load_schedule_store(study.artifact_directory, study.sentences_file,
+                                                         study.participants_file, study.registered_file)
+                    if name == DEFAULT_STUDY:
+                        metrics.schedule_load_seconds = time.perf_counter() - start
+                    logger.info("Loaded schedules of study %s in %.3fs", name, time.perf_counter() - start)
+                    self._schedule_stores[name] = schedule_store
+        return schedule_store
+
+    def set_schedule_store(self, name: str, schedule_store: ScheduleStore):
+        self._schedule_stores[name] = schedule_store
+
+    def get_schedule_store_getter(self, name: str) -> Callable[[], ScheduleStore]:
+        return lambda: self.get_schedule_store(name)
+
+    def get_schedule_store_setter(self, name: str) -> Callable[[ScheduleStore], None]:
+        return lambda schedule_store: self.set_schedule_store(name, schedule_store)
@@ -0,0 +1,141 @@
+import functools
+from typing import Dict, List, NamedTuple, Optional, Tuple, Any
+
+from backend.models import Sentence
+
+_OPACITY_TAG = "style='opacity:0.5'"
+
+# the timing shared by all styles (ms)
+_L2_AUDIO_DURATION = 4000
+_MARGIN_DURATION = 1000  # the empty word before and after each sentence
+_LAST_PHASE_EXTRA_DURATION = 1000 * 3  # added to the translation of the last phase
+
+# the content slots of a sentence, named after the csv columns (e.g., Part21.L2), and 'Sentence' for the whole one
+SENTENCE_SLOT = 'Sentence'
+
+# Present an individual concept -> Sequentially build the full concept with a highlight
+_SEQUENTIAL_PHASES = [
+    # FIXME: the images of the phase 1 parts are used to enable coherent images
+    {'parts': ['Part21'], 'images': ['Part21']},
+    {'parts': ['Part21', 'Part22'], 'images': ['Part11']},
+    {'parts': ['Part21', 'Part22', 'Part23'], 'images': ['Part11', 'Part12']},
+    {'parts': [SENTENCE_SLOT], 'images': [SENTENCE_SLOT], 'l1_audio': False},
+]
+
+STYLE_DEFINITIONS: Dict[str, Dict[str, Any]] = {
+    # Full Sentence: Present the full concept -> Repeat it
+    'S0': {
+        'display_duration': 8000,
+        'gap_duration': 8000,
+        'end_duration': 8000,
+        'phases': [{'parts': [SENTENCE_SLOT], 'images': [SENTENCE_SLOT]}] * 2,
+    },
+    # IndividualToFullSequential, gap = 0
+    'S1': {
+        'display_duration': 4000,
+        'gap_duration': 50,
+        'end_duration': 4000 * 4 - 50 * 3,
+        'phases': _SEQUENTIAL_PHASES,
+    },
+    # IndividualToFullSequential, gap = 4
+    'S2': {
+        'display_duration': 4000,
+        'gap_duration': 4000,
+        'end_duration': 4000,
+        'phases': _SEQUENTIAL_PHASES,
+    },
+}
+STYLE_DEFINITIONS['W1'] = STYLE_DEFINITIONS['S1']
+STYLE_DEFINITIONS['W2'] = STYLE_DEFINITIONS['S2']
+'''
+A style is a sequence of phases, separated by an empty word of `gap_duration`. Each phase displays:
+    - `parts`: the text of these slots, the earlier ones faded (i.e., the new part is highlighted),
+      first with the L2 audio of the last part (for the L2 audio duration),
+    - then with the translation and the L1 audio of the last part (unless `l1_audio` is False),
+      until `display_duration` * 2 in total,
+    - `images`: the images of these slots, layered.
+The sentence starts with an empty word and ends with an empty word of `end_duration`, and another empty word.
+'''
+
+
+class WordTemplate(NamedTuple):
+    id_offset: Optional[int]  # added to sentence id * 100; None for an empty word
+    fields: Dict[str, Any]  # the fields that are the same for every sentence
+    formats: Tuple[Tuple[str, str], ...]  # (field, format string of the slot values, e.g., "{Part21_L2}")
+
+
+def get_word_template(id_offset: Optional[int], foreign_text: str, english_translation: str,
+                      foreign_pronunciation: str, english_pronunciation: str, display_duration: int,
+                      image_url: str) -> WordTemplate:
+    fields = {'id': -1, 'foreignText': foreign_text, 'englishTranslation': english_translation,
+              'foreignPronunciation': foreign_pronunciation, 'englishPronunciation': english_pronunciation,
+              'displayDuration': display_duration, 'imageUrl': image_url}
+    formats = tuple((field, value) for field, value in fields.items() if isinstance(value, str) and '{' in value)
+    return WordTemplate(id_offset, fields, formats)
+
+
+def get_highlighted_text(slots: List[str], language: str) -> str:
+    # the earlier parts faded, the last one as is
+    last_text = f"{{{slots[-1]}_{language}}}"
+    if len(slots) == 1:
+        return last_text
+    earlier_texts = ' '.join(f"{{{slot}_{language}}}" for slot in slots[:-1])
+    return f"<custom-color {_OPACITY_TAG}>{earlier_texts}</custom-color> {last_text}"
+
+
+def get_empty_word_template(duration: int) -> WordTemplate:
+    return get_word_template(None, "", "", "", "", duration, "")
+
+
+def compile_style(definition: Dict[str, Any]) -> List[WordTemplate]:
+    display_duration = definition['display_duration']
+    phases = definition['phases']
+
+    templates = [get_empty_word_template(_MARGIN_DURATION)]
+    id_offset = 1
+    for phase_number, phase in enumerate(phases):
+        if phase_number > 0:
+            templates.append(get_empty_word_template(definition['gap_duration']))
+
+        last_slot = phase['parts'][-1]
+        image_url = '|'.join(f"{{{slot}_Image}}" for slot in phase['images'])
+        l1_duration = display_duration + (display_duration - _L2_AUDIO_DURATION)
+        if phase_number == len(phases) - 1:
+            l1_duration += _LAST_PHASE_EXTRA_DURATION
+
+        templates.append(get_word_template(
+            id_offset, get_highlighted_text(phase['parts'], 'L2'), "", f"{{{last_slot}_L2_audio}}", "",
+            _L2_AUDIO_DURATION, image_url))
+        templates.append(get_word_template(
+            id_offset + 1, get_highlighted_text(phase['parts'], 'L2'), get_highlighted_text(phase['parts'], 'L1'),
+            "", f"{{{last_slot}_L1_audio}}" if phase.get('l1_audio', True) else "", l1_duration, image_url))
+        id_offset += 2
+
+    templates.append(get_empty_word_template(definition['end_duration']))
+    templates.append(get_empty_word_template(_MARGIN_DURATION))
+    return templates
+
+
+@functools.cache
+def get_style_template(style: str) -> List[WordTemplate]:
+    # compiled once per style
+    if style not in STYLE_DEFINITIONS:
+        raise Exception(f"Unknown style: {style}")
+    return compile_style(STYLE_DEFINITIONS[style])
+
+
+def fill_style_template(style: str, sentence_id: int, slot_values: Dict[str, str]) -> Sentence:
+    '''
+    The sentence of a style, from the values of its slots (e.g., "Part21_L2", "Sentence_Image").
+    Validated in one call for the whole sentence, which is faster than constructing each word.
+    '''
+    base_id = sentence_id * 100
+    words = []
+    for template in get_style_template(style):
+        word = dict(template.fields)
+        if template.id_offset is not None:
+            word['id'] = base_id + template.id_offset
+        for field, value_format in template.formats:
+            word[field] = value_format.format_map(slot_values)
+        words.append(word)
+    return Sentence.model_validate({'id': sentence_id, 'subWords': words})
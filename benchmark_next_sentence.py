@@ -0,0 +1,125 @@
+import json
+import statistics
+import time
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from backend.content_encoding import (Representation, JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, get_brotli,
+                                      get_msgpack)
+from backend.schedule_store import load_schedule_store
+from backend.sentence_parts import FULL_FORMAT, PARTS_FORMAT, expand_sentence
+
+_ROUNDS = 5
+_REQUESTS_PER_ROUND = 20000
+
+
+def build_response_serialized(schedule_store, participant_id, sentence_index):
+    # what FastAPI does for an endpoint returning the pydantic `Sentence`
+    sentence = schedule_store.get_participant(participant_id).sentences[sentence_index].to_model()
+    return JSONResponse(content=jsonable_encoder(sentence))
+
+
+def build_response_encoded(schedule_store, participant_id, sentence_index):
+    return Response(content=schedule_store.get_encoded_sentence(participant_id, sentence_index),
+                    media_type="application/json")
+
+
+def get_build_response_compressed(encoding):
+    representation = Representation(JSON_MEDIA_TYPE, encoding)
+
+    def build_response_compressed(schedule_store, participant_id, sentence_index):
+        return Response(content=schedule_store.get_encoded_sentence(participant_id, sentence_index, representation),
+                        media_type="application/json", headers={"Content-Encoding": encoding})
+
+    return build_response_compressed
+
+
+def run_benchmark(name, build_response, schedule_store, requests):
+    wall_times = []
+    cpu_times = []
+
+    for _ in range(_ROUNDS):
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        for participant_id, sentence_index in requests:
+            build_response(schedule_store, participant_id, sentence_index)
+        cpu_times.append(time.process_time() - cpu_start)
+        wall_times.append(time.perf_counter() - wall_start)
+
+    latency_us = statistics.median(wall_times) / len(requests) * 1e6
+    cpu_us = statistics.median(cpu_times) / len(requests) * 1e6
+    print(f"{name:<12} latency: {latency_us:8.2f} us/request, cpu: {cpu_us:8.2f} us/request")
+    return latency_us
+
+
+def print_first_compressions(encodings, requests):
+    # the first request of each sentence compresses it (on the event loop), once for all the participants
+    # sharing it; measured on a fresh store, so nothing is cached yet
+    for encoding in encodings:
+        schedule_store = load_schedule_store()
+        representation = Representation(JSON_MEDIA_TYPE, encoding)
+        for participant_id, _ in requests:
+            schedule_store.get_participant(participant_id)
+
+        times = []
+        for participant_id, sentence_index in requests:
+            start = time.perf_counter()
+            schedule_store.get_encoded_sentence(participant_id, sentence_index, representation)
+            times.append(time.perf_counter() - start)
+        participant_ids = {participant_id for participant_id, _ in requests}
+        start = time.perf_counter()
+        for participant_id in participant_ids:
+            schedule_store.get_encoded_schedule(participant_id, representation)
+        schedule_ms = (time.perf_counter() - start) / len(participant_ids) * 1e3
+        print(f"{encoding:<12} first compression: {sum(times) / len(times) * 1e6:8.2f} us/request "
+              f"(max {max(times) * 1e3:.2f} ms), schedule: {schedule_ms:.2f} ms/participant")
+
+
+def print_sizes(schedule_store, requests):
+    # the bytes sent per sentence in each representation the clients can negotiate
+    media_types = [JSON_MEDIA_TYPE] + ([MSGPACK_MEDIA_TYPE] if get_msgpack() else [])
+    encodings = [None, 'gzip'] + (['br'] if get_brotli() else [])
+    sentences = set(requests)
+
+    json_size = sum(len(schedule_store.get_encoded_sentence(*sentence)) for sentence in sentences)
+    for sentence_format in [FULL_FORMAT, PARTS_FORMAT]:
+        for media_type in media_types:
+            for encoding in encodings:
+                representation = Representation(media_type, encoding, sentence_format)
+                size = sum(len(schedule_store.get_encoded_sentence(*sentence, representation))
+                           for sentence in sentences)
+                print(f"{sentence_format:<6} {media_type:<20} {encoding or 'identity':<9} "
+                      f"{size / len(sentences):8.0f} bytes/sentence ({json_size / size:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    _schedule_store = load_schedule_store()
+
+    # walk through every participant's schedule, the way the clients do
+    _requests = []
+    _participant_ids = _schedule_store.get_participant_ids()
+    while len(_requests) < _REQUESTS_PER_ROUND:
+        for _participant_id in _participant_ids:
+            _index = len(_requests) % _schedule_store.get_sentence_count(_participant_id)
+            _requests.append((_participant_id, _index))
+
+    # both paths must send the same JSON document, which the parts format rebuilds
+    for _participant_id, _index in _requests[:len(_participant_ids)]:
+        assert (json.loads(build_response_serialized(_schedule_store, _participant_id, _index).body) ==
+                json.loads(build_response_encoded(_schedule_store, _participant_id, _index).body) ==
+                expand_sentence(json.loads(_schedule_store.get_encoded_sentence(
+                    _participant_id, _index, Representation(JSON_MEDIA_TYPE, None, PARTS_FORMAT)))))
+
+    _serialized = run_benchmark("serialized", build_response_serialized, _schedule_store, _requests)
+    _encoded = run_benchmark("pre-encoded", build_response_encoded, _schedule_store, _requests)
+    print(f"speedup: {_serialized / _encoded:.1f}x")
+
+    # the compressed bodies, as negotiated by the browsers (see content_encoding.py)
+    _encodings = ['gzip'] + (['br'] if get_brotli() else [])
+    for _encoding in _encodings:
+        run_benchmark(_encoding, get_build_response_compressed(_encoding), _schedule_store, _requests)
+    print_first_compressions(_encodings, _requests)
+
+    print_sizes(_schedule_store, _requests)
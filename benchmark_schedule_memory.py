@@ -0,0 +1,69 @@
+import argparse
+import gc
+import time
+import tracemalloc
+
+from backend.compact_schedule import get_compact_participant
+from backend.schedule_artifact import read_participant
+from backend.schedule_store import load_schedule_store, encode_sentence, CachedSchedule
+from backend.sentence_cache import SentenceCache
+
+_PARTICIPANT_COUNTS = [1000, 10000]
+
+
+def measure(name, build_participant, participant_ids, count):
+    # the memory kept by `count` participant schedules, each read from the compiled artifact
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    kept = [build_participant(participant_ids[number % len(participant_ids)]) for number in range(count)]
+
+    seconds = time.perf_counter() - start
+    kept_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+
+    print(f"{name:<16} {count:>6} participants: {kept_bytes / 2 ** 20:9.1f} MiB "
+          f"({kept_bytes / count / 1024:7.1f} KiB/participant), built in {seconds:6.2f}s")
+    return kept_bytes
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser(description="Compare the memory of the schedules as models, compact and shared")
+    _parser.add_argument('--participants', type=int, nargs='*', default=_PARTICIPANT_COUNTS)
+    _args = _parser.parse_args()
+
+    _schedule_store = load_schedule_store()
+    _hashes = {participant_id: _schedule_store.get_schedule_hash(participant_id)
+               for participant_id in _schedule_store.get_participant_ids()}
+    # the participants in the artifact, repeated up to the count (a file per participant, as in a large study)
+    _participant_ids = [participant_id for participant_id, schedule_hash in _hashes.items()
+                        if read_participant(participant_id, schedule_hash, _schedule_store.directory) is not None]
+
+    def _read_model(participant_id):
+        return read_participant(participant_id, _hashes[participant_id], _schedule_store.directory)
+
+    def _read_compact(participant_id):
+        return get_compact_participant(_read_model(participant_id))
+
+    def _read_encoded(participant_id):
+        return [encode_sentence(sentence) for sentence in _read_model(participant_id).sentences]
+
+    def _read_shared(participant_id):
+        # compact and encoded, as kept by the schedule store, with the sentences of the styles shared
+        schedule_hash = _hashes[participant_id]
+        return CachedSchedule(read_participant(participant_id, schedule_hash, _schedule_store.directory,
+                                               _schedule_store.sentence_cache),
+                              schedule_hash, _schedule_store.get_shared_sentence)
+
+    for _count in _args.participants:
+        _model_bytes = measure("models", _read_model, _participant_ids, _count)
+        _compact_bytes = measure("compact", _read_compact, _participant_ids, _count)
+        _encoded_bytes = measure("encoded JSON", _read_encoded, _participant_ids, _count)
+        # measured along with the shared sentences (read once, into an empty cache)
+        _schedule_store.sentence_cache = SentenceCache()
+        _shared_bytes = measure("shared", _read_shared, _participant_ids, _count)
+        print(f"compact: {_model_bytes / _compact_bytes:.1f}x smaller than the models")
+        print(f"shared (compact and encoded): {(_compact_bytes + _encoded_bytes) / _shared_bytes:.1f}x smaller "
+              f"than compact and encoded per participant")
@@ -0,0 +1,271 @@
+import argparse
+import csv
+import os
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from backend.sentence_utility import (get_all_participants_content, get_all_styles, get_text, is_not_empty,
+                                      _SENTENCES_FILE, _TRAINING_PARTICIPANT_IDS)
+from utilities import file_utility
+
+_OUTPUT_FILE = 'output/Participant_style.csv'
+'''
+Participant,Style.1,Sentences.1,Style.2,Sentences.2,Style.3,Sentences.3,Style.4,Sentences.4
+p901,S1,"33,2,15",S2,"38,6,19",W2,"32,4,22",W1,"28,7,1"
+'''
+
+# the training participant whose sentences are kept out of the study blocks (px is shown all sentences)
+_TRAINING_SENTENCES_PARTICIPANT_ID = 'p0'
+
+_VOCABULARY_COLUMNS = ['Word11.L2', 'Word12.L2', 'Word13.L2']
+
+# the partition search stops after this many steps with the best partition found so far
+_MAX_SEARCH_STEPS = 200000
+
+
+class StudySentence:
+    def __init__(self, sentence_id: int, vocab_count: int, word_count: int, words: set):
+        self.id = sentence_id
+        self.vocab_count = vocab_count
+        self.word_count = word_count
+        self.words = words  # the L2 vocabulary, lower case
+
+
+def get_training_sentence_ids(participants_content: Dict[str, Dict]) -> List[int]:
+    # the sentences of the training participant in the current participants file
+    styles_sentences = participants_content.get(_TRAINING_SENTENCES_PARTICIPANT_ID)
+    if styles_sentences is None:
+        raise Exception(f"No training participant {_TRAINING_SENTENCES_PARTICIPANT_ID}, "
+                        f"use --training-sentences")
+
+    sentence_ids = []
+    for i in range(1, len(get_all_styles()) + 1):
+        for sentence_id in get_text(styles_sentences[f'Sentences.{i}']).split(','):
+            if sentence_id.strip() and int(sentence_id) not in sentence_ids:
+                sentence_ids.append(int(sentence_id))
+    return sentence_ids
+
+
+def read_study_sentences(training_sentence_ids: List[int]) -> List[StudySentence]:
+    # the sentences other than the training ones, which must all be in the sentences file
+    df_sentences = file_utility.read_csv(_SENTENCES_FILE)
+
+    sentences = []
+    for _, row in df_sentences.iterrows():
+        sentence_id = int(row['ID'])
+        if sentence_id in training_sentence_ids:
+            continue
+        words = {get_text(row[column]).lower() for column in _VOCABULARY_COLUMNS if is_not_empty(row[column])}
+        sentences.append(StudySentence(sentence_id, int(row['VocabCount']), int(row['WordCount']), words))
+
+    unknown_ids = sorted(set(training_sentence_ids) - {int(sentence_id) for sentence_id in df_sentences['ID']})
+    if unknown_ids:
+        raise Exception(f"Training sentence ids not in {_SENTENCES_FILE}: {unknown_ids}")
+    return sentences
+
+
+def get_sentence_groups(sentences: List[StudySentence]) -> List[List[StudySentence]]:
+    # the sentences sharing an L2 word (directly or through others) have to be in the same block
+    parents = list(range(len(sentences)))
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    first_sentence_of_word = {}
+    for index, sentence in enumerate(sentences):
+        for word in sentence.words:
+            other_index = first_sentence_of_word.setdefault(word, index)
+            parents[find(index)] = find(other_index)
+
+    groups: Dict[int, List[StudySentence]] = {}
+    for index, sentence in enumerate(sentences):
+        groups.setdefault(find(index), []).append(sentence)
+    return list(groups.values())
+
+
+def get_spread(values: List[int]) -> int:
+    return max(values) - min(values)
+
+
+def partition_sentences(sentences: List[StudySentence], block_count: int, block_size: int,
+                        rng: random.Random) -> Optional[List[List[StudySentence]]]:
+    '''
+    Split the sentences into `block_count` blocks of `block_size` sentences, without an L2 word shared between
+    blocks, minimizing the spread of the VocabCount sums (then of the WordCount sums) over the blocks.
+    A branch and bound search over the groups of sentences that share words: the groups are placed largest first,
+    into the least filled blocks first (so the first solution is already balanced), and a branch is dropped
+    as soon as its full blocks can not beat the best solution found.
+    Sentences beyond block_count * block_size are left out. Returns None if no partition exists.
+    '''
+    groups = get_sentence_groups(sentences)
+    # the seed only breaks the ties
+    rng.shuffle(groups)
+    groups.sort(key=lambda group: (len(group), sum(sentence.vocab_count for sentence in group)), reverse=True)
+
+    remaining_sizes = [0] * (len(groups) + 1)
+    for index in range(len(groups) - 1, -1, -1):
+        remaining_sizes[index] = remaining_sizes[index + 1] + len(groups[index])
+
+    blocks: List[List[StudySentence]] = [[] for _ in range(block_count)]
+    vocab_sums = [0] * block_count
+    word_sums = [0] * block_count
+    best: Dict[str, object] = {'score': None, 'blocks': None}
+    steps = 0
+
+    def get_lower_bound() -> Tuple[int, int]:
+        # the full blocks are final, and the others can only grow
+        full_indices = [index for index in range(block_count) if len(blocks[index]) == block_size]
+        if not full_indices:
+            return 0, 0
+        return (max(vocab_sums) - min(vocab_sums[index] for index in full_indices),
+                max(word_sums) - min(word_sums[index] for index in full_indices))
+
+    def search(group_index: int):
+        nonlocal steps
+        steps += 1
+
+        free_count = sum(block_size - len(block) for block in blocks)
+        if free_count == 0:
+            score = (get_spread(vocab_sums), get_spread(word_sums))
+            if best['score'] is None or score < best['score']:
+                best['score'] = score
+                best['blocks'] = [list(block) for block in blocks]
+            return
+        if group_index == len(groups) or remaining_sizes[group_index] < free_count or steps > _MAX_SEARCH_STEPS:
+            return
+        if best['score'] is not None and get_lower_bound() >= best['score']:
+            return
+
+        group = groups[group_index]
+        tried_empty_block = False
+        for block_index in sorted(range(block_count), key=lambda index: (vocab_sums[index], word_sums[index])):
+            if len(blocks[block_index]) + len(group) > block_size:
+                continue
+            if not blocks[block_index]:
+                # the empty blocks are interchangeable
+                if tried_empty_block:
+                    continue
+                tried_empty_block = True
+
+            blocks[block_index].extend(group)
+            vocab_sums[block_index] += sum(sentence.vocab_count for sentence in group)
+            word_sums[block_index] += sum(sentence.word_count for sentence in group)
+            search(group_index + 1)
+            del blocks[block_index][-len(group):]
+            vocab_sums[block_index] -= sum(sentence.vocab_count for sentence in group)
+            word_sums[block_index] -= sum(sentence.word_count for sentence in group)
+
+        # or leave the group out, if the other groups can still fill the blocks
+        if remaining_sizes[group_index + 1] >= free_count:
+            search(group_index + 1)
+
+    search(0)
+    return best['blocks']
+
+
+def get_balanced_latin_square(size: int) -> List[List[int]]:
+    # Williams design: each condition is at each position, and follows each other condition, equally often
+    # 0, 1, n-1, 2, n-2, ...
+    first_row = [0] + [(index + 1) // 2 if index % 2 == 1 else size - index // 2 for index in range(1, size)]
+
+    rows = [[(condition + shift) % size for condition in first_row] for shift in range(size)]
+    if size % 2 == 1:
+        # an odd size also needs the mirrored rows to balance the carry-over
+        rows += [list(reversed(row)) for row in rows]
+    return rows
+
+
+def get_participant_rows(participant_ids: List[str], styles: List[str], blocks: List[List[StudySentence]],
+                         rng: random.Random) -> List[List[str]]:
+    '''
+    The style order of participant i is row i of the balanced Latin square, and the blocks of sentences are
+    rotated after each full square, so each style meets each block (and each block each position) equally often.
+    The sentence order within a block is shuffled for each participant.
+    '''
+    square = get_balanced_latin_square(len(styles))
+
+    rows = []
+    for number, participant_id in enumerate(participant_ids):
+        style_order = square[number % len(square)]
+        rotation = (number // len(square)) % len(blocks)
+
+        row = [participant_id]
+        for position, style_index in enumerate(style_order):
+            sentence_ids = [sentence.id for sentence in blocks[(position + rotation) % len(blocks)]]
+            rng.shuffle(sentence_ids)
+            row += [styles[style_index], ','.join(str(sentence_id) for sentence_id in sentence_ids)]
+        rows.append(row)
+    return rows
+
+
+def get_training_rows(styles: List[str], participants_content: Dict[str, Dict]) -> List[List[str]]:
+    # kept as they are in the current participants file
+    rows = []
+    for participant_id in _TRAINING_PARTICIPANT_IDS:
+        if participant_id not in participants_content:
+            continue
+        styles_sentences = participants_content[participant_id]
+        row = [participant_id]
+        for i in range(1, len(styles) + 1):
+            row += [get_text(styles_sentences[f'Style.{i}']), get_text(styles_sentences[f'Sentences.{i}'])]
+        rows.append(row)
+    return rows
+
+
+def write_participant_styles(file_name: str, styles: List[str], rows: List[List[str]]):
+    header = ['Participant']
+    for i in range(1, len(styles) + 1):
+        header += [f'Style.{i}', f'Sentences.{i}']
+
+    file_utility.create_directory(os.path.dirname(file_name) or '.')
+    with open(file_name, 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser(description="Generate counterbalanced participant styles and sentences")
+    _parser.add_argument('--participants', type=int, default=16)
+    _parser.add_argument('--first-id', type=int, default=901, help="e.g., 901 for p901, p902, ...")
+    _parser.add_argument('--block-size', type=int, default=None,
+                         help="sentences per block (default: all study sentences split evenly)")
+    _parser.add_argument('--seed', type=int, default=0)
+    _parser.add_argument('--training-sentences', default=None,
+                         help="comma separated sentence ids kept out of the study blocks "
+                              f"(default: the sentences of {_TRAINING_SENTENCES_PARTICIPANT_ID} in the current file)")
+    _parser.add_argument('--output', default=_OUTPUT_FILE)
+    _args = _parser.parse_args()
+
+    _start = time.perf_counter()
+    _rng = random.Random(_args.seed)
+    _styles = get_all_styles()
+
+    _participants_content = get_all_participants_content()
+    if _args.training_sentences is None:
+        _training_sentence_ids = get_training_sentence_ids(_participants_content)
+    else:
+        _training_sentence_ids = [int(sentence_id) for sentence_id in _args.training_sentences.split(',')
+                                  if sentence_id.strip()]
+    print(f"Training sentences: {_training_sentence_ids}")
+
+    _sentences = read_study_sentences(_training_sentence_ids)
+    _block_size = _args.block_size or len(_sentences) // len(_styles)
+    _blocks = partition_sentences(_sentences, len(_styles), _block_size, _rng)
+    if _blocks is None:
+        raise Exception(f"No {len(_styles)} blocks of {_block_size} sentences without a shared L2 word")
+
+    for _number, _block in enumerate(_blocks, 1):
+        print(f"Block {_number}: {[sentence.id for sentence in _block]}, "
+              f"VocabCount {sum(sentence.vocab_count for sentence in _block)}, "
+              f"WordCount {sum(sentence.word_count for sentence in _block)}")
+
+    _participant_ids = [f'p{_args.first_id + number}' for number in range(_args.participants)]
+    _rows = get_training_rows(_styles, _participants_content) + get_participant_rows(_participant_ids, _styles, _blocks, _rng)
+    write_participant_styles(_args.output, _styles, _rows)
+
+    print(f"{len(_rows)} participants have been written to {_args.output} in {time.perf_counter() - _start:.2f}s")
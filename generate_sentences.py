@@ -1,3 +1,5 @@
+import functools
+
 from utilities import file_utility
 
 _L1_SENTENCE_CSV_FILE = 'text/L1-sentences.csv'
@@ -8,10 +10,6 @@ A bird flies in the sky
 '''
 
 _L1_L2_MAPPING_CSV_FILE = 'text/L1-L2-mapping.csv'
-
-_L1_WORDS, _L2_WORDS = file_utility.load_first_second_colum_from_csv(_L1_L2_MAPPING_CSV_FILE)
-# print(_L2_WORDS, _L1_WORDS)
-
 '''
 L1,L2
 he,sa
@@ -21,13 +19,21 @@ He,Sa
 _L1_L2_SENTENCE_CSV_FILE = 'output/L1-L2-sentences.csv'
 
 
+@functools.cache
+def get_l1_l2_words():
+    # read on first use, not when imported (e.g., by mark_answers.py)
+    return file_utility.load_first_second_colum_from_csv(_L1_L2_MAPPING_CSV_FILE)
+
+
 def get_l1_l2_mapping():
-    return {key: value for key, value in zip(_L1_WORDS, _L2_WORDS) if
+    _l1_words, _l2_words = get_l1_l2_words()
+    return {key: value for key, value in zip(_l1_words, _l2_words) if
             key is not None and value is not None}
 
 
 def get_l2_l1_mapping():
-    return {key: value for key, value in zip(_L2_WORDS, _L1_WORDS) if
+    _l1_words, _l2_words = get_l1_l2_words()
+    return {key: value for key, value in zip(_l2_words, _l1_words) if
             key is not None and value is not None}
 
 
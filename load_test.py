@@ -0,0 +1,225 @@
+import argparse
+import asyncio
+import math
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import httpx
+
+from backend.sentence_utility import CONTINUE_TEXTS
+
+# the frontend's constants (VocabularyCard.vue)
+_PREFETCH_SENTENCE_COUNT = 3
+_LOG_BATCH_SIZE = 20
+_LOG_FLUSH_INTERVAL = 2.0
+
+_REQUEST_TIMEOUT = 10.0
+_IN_PROCESS_URL = 'http://load-test'
+
+
+class LoadStats:
+    '''
+    Latencies and errors of the requests, per endpoint.
+    '''
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, endpoint: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, timeout=_REQUEST_TIMEOUT, **kwargs)
+        except Exception:
+            # e.g., a timeout, or an exception of the app in this process; counted, so the other sessions go on
+            self.errors[endpoint] += 1
+            return None
+        finally:
+            self.latencies[endpoint].append(time.perf_counter() - start)
+
+        if response.status_code >= 400:
+            self.errors[endpoint] += 1
+            return None
+        return response
+
+
+def get_percentile(sorted_values: List[float], percentile: float) -> float:
+    # nearest-rank
+    return sorted_values[max(0, math.ceil(percentile / 100 * len(sorted_values)) - 1)]
+
+
+class VirtualParticipant:
+    '''
+    Walks through a participant's schedule like VocabularyCard.vue (without the WebSocket stream):
+    each word is displayed for its displayDuration (divided by `speed`), the continue button is clicked
+    after `continue_delay`, and the log messages are sent the same way.
+    '''
+
+    def __init__(self, client: httpx.AsyncClient, stats: LoadStats, participant_id: str, speed: float,
+                 continue_delay: float, batched: bool):
+        self._client = client
+        self._stats = stats
+        self._participant_id = participant_id
+        self._speed = speed
+        self._continue_delay = continue_delay
+        self._batched = batched
+
+        self._sentence_queue = []
+        self._log_buffer = []
+        self._last_flush = time.monotonic()
+        self.sentence_count = 0
+
+    async def _fetch_sentence(self) -> List[dict]:
+        if not self._batched:
+            response = await self._stats.request(self._client, 'next-sentence', 'GET',
+                                                 f"/api/next-sentence/{self._participant_id}")
+            return response.json()['subWords'] if response is not None else []
+
+        if not self._sentence_queue:
+            response = await self._stats.request(self._client, 'next-sentences', 'GET',
+                                                 f"/api/next-sentences/{self._participant_id}",
+                                                 params={'count': _PREFETCH_SENTENCE_COUNT, 'advance': 'false'})
+            if response is None:
+                return []
+            data = response.json()
+            self._sentence_queue.extend(zip(data['sentenceIndices'], data['sentences']))
+
+        sentence_index, sentence = self._sentence_queue.pop(0)
+        # the window does not move the progress, each displayed sentence does
+        await self._stats.request(self._client, 'progress', 'POST', f"/api/progress/{self._participant_id}",
+                                  json={'sentenceIndex': sentence_index})
+        await self._stats.request(self._client, 'assets', 'GET', f"/api/assets/{self._participant_id}",
+                                  params={'start': sentence_index, 'count': _PREFETCH_SENTENCE_COUNT})
+        return sentence['subWords']
+
+    async def _log(self, message: str):
+        log_message = {'message': message, 'timestamp': datetime.now(timezone.utc).isoformat()}
+
+        if not self._batched:
+            await self._stats.request(self._client, 'log', 'POST', "/api/log", json=log_message)
+            return
+
+        self._log_buffer.append(log_message)
+        if len(self._log_buffer) >= _LOG_BATCH_SIZE or \
+                time.monotonic() - self._last_flush >= _LOG_FLUSH_INTERVAL / self._speed:
+            await self._flush_logs()
+
+    async def _flush_logs(self):
+        self._last_flush = time.monotonic()
+        if self._log_buffer:
+            batch, self._log_buffer = self._log_buffer, []
+            await self._stats.request(self._client, 'log-batch', 'POST', "/api/log/batch",
+                                      json={'messages': batch})
+
+    async def run(self, end_time: float):
+        while time.monotonic() < end_time:
+            words = await self._fetch_sentence()
+            if not words:
+                # the request failed: wait as the participant would, rather than flood the server with retries
+                await asyncio.sleep(self._continue_delay)
+                continue
+            await self._log(f"Successfully fetched next sentence {self.sentence_count}")
+
+            for word_index, word in enumerate(words):
+                await self._log(f"Attempting to fetch next word with id {word_index} in sentence "
+                                f"{self.sentence_count}")
+                if word['foreignText'] in CONTINUE_TEXTS:
+                    await asyncio.sleep(self._continue_delay)
+                else:
+                    await asyncio.sleep(word['displayDuration'] / 1000 / self._speed)
+                if time.monotonic() >= end_time:
+                    break
+            else:
+                # the client tries the word after the last one, before finishing the sentence
+                await self._log(f"Attempting to fetch next word with id {len(words)} in sentence "
+                                f"{self.sentence_count}")
+
+            await self._log(f"Finished current sentence {self.sentence_count}; Fetching next sentence")
+            self.sentence_count += 1
+
+        await self._flush_logs()
+
+
+async def run_load_test(client: httpx.AsyncClient, participant_ids: List[str], participants: int, duration: float,
+                        speed: float, continue_delay: float, batched: bool, ramp_up: float):
+    stats = LoadStats()
+    start = time.monotonic()
+    end_time = start + duration
+
+    async def run_participant(number: int):
+        # spread the session starts over the ramp up time
+        await asyncio.sleep(ramp_up * number / participants)
+        virtual_participant = VirtualParticipant(client, stats, participant_ids[number % len(participant_ids)],
+                                                 speed, continue_delay, batched)
+        await virtual_participant.run(end_time)
+        return virtual_participant.sentence_count
+
+    sentence_counts = await asyncio.gather(*(run_participant(number) for number in range(participants)))
+    elapsed = time.monotonic() - start
+
+    print(f"{participants} participants, {elapsed:.1f}s, {sum(sentence_counts)} sentences "
+          f"(speed {speed:g}x, {'batched' if batched else 'single'} requests)")
+    print(f"{'endpoint':<16}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+
+    total_requests = 0
+    total_errors = 0
+    for endpoint, latencies in sorted(stats.latencies.items()):
+        latencies = sorted(latencies)
+        total_requests += len(latencies)
+        total_errors += stats.errors[endpoint]
+        print(f"{endpoint:<16}{len(latencies):>10}{stats.errors[endpoint]:>8}{len(latencies) / elapsed:>10.1f}" +
+              "".join(f"{get_percentile(latencies, p) * 1000:>10.2f}" for p in (50, 95, 99)))
+
+    error_rate = total_errors / total_requests if total_requests else 0
+    print(f"total: {total_requests} requests, {total_requests / elapsed:.1f} req/s, error rate {error_rate:.2%}")
+
+
+async def main(args):
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url) as client:
+            response = await client.get("/api/schedule/" + args.participant_ids.split(',')[0])
+            response.raise_for_status()
+            await run_load_test(client, args.participant_ids.split(','), args.participants, args.duration,
+                                args.speed, args.continue_delay, not args.single, args.ramp_up)
+        return
+
+    # the app in this process, so the progress (in memory) and the live schedules are left untouched
+    os.environ.setdefault('PROGRESS_STORE', 'memory')
+    os.environ.setdefault('SCHEDULE_RELOAD', '0')
+    from backend.backend import app, get_schedule_store
+
+    async with app.router.lifespan_context(app):
+        participant_ids = args.participant_ids.split(',') if args.participant_ids else \
+            get_schedule_store().get_participant_ids()
+        # the app's exceptions are returned as 500 responses (as by a server), counted as errors
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url=_IN_PROCESS_URL) as client:
+            await run_load_test(client, participant_ids, args.participants, args.duration,
+                                args.speed, args.continue_delay, not args.single, args.ramp_up)
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser(description="Simulate concurrent study sessions against the backend")
+    _parser.add_argument('--participants', type=int, default=100, help="virtual participants")
+    _parser.add_argument('--duration', type=float, default=60, help="seconds")
+    _parser.add_argument('--speed', type=float, default=1,
+                         help="time scale of the display durations, e.g., 10 runs the sessions 10x faster")
+    _parser.add_argument('--continue-delay', type=float, default=1.0,
+                         help="seconds before clicking the continue button")
+    _parser.add_argument('--ramp-up', type=float, default=10, help="seconds over which the sessions start")
+    _parser.add_argument('--single', action='store_true',
+                         help="one /api/next-sentence and /api/log request at a time (the original client)")
+    _parser.add_argument('--url', default=None,
+                         help="a running backend, e.g., http://localhost:8000 (default: the app in this process); "
+                              "moves the participants' progress (reset it afterwards) and writes to its log")
+    _parser.add_argument('--participant-ids', default=None,
+                         help="comma separated (default: all; required with --url)")
+    _args = _parser.parse_args()
+
+    if _args.url and not _args.participant_ids:
+        _parser.error("--participant-ids is required with --url")
+
+    asyncio.run(main(_args))
@@ -7,15 +7,35 @@ import platform
 import threading
 from datetime import datetime
 from utilities.git_utility import get_git_branch
-from backend.backend import app
 
+# more than one worker shares the participants' progress through the database (see backend/progress_store.py)
+_BACKEND_WORKERS = int(os.environ.get('BACKEND_WORKERS', 1))
 
-def start_logger():
+
+def get_log_file():
     today = datetime.today()
     today_string = today.strftime('%Y%m%d')
+    return f'system-{today_string}.log'
+
+
+def get_worker_log_config():
+    # uvicorn applies this in every worker process, the same as `start_logger` does for a single process
+    return {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'formatters': {
+            'default': {'format': '%(asctime)s - %(levelname)s - %(message)s'},
+        },
+        'handlers': {
+            'file': {'class': 'logging.FileHandler', 'filename': get_log_file(), 'mode': 'a', 'formatter': 'default'},
+        },
+        'root': {'level': 'DEBUG', 'handlers': ['file']},
+    }
 
+
+def start_logger():
     logging.basicConfig(
-        filename=f'system-{today_string}.log',
+        filename=get_log_file(),
         filemode='a',
         format='%(asctime)s - %(levelname)s - %(message)s',
         level=logging.DEBUG
@@ -27,8 +47,16 @@ def start_logger():
 
 def run_backend(logger):
     try:
-        logger.info("Running backend server...")
-        uvicorn.run(app, host="0.0.0.0", port=8000)
+        if _BACKEND_WORKERS > 1:
+            logger.info("Running backend server with %d workers..." % _BACKEND_WORKERS)
+            # each worker imports the app itself, so it must be given as an import string
+            uvicorn.run("backend.backend:app", host="0.0.0.0", port=8000, workers=_BACKEND_WORKERS,
+                        log_config=get_worker_log_config())
+        else:
+            logger.info("Running backend server...")
+            # imported here, so the frontend starts without waiting for the backend's imports
+            from backend.backend import app
+            uvicorn.run(app, host="0.0.0.0", port=8000)
     except Exception as e:
         logger.error(f"Exception occurred while running the backend server: {str(e)}")
 
@@ -52,6 +80,10 @@ def run_frontend(logger):
 
 
 if __name__ == "__main__":
+    if _BACKEND_WORKERS > 1:
+        # inherited by the worker processes
+        os.environ['PROGRESS_STORE'] = 'shared'
+
     logger = start_logger()
 
     backend_thread = threading.Thread(target=run_backend, args=(logger,), daemon=True)
@@ -1,12 +1,16 @@
 # encoding: utf-8
+import functools
 from collections import Counter
-
-import pandas as pd
+from typing import TYPE_CHECKING
 
 from backend.sentence_utility import get_all_sentences_content, get_all_participants_content, get_all_styles
 from generate_sentences import get_l2_l1_mapping, get_mapped_sentence
 from utilities import file_utility
 
+if TYPE_CHECKING:
+    # pandas is slow to import, so only in the functions that use it
+    import pandas as pd
+
 _L2_IGNORE_WORDS = ['sa', 'Sa', 'sas', 'chu', 'Chu', 'chus', 'en', 'En', 'snu', 'Snu', 'er', 'eb',
                     'ep', 'fra', 'ures', 'ig', 'x', 'X', 'xx', 'xxx',
                     ]
@@ -31,6 +35,8 @@ Participant,S1-Words,S2-Words,S3-Words,S1-Sentences,S2-Sentences,S3-Sentences,S1
 
 
 def get_clean_text(text):
+    import pandas as pd
+
     if pd.isna(text):
         return ""
 
@@ -57,17 +63,17 @@ ID,L2,L1,Image
 2,En wims seps ep snu nend.,A dog runs in the park.,image2
 '''
 
-_SENTENCES_FILE_DATA = get_all_sentences_content()  # { SENTENCE_ID: (SENTENCE_ID, L2, L1, Image, ...) )}
-
-_ID_L2_SENTENCE_MAPPING = {key: value[1] for key, value in
-                           _SENTENCES_FILE_DATA.items()}  # {SentenceId: L2Sentence, ...}
+# the csv files are read on first use (not when imported), and only once
 
+@functools.cache
+def get_id_l2_sentence_mapping():
+    _sentences_file_data = get_all_sentences_content()  # { SENTENCE_ID: (SENTENCE_ID, L2, L1, Image, ...) )}
 
-# print("_L2_ID_SENTENCE_MAPPING", _L2_ID_SENTENCE_MAPPING)
+    return {key: value[1] for key, value in _sentences_file_data.items()}  # {SentenceId: L2Sentence, ...}
 
 
 def check_duplicates():
-    _all_l2_sentences = list(_ID_L2_SENTENCE_MAPPING.values())
+    _all_l2_sentences = list(get_id_l2_sentence_mapping().values())
     # print("_all_l2_sentences", _all_l2_sentences)
 
     _all_l2_sentences_clean = [get_clean_text(sentence) for sentence in _all_l2_sentences]
@@ -87,16 +93,18 @@ def check_duplicates():
 
 
 # L2 to L1 mapping
-_L2_L1_MAPPING = get_l2_l1_mapping()
+@functools.cache
+def get_l2_l1_text_mapping():
+    return get_l2_l1_mapping()
 
 
-# print("_L2_L1_MAPPING", _L2_L1_MAPPING)
-
 def get_l1_text(l2_text):
-    return get_mapped_sentence(l2_text, _L2_L1_MAPPING)
+    return get_mapped_sentence(l2_text, get_l2_l1_text_mapping())
 
 
-_L1_IGNORE_WORDS = [get_l1_text(l2) for l2 in _L2_IGNORE_WORDS]
+@functools.cache
+def get_l1_ignore_words():
+    return [get_l1_text(l2) for l2 in _L2_IGNORE_WORDS]
 
 _PARTICIPANTS_FILE = 'backend/data/Participant_style.csv'
 '''
@@ -105,47 +113,49 @@ p101,S1,"1,2",S2,"1,2",S3,"1,2",S4,"1,2",S5,"1,2"
 p102,S2,"1,2",S3,"1,2",S4,"1,2",S5,"1,2",S1,"1,2"
 '''
 
-_PARTICIPANTS_FILE_DATA = get_all_participants_content()  # {ParticipantID: {Participant: x, Style.1: , Sentences.1, ...}}
-
-_PARTICIPANT_SENTENCE_ID_STYLE_MAPPING = {}  # {ParticipantID: {SentenceID: Style, ...}}
-for _participant_id, _styles in _PARTICIPANTS_FILE_DATA.items():
-    _style_sentence_map = {}
+@functools.cache
+def get_participant_sentence_id_style_mapping():
+    _participants_file_data = get_all_participants_content()  # {ParticipantID: {Participant: x, Style.1: , Sentences.1, ...}}
 
-    # Iterate over the columns in pairs (Style.X, Sentences.X)
-    for i in range(1, len(get_all_styles()) + 1):
-        _style = _styles[f'Style.{i}']
-        _sentence_ids = _styles[f'Sentences.{i}']
+    _participant_sentence_id_style_mapping = {}  # {ParticipantID: {SentenceID: Style, ...}}
+    for _participant_id, _styles in _participants_file_data.items():
+        _style_sentence_map = {}
 
-        # Split the sentence IDs and map each to the corresponding style
-        for _sentence_id in _sentence_ids.split(','):
-            _sentence_id_int = int(_sentence_id)
-            _style_sentence_map[_sentence_id_int] = _style
+        # Iterate over the columns in pairs (Style.X, Sentences.X)
+        for i in range(1, len(get_all_styles()) + 1):
+            _style = _styles[f'Style.{i}']
+            _sentence_ids = _styles[f'Sentences.{i}']
 
-    # Add the participant's mapping to the dictionary
-    _PARTICIPANT_SENTENCE_ID_STYLE_MAPPING[_participant_id] = _style_sentence_map
+            # Split the sentence IDs and map each to the corresponding style
+            for _sentence_id in _sentence_ids.split(','):
+                _sentence_id_int = int(_sentence_id)
+                _style_sentence_map[_sentence_id_int] = _style
 
-# print("_PARTICIPANT_SENTENCE_ID_STYLE_MAPPING", _PARTICIPANT_SENTENCE_ID_STYLE_MAPPING)
+        # Add the participant's mapping to the dictionary
+        _participant_sentence_id_style_mapping[_participant_id] = _style_sentence_map
 
+    return _participant_sentence_id_style_mapping
 
-_PARTICIPANT_L2_TEXT_STYLE_MAPPING = {}  # {ParticipantID: {L2_Sentence: Style, L2_Word: Style ...}}
 
-for _participant_id, _sentence_style_map in _PARTICIPANT_SENTENCE_ID_STYLE_MAPPING.items():
-    _l2_word_style_map = {}
+@functools.cache
+def get_participant_l2_text_style_mapping():
+    _participant_l2_text_style_mapping = {}  # {ParticipantID: {L2_Sentence: Style, L2_Word: Style ...}}
 
-    for _sentence_id, _style in _sentence_style_map.items():
-        _l2_sentence = _ID_L2_SENTENCE_MAPPING[_sentence_id]
-        _l2_sentence = get_clean_text(_l2_sentence)
-        # assign sentence to style
-        _l2_word_style_map[_l2_sentence] = _style
-        # assign word to style
-        for _l2_word in get_supported_words(_l2_sentence):
-            _l2_word_style_map[_l2_word] = _style
+    for _participant_id, _sentence_style_map in get_participant_sentence_id_style_mapping().items():
+        _l2_word_style_map = {}
 
-        # print(_sentence_id, _l2_word_style_map)
+        for _sentence_id, _style in _sentence_style_map.items():
+            _l2_sentence = get_id_l2_sentence_mapping()[_sentence_id]
+            _l2_sentence = get_clean_text(_l2_sentence)
+            # assign sentence to style
+            _l2_word_style_map[_l2_sentence] = _style
+            # assign word to style
+            for _l2_word in get_supported_words(_l2_sentence):
+                _l2_word_style_map[_l2_word] = _style
 
-    _PARTICIPANT_L2_TEXT_STYLE_MAPPING[_participant_id] = _l2_word_style_map
+        _participant_l2_text_style_mapping[_participant_id] = _l2_word_style_map
 
-    # print("_PARTICIPANT_L2_TEXT_STYLE_MAPPING", _PARTICIPANT_L2_TEXT_STYLE_MAPPING)
+    return _participant_l2_text_style_mapping
 
 
 def get_manual_mark(correct_text: str, given_text: str, max_marks: int, is_known_text: bool,
@@ -211,9 +221,9 @@ def is_correct_text(correct_text, given_text):
 
     if given_text == "" or given_text == "-" or given_text == "x" or given_text == "xx":
         return False
-    elif given_text in _L1_IGNORE_WORDS:
+    elif given_text in get_l1_ignore_words():
         return False
-    elif all(word in _L1_IGNORE_WORDS for word in given_text.split()):
+    elif all(word in get_l1_ignore_words() for word in given_text.split()):
         return False
     elif given_text == correct_text:
         return True
@@ -240,11 +250,13 @@ def get_marks(correct_text: str, given_text: str, max_marks: int, is_known_text:
     return _mark
 
 
-def mark_participant(participant_id: str, participant_answers_df: pd.DataFrame) -> tuple[
+def mark_participant(participant_id: str, participant_answers_df: 'pd.DataFrame') -> tuple[
     list[int], list[str], dict]:
+    import pandas as pd
+
     print(f"\nmark_participant for {participant_id}")
 
-    _l2_text_style_map = _PARTICIPANT_L2_TEXT_STYLE_MAPPING[participant_id]
+    _l2_text_style_map = get_participant_l2_text_style_mapping()[participant_id]
     _all_l2_texts = list(_l2_text_style_map.keys())
     # print(_all_l2_texts)
 
@@ -329,7 +341,9 @@ def mark_participant(participant_id: str, participant_answers_df: pd.DataFrame)
     return _l2_marks, _style_categories, _style_marks
 
 
-def write_results(participant_ids: list[str], participant_answers_df: pd.DataFrame):
+def write_results(participant_ids: list[str], participant_answers_df: 'pd.DataFrame'):
+    import pandas as pd
+
     individual_results_df = participant_answers_df.copy()
     '''
     L2,L1,p101,p101-Marks,p102,p102-Marks,
@@ -0,0 +1,75 @@
+import argparse
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import List, Tuple
+
+_MODULES = ['main', 'backend.backend', 'mark_answers', 'generate_sentences']
+
+# the deferred work, run after the import (i.e., at the startup of the backend)
+_WARM_UPS = {
+    'backend.backend': 'backend.backend.get_schedule_store()',
+}
+
+_TOP_COUNT = 10
+
+
+def run_python(code: str, import_time=False) -> Tuple[float, str]:
+    # a new interpreter each time, so nothing is imported already
+    command = [sys.executable] + (['-X', 'importtime'] if import_time else []) + ['-c', code]
+    start = time.perf_counter()
+    result = subprocess.run(command, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+
+    if result.returncode != 0:
+        raise Exception(f"failed to run `{code}`: {result.stderr.strip().splitlines()[-1]}")
+    return elapsed, result.stderr
+
+
+def parse_import_times(output: str) -> List[Tuple[str, int, int]]:
+    '''
+    (module, self microseconds, cumulative microseconds) of each import, from the `-X importtime` output:
+        import time: self [us] | cumulative | imported package
+    '''
+    import_times = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        import_times.append((module.strip(), int(self_us), int(cumulative_us)))
+    return import_times
+
+
+def profile_module(module: str):
+    base_time, _ = run_python('pass')
+    elapsed, output = run_python(f'import {module}', import_time=True)
+    import_times = parse_import_times(output)
+
+    print(f"\n{module}: {elapsed:.3f}s to start and import ({elapsed - base_time:.3f}s more than an empty script)")
+
+    # by top level package, e.g., all of pandas
+    package_times = defaultdict(int)
+    for name, self_us, _ in import_times:
+        package_times[name.split('.')[0]] += self_us
+    print(f"  {'package':<40}{'ms':>10}")
+    for name, self_us in sorted(package_times.items(), key=lambda item: -item[1])[:_TOP_COUNT]:
+        print(f"  {name:<40}{self_us / 1000:>10.1f}")
+
+    if module in _WARM_UPS:
+        warm_up = _WARM_UPS[module]
+        _, warm_up_output = run_python(f'import {module}, time, sys; start = time.perf_counter(); {warm_up}; '
+                                       f'print(time.perf_counter() - start, file=sys.stderr)')
+        print(f"  warm up ({warm_up}): {float(warm_up_output.strip().splitlines()[-1]):.3f}s")
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser(description="Import time breakdown of the entry points")
+    _parser.add_argument('modules', nargs='*', default=_MODULES)
+    _args = _parser.parse_args()
+
+    for _module in _args.modules:
+        try:
+            profile_module(_module)
+        except Exception as e:
+            print(f"\n{_module}: {e}")
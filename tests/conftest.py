@@ -0,0 +1,6 @@
+import os
+
+# the backend's in-process stores, set before it is imported
+os.environ.setdefault('PROGRESS_STORE', 'memory')
+os.environ.setdefault('SCHEDULE_RELOAD', '0')
+os.environ.setdefault('EVENT_STORE', '0')
@@ -0,0 +1,33 @@
+import logging
+
+from fastapi.testclient import TestClient
+
+from analyze_timing import TimingAnalyzer
+from backend.backend import app, get_schedule_store
+
+_PARTICIPANT_ID = 'p901'
+
+
+def test_prefetched_sentences_are_served_by_the_acks(caplog):
+    # the HTTP client with advance=false: a window of upcoming sentences, then an ack per displayed sentence
+    lines = []
+    with TestClient(app) as client, caplog.at_level(logging.INFO):
+        for count in range(5):
+            caplog.clear()
+            client.get(f"/api/next-sentences/{_PARTICIPANT_ID}?count=3&advance=false")
+            client.post(f"/api/progress/{_PARTICIPANT_ID}", json={'sentenceIndex': count})
+            lines += [f"2024-10-01 10:00:0{count},{i:03d} - INFO - {record.getMessage()}"
+                      for i, record in enumerate(caplog.records)]
+            lines.append(f"2024-10-01 10:00:0{count},900 - INFO - message='Successfully fetched next sentence {count}'"
+                         f" timestamp='2024-10-01T02:00:0{count}.900Z'")
+        schedule_store = get_schedule_store()
+
+    analyzer = TimingAnalyzer(schedule_store)
+    displayed = []
+    for line in lines:
+        analyzer.feed(line)
+        if 'Successfully fetched' in line:
+            displayed.append(analyzer._timelines[_PARTICIPANT_ID].sentence_index)
+
+    assert displayed == [0, 1, 2, 3, 4]
+    assert analyzer.unmatched_count == 0
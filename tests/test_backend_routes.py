@@ -0,0 +1,29 @@
+from fastapi.testclient import TestClient
+
+from backend.backend import app
+
+
+def test_ack_of_participant_named_log_is_not_a_log_message():
+    # /api/progress/log also matches /api/{study}/log, with the study "progress"
+    with TestClient(app) as client:
+        response = client.post("/api/progress/log", json={'sentenceIndex': 0})
+
+    assert response.status_code == 404
+    assert response.json()['detail'] == "Participant ID not found"
+
+
+def test_log_routes_with_and_without_study():
+    message = {'message': "Successfully fetched next sentence 0", 'timestamp': "2024-10-01T02:00:01.401Z",
+               'participantId': "p901"}
+    with TestClient(app) as client:
+        assert client.post("/api/log", json=message).status_code == 200
+        assert client.post("/api/log/batch", json={'messages': [message]}).json() == {'accepted': 1, 'dropped': 0}
+        assert client.post("/api/unknown-study/log", json=message).status_code == 404
+
+
+def test_unknown_study_is_not_found():
+    with TestClient(app) as client:
+        response = client.get("/api/unknown-study/next-sentence/p901")
+
+    assert response.status_code == 404
+    assert response.json()['detail'] == "Study not found"
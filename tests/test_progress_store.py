@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.progress_store import ProgressStore, SharedProgressStore
+
+
+def test_advance_window_is_the_same_as_advancing_each_sentence(tmp_path):
+    memory_store = ProgressStore()
+    shared_store = SharedProgressStore(str(tmp_path / 'progress.db'))
+    try:
+        # e.g., a cursor past the end of a schedule shortened by a reload
+        for store in (memory_store, shared_store):
+            store.set('p2', 9)
+        for participant_id, sentence_count, count in [('p1', 5, 3), ('p1', 5, 3), ('p1', 5, 5), ('p1', 5, 1),
+                                                      ('p2', 4, 2), ('p3', 1, 1)]:
+            expected = []
+            for _ in range(count):
+                expected.append(memory_store.advance(participant_id, sentence_count))
+            assert shared_store.advance_window(participant_id, sentence_count, count) == expected
+            assert shared_store.get(participant_id) == memory_store.get(participant_id)
+    finally:
+        shared_store.stop()
+
+
+def test_concurrent_windows_are_contiguous(tmp_path):
+    shared_store = SharedProgressStore(str(tmp_path / 'progress.db'))
+    try:
+        with ThreadPoolExecutor(8) as executor:
+            windows = list(executor.map(lambda _: shared_store.advance_window('p1', 1000, 3), range(64)))
+    finally:
+        shared_store.stop()
+
+    for window in windows:
+        assert window == list(range(window[0], window[0] + 3))
+    assert sorted(index for window in windows for index in window) == list(range(64 * 3))
+    assert shared_store._connections == []
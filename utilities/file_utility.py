@@ -5,7 +5,6 @@ import json
 import logging
 import os
 
-import pandas as pd
 from pathlib import Path
 
 _CREDENTIAL_DIRECTORY = "credential"
@@ -99,6 +98,9 @@ def get_audio_file_path(directory, file_name):
 
 
 def read_csv(file):
+    # pandas is slow to import, so only when needed
+    import pandas as pd
+
     # Reading the CSV file using pandas
     data = pd.read_csv(file)
 
@@ -125,6 +127,8 @@ def load_first_second_colum_from_csv(file):
 
 
 def write_rows_to_csv(file, data, column_names):
+    import pandas as pd
+
     # Creating a DataFrame from the provided data
     df = pd.DataFrame(data, columns=column_names)
 
@@ -133,6 +137,8 @@ def write_rows_to_csv(file, data, column_names):
 
 
 def write_data_to_csv(file, data_with_columns):
+    import pandas as pd
+
     # Creating a DataFrame from the provided data
     df = pd.DataFrame(data_with_columns)
 
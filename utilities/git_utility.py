@@ -1,8 +1,8 @@
-import pygit2
-
-
 def get_git_branch():
     try:
+        # imported here, as it is only needed for this (and slow to import)
+        import pygit2
+
         # Open the repository located at the current directory
         repo = pygit2.Repository('.')
         # Get the name of the current branch